@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form
 from pydantic import BaseModel
 from backend.db import get_db_collection
-from backend.rag_service import get_rag_engine
+from backend.rag_service import get_rag_engine, get_ingestion_pipeline, get_semantic_cache, semantic_cache_mode
 from backend.settings_service import get_setting, set_setting
-from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag
-from rag_modules.chat_handler import generate_with_openai, generate_with_gemini
+from rag_modules.prompt_cache import read_prompt, invalidate_prompt
+from rag_modules.chat_handler import agenerate_with_openai, agenerate_with_gemini
+import asyncio
 import time
 import datetime
 import os
@@ -361,6 +362,7 @@ async def update_system_prompt(request: SystemPromptRequest):
     try:
         with open("system_prompt.txt", "w", encoding="utf-8") as f:
             f.write(request.prompt)
+        invalidate_prompt("system_prompt.txt")
         return {"message": "System prompt updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -380,6 +382,7 @@ async def update_maya_prompt(request: SystemPromptRequest):
     try:
         with open("maya_system_prompt.txt", "w", encoding="utf-8") as f:
             f.write(request.prompt)
+        invalidate_prompt("maya_system_prompt.txt")
         return {"message": "Maya prompt updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -401,6 +404,7 @@ async def update_report_prompt(request: SystemPromptRequest):
         prompt_path = os.path.join(os.getcwd(), "guruji_detailed_report_prompt.txt")
         with open(prompt_path, "w", encoding="utf-8") as f:
             f.write(request.prompt)
+        invalidate_prompt(prompt_path)
         return {"message": "Report prompt updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -460,19 +464,90 @@ async def test_process(filename: str = Form(...)):
         with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
             content = f.read()
 
-        # Chunking
-        records = extract_hierarchy(content)
-        chunks = chunk_hierarchy_for_rag(records)
-
-        # Embedding & Indexing
-        engine, vectorstore = get_rag_engine()
-        chunks_with_emb = engine.embed_chunks(chunks)
-        
         # Use filename as doc_id for testing
         doc_id = f"test_{filename}_{int(time.time())}"
-        vectorstore.add_document(doc_id, filename, chunks_with_emb)
 
-        return {"status": "success", "doc_id": doc_id, "chunks": len(chunks)}
+        # Chunking (process pool) -> Embedding & Indexing, off the event loop
+        result = await get_ingestion_pipeline().ingest_async([(doc_id, filename, content)])
+        if doc_id in result["errors"]:
+            raise HTTPException(status_code=500, detail=result["errors"][doc_id])
+
+        return {
+            "status": "success",
+            "doc_id": doc_id,
+            "chunks": result["docs"][doc_id]["chunks"],
+            "timings": result["timings"]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/vectorstore-stats")
+async def get_vectorstore_stats():
+    try:
+        engine, vectorstore = get_rag_engine()
+        return vectorstore.cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/embedding-cache-stats")
+async def get_embedding_cache_stats():
+    try:
+        engine, vectorstore = get_rag_engine()
+        return {
+            "query_cache": engine.query_cache.stats(),
+            "chunk_cache": engine.chunk_cache.stats(),
+            "pending_embedding_docs": engine.pending_embedding_docs()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/semantic-cache-stats")
+async def get_semantic_cache_stats():
+    """Guruji answer cache: hit rate and generation time saved (this worker since start)."""
+    try:
+        stats = get_semantic_cache().stats()
+        stats["mode"] = semantic_cache_mode()
+        return stats
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/prompt-cache-stats")
+async def get_prompt_cache_stats(hours: int = 24):
+    """Share of Guruji and Maya prompt tokens served from OpenAI's prompt cache over the last `hours`."""
+    try:
+        conv_col = get_db_collection("conversation_history")
+        res = list(conv_col.aggregate([
+            {"$match": {"role": "guruji", "timestamp": {"$gte": time.time() - hours * 3600}}},
+            {"$group": {
+                "_id": None,
+                "turns": {"$sum": 1},
+                "guruji_prompt": {"$sum": "$usage.prompt_tokens"},
+                "guruji_cached": {"$sum": "$usage.cached_tokens"},
+                "maya_prompt": {"$sum": "$maya_usage.prompt_tokens"},
+                "maya_cached": {"$sum": "$maya_usage.cached_tokens"}
+            }}
+        ]))
+        totals = res[0] if res else {}
+        stats = {"hours": hours, "turns": totals.get("turns", 0)}
+        for name in ("guruji", "maya"):
+            prompt_tokens = totals.get(f"{name}_prompt") or 0
+            cached_tokens = totals.get(f"{name}_cached") or 0
+            stats[name] = {
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "cached_ratio": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0
+            }
+        return stats
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/retry-embeddings")
+async def retry_embeddings():
+    """Re-embed and re-index documents whose chunks failed to embed earlier."""
+    try:
+        engine, vectorstore = get_rag_engine()
+        # Embedding calls and re-indexing block; keep them off the event loop
+        return await asyncio.to_thread(engine.retry_pending_embeddings)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -482,20 +557,19 @@ async def test_chat(request: TestChatRequest):
         engine, vectorstore = get_rag_engine()
         
         # 1. Retrieve
-        results = engine.retrieve(request.message, top_k=5, doc_ids=[request.doc_id] if request.doc_id else None)
+        results = await asyncio.to_thread(
+            engine.retrieve, request.message, top_k=5, doc_ids=[request.doc_id] if request.doc_id else None
+        )
         context_chunks = [r[0] for r in results]
 
         # 2. Get System Prompt
-        system_prompt = "You are Astrology Guruji. Answer using only context."
-        if os.path.exists("system_prompt.txt"):
-            with open("system_prompt.txt", "r", encoding="utf-8") as f:
-                system_prompt = f.read()
+        system_prompt = read_prompt("system_prompt.txt", default="You are Astrology Guruji. Answer using only context.")
 
         # 3. Generate
         if "gpt" in request.model:
-            ans, usage = generate_with_openai(system_prompt, context_chunks, [], request.message, model=request.model)
+            ans, usage = await agenerate_with_openai(system_prompt, context_chunks, [], request.message, model=request.model)
         else:
-            ans, usage = generate_with_gemini(system_prompt, context_chunks, [], request.message, model=request.model)
+            ans, usage = await agenerate_with_gemini(system_prompt, context_chunks, [], request.message, model=request.model)
 
         return {"response": ans, "context_used": [c['heading'] for c in context_chunks]}
     except Exception as e:
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from backend.models import MobileRequest, OTPRequest, UserRegistration, LoginResponse
 from backend.db import get_db_collection
 from backend.astrology_service import generate_astrology_report, send_sms_otp, get_daily_prediction, calculate_sunsign_code
 from backend.wallet_service import WalletService
-from backend.rag_service import get_rag_engine
-from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag
+from backend.rag_service import (
+    get_rag_engine, get_ingestion_pipeline, get_semantic_cache, semantic_cache_mode, get_session_memory
+)
+import asyncio
+import json
 import time
 import os
 import random
@@ -12,6 +16,8 @@ import re
 from pydantic import BaseModel
 from typing import Optional
 from backend.settings_service import get_setting
+from rag_modules.prompt_cache import read_prompt
+from rag_modules.speculative_retrieval import SpeculativeRetrieval
 from datetime import datetime
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -203,31 +209,27 @@ async def process_user_registration_background(reg: UserRegistration):
             upsert=True
         )
         print(f"DEBUG: [BACKGROUND] Astrology report saved. Params type: {type(report_params)}")
+        # Answers cached against the previous report are stale now
+        get_semantic_cache().invalidate(reg.mobile)
 
         # 4. RAG Processing
         print("DEBUG: [BACKGROUND] Starting RAG indexing...")
-        engine, vectorstore = get_rag_engine()
-        hierarchy = extract_hierarchy(report_text)
-        
-        # Use original chunking function (no doc_id parameter)
-        chunks = chunk_hierarchy_for_rag(hierarchy)
-        
-        # Manually inject doc_id and chunk_index
-        for i, c in enumerate(chunks):
-            c["doc_id"] = reg.mobile
-            c["chunk_index"] = i
-            
-        # Generate embeddings
-        chunks = engine.embed_chunks(chunks) 
-        vectorstore.add_chunks(chunks)
-        print(f"DEBUG: [BACKGROUND] Successfully indexed {len(chunks)} chunks for {reg.mobile}")
+        # Chunking runs in the ingestion process pool and embedding in its
+        # threads, so the event loop stays free
+        result = await get_ingestion_pipeline().ingest_async([(reg.mobile, reg.mobile, report_text)])
+        if reg.mobile in result["errors"]:
+            raise RuntimeError(f"Indexing failed: {result['errors'][reg.mobile]}")
+        print(f"DEBUG: [BACKGROUND] Successfully indexed {result['docs'][reg.mobile]['indexed']} chunks for {reg.mobile}")
+        # Again now the new report is searchable: a /chat that retrieved from
+        # the old one while indexing ran may have stored its answer meanwhile
+        get_semantic_cache().invalidate(reg.mobile)
         
         # 5. Save Document Mapping to DB
         docs_col = get_db_collection("documents")
         docs_col.insert_one({
             "doc_id": reg.mobile,
             "mobile": reg.mobile,
-            "file_path": f"processed_docs/{reg.mobile}.json",
+            "file_path": f"processed_docs/{reg.mobile}.meta.json",
             "timestamp": time.time(),
             "type": "astrology_report",
             "status": "ready"
@@ -480,57 +482,108 @@ class ChatMessage(BaseModel):
     mobile: str
     session_id: Optional[str] = None
 
-@router.post("/chat")
-async def chat(request: ChatMessage):
-    try:
-        if not os.getenv("OPENAI_API_KEY"):
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured on server.")
+def build_search_query(message: str, history: list) -> str:
+    """Query Augmentation: Take last 3 messages for context."""
+    search_query = message
+    if history:
+        last_3 = history[-3:]
+        user_context = []
+        assistant_context = []
+        for m in last_3:
+            role = m.get("role")
+            content = m.get("content", "")
+            if not content: continue
+            # Remove follow-up suggestions
+            clean_content = content.split("🤔")[0]
+            # Remove HTML tags
+            clean_content = re.sub(r'<[^>]*>', '', clean_content)
+            # Remove common prefixes
+            clean_content = clean_content.replace("Guruji:", "").replace("Maya:", "").replace("Guruji</b>:", "").replace("Maya</b>:", "").strip()
 
-        print(f"DEBUG: Chat request received for mobile: {request.mobile}")
+            if role == "user":
+                user_context.append(clean_content)
+            else:
+                # For assistant, only take first 50 words to avoid drowning out the query
+                short_content = " ".join(clean_content.split()[:50])
+                assistant_context.append(short_content)
 
-        # ----------------------------------------------------
-        # 1. Fetch User Details & Handle New Session
-        # ----------------------------------------------------
-        users_col = get_db_collection("users")
-        user = users_col.find_one({"mobile": request.mobile})
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        if user_context or assistant_context:
+            # Prioritize user context
+            search_query = " ".join(user_context + assistant_context[-1:]) + " " + message
+            print(f"DEBUG: Augmented query (refined): {search_query}")
+    return search_query
 
-        # Check for new session (no messages for this session_id)
-        conv_col = get_db_collection("conversation_history")
-        session_id = request.session_id or "legacy"
-        
-        # Count messages for this session
-        msg_count = conv_col.count_documents({"session_id": session_id})
-        
-        if msg_count == 0:
-            print(f"DEBUG: New session detected ({session_id}). Inserting Welcome message.")
-            conv_col.insert_one({
-                "mobile": request.mobile,
-                "session_id": session_id,
-                "role": "maya",
-                "message": "Welcome! I'll connect you to our astrologer.\nYou may call him as 'Guruji'",
-                "category": "WELCOME",
-                "assistant": "maya",
-                "timestamp": time.time() - 1.0 # Ensure it appears before the user's message
-            })
+def _timed_retrieve(engine, query: str, doc_ids: list, top_k: int = 5):
+    """Runs in a worker thread: (results, seconds)."""
+    t0 = time.time()
+    results = engine.retrieve(query, top_k=top_k, doc_ids=doc_ids)
+    return results, time.time() - t0
 
-        # ----------------------------------------------------
-        # 2. Maya Classification & Gatekeeping
-        # ----------------------------------------------------
+async def _prepare_chat_turn(request: ChatMessage) -> dict:
+    """
+    Everything before Guruji generation, shared by /chat and /chat/stream:
+    user lookup, session welcome, Maya gatekeeping (with speculative
+    retrieval), retrieval and prompt. If Maya handles the message the
+    returned dict has "reply" set to the final response.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured on server.")
+
+    print(f"DEBUG: Chat request received for mobile: {request.mobile}")
+
+    # ----------------------------------------------------
+    # 1. Fetch User Details & Handle New Session
+    # ----------------------------------------------------
+    users_col = get_db_collection("users")
+    user = users_col.find_one({"mobile": request.mobile})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Check for new session (no messages for this session_id)
+    conv_col = get_db_collection("conversation_history")
+    session_id = request.session_id or "legacy"
+    
+    # Count messages for this session
+    msg_count = conv_col.count_documents({"session_id": session_id})
+    
+    if msg_count == 0:
+        print(f"DEBUG: New session detected ({session_id}). Inserting Welcome message.")
+        conv_col.insert_one({
+            "mobile": request.mobile,
+            "session_id": session_id,
+            "role": "maya",
+            "message": "Welcome! I'll connect you to our astrologer.\nYou may call him as 'Guruji'",
+            "category": "WELCOME",
+            "assistant": "maya",
+            "timestamp": time.time() - 1.0 # Ensure it appears before the user's message
+        })
+
+    # ----------------------------------------------------
+    # 2. Maya Classification & Gatekeeping
+    # ----------------------------------------------------
+    # Guruji retrieval (query embedding + search) starts speculatively in
+    # worker threads while Maya classifies; it is discarded if Maya answers.
+    # Leaving the block, by return or exception, cancels and awaits
+    # whatever is still running.
+    engine, vectorstore = get_rag_engine()
+    selected_docs = [request.mobile]
+    search_query = build_search_query(request.message, request.history)
+    async with SpeculativeRetrieval(engine, vectorstore, search_query, selected_docs) as speculative:
         t_start = time.time()
-        from rag_modules.maya_receptionist import check_with_maya
-        maya_res = check_with_maya(request.message, request.history, user_details=user)
-        print(f"DEBUG: Maya took {time.time() - t_start:.2f}s")
+        from rag_modules.maya_receptionist import acheck_with_maya
+        maya_res = await acheck_with_maya(request.message, request.history, user_details=user,
+                                          query_vector=speculative.query_vector_task)
+        t_maya = time.time() - t_start
+        print(f"DEBUG: Maya took {t_maya:.2f}s")
         # category = maya_res.get("category", "PROCEED") # Removed category
         pass_to_guruji = maya_res.get("pass_to_guruji", False)
         maya_message = maya_res.get("response_message", "")
-        
+    
         cost = 0 # Maya no longer returns amount
         wallet_enabled = WalletService.is_wallet_enabled()
         wallet = WalletService.get_wallet(request.mobile)
         current_balance = wallet.get("balance", 0)
-        
+    
         # Store Maya's response in conversation_history regardless of pass_to_guruji
         try:
             # We don't save user message here yet if passing to Guruji, 
@@ -544,7 +597,7 @@ async def chat(request: ChatMessage):
                     "message": request.message,
                     "timestamp": time.time()
                 })
-            
+        
             conv_col.insert_one({
                 "mobile": request.mobile,
                 "session_id": request.session_id,
@@ -552,6 +605,9 @@ async def chat(request: ChatMessage):
                 "message": maya_message or "",
                 "pass_to_guruji": pass_to_guruji,
                 "maya_json": maya_res,
+                # Training / replay data for Maya's fast path
+                "user_message": request.message,
+                "latency_s": round(t_maya, 3),
                 "timestamp": time.time()
             })
         except Exception as e:
@@ -559,14 +615,16 @@ async def chat(request: ChatMessage):
 
         # If pass_to_guruji is False, Maya handles it directly
         if not pass_to_guruji:
-            return {
+            await speculative.discard()
+            print("DEBUG: Maya handled the message; speculative retrieval discarded.")
+            return {"reply": {
                 "answer": maya_message if maya_message else "I'm sorry, I cannot process this request. Please ask an astrology question.",
                 "amount": 0,
                 "assistant": "maya",
                 "wallet_balance": current_balance,
                 "maya_json": maya_res,
                 "timestamp": time.time()
-            }
+            }}
 
         # Automated chat fees are disabled as per latest requirements.
         # Only detailed report generation (manual trigger) will incur costs.
@@ -576,43 +634,12 @@ async def chat(request: ChatMessage):
         # 3. Guruji RAG Logic
         # ----------------------------------------------------
         t_rag_start = time.time()
-        engine, vectorstore = get_rag_engine()
-        selected_docs = [request.mobile]
-        
         print(f"DEBUG: Vectorstore has {len(vectorstore.document_names)} docs. Searching for: {selected_docs}")
-        
-        # Query Augmentation: Take last 3 messages for context
-        search_query = request.message
-        if request.history:
-            last_3 = request.history[-3:]
-            user_context = []
-            assistant_context = []
-            for m in last_3:
-                role = m.get("role")
-                content = m.get("content", "")
-                if not content: continue
-                # Remove follow-up suggestions
-                clean_content = content.split("🤔")[0]
-                # Remove HTML tags
-                clean_content = re.sub(r'<[^>]*>', '', clean_content)
-                # Remove common prefixes
-                clean_content = clean_content.replace("Guruji:", "").replace("Maya:", "").replace("Guruji</b>:", "").replace("Maya</b>:", "").strip()
-                
-                if role == "user":
-                    user_context.append(clean_content)
-                else:
-                    # For assistant, only take first 50 words to avoid drowning out the query
-                    short_content = " ".join(clean_content.split()[:50])
-                    assistant_context.append(short_content)
-            
-            if user_context or assistant_context:
-                # Prioritize user context
-                search_query = " ".join(user_context + assistant_context[-1:]) + " " + request.message
-                print(f"DEBUG: Augmented query (refined): {search_query}")
-        
-        filtered_chunks = engine.retrieve(search_query, top_k=5, doc_ids=selected_docs)
-        print(f"DEBUG: Initial retrieval found {len(filtered_chunks)} chunks in {time.time() - t_rag_start:.2f}s")
-        
+
+        filtered_chunks, t_retrieval = await speculative.results()
+        print(f"DEBUG: Initial retrieval found {len(filtered_chunks)} chunks in {t_retrieval:.2f}s "
+              f"(ran alongside Maya's {t_maya:.2f}s; waited {time.time() - t_rag_start:.2f}s after Maya)")
+    
         # Reload if empty
         if not filtered_chunks:
             print(f"DEBUG: No chunks found in memory for {request.mobile}. Attempting DB reload...")
@@ -620,145 +647,250 @@ async def chat(request: ChatMessage):
             report_record = reports_col.find_one({"mobile": request.mobile})
             report_text = report_record.get("report_text") if report_record else None
             if report_text:
-                from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag
-                hierarchy = extract_hierarchy(report_text)
-                chunks = chunk_hierarchy_for_rag(hierarchy)
-                for c in chunks: c["doc_id"] = request.mobile
-                chunks = engine.embed_chunks(chunks)
-                vectorstore.add_chunks(chunks)
-                filtered_chunks = engine.retrieve(search_query, top_k=5, doc_ids=selected_docs)
+                await get_ingestion_pipeline().ingest_async([(request.mobile, request.mobile, report_text)])
+                filtered_chunks, _ = await asyncio.to_thread(_timed_retrieve, engine, search_query, selected_docs)
                 print(f"DEBUG: Reloaded and found {len(filtered_chunks)} chunks.")
 
         clean_chunks = [{"text": c["text"], "heading": c["heading"], "doc_id": c["doc_id"]} for (c, s) in filtered_chunks]
-        
+    
         # Calculate Metrics
         scores = [score for (chunk, score) in filtered_chunks]
         max_score = max(scores) if scores else 0
         avg_score = sum(scores) / len(scores) if scores else 0
         print(f"DEBUG: Max Score: {max_score:.4f}, Avg Score: {avg_score:.4f}")
 
-        t_gen_start = time.time()
-        
+        # Optional context compression (CONTEXT_COMPRESSION=bm25): keep the
+        # sentences that best match the query, within CONTEXT_COMPRESSION_TOKENS
+        prompt_chunks = clean_chunks
+        context_compression = None
+        if os.getenv("CONTEXT_COMPRESSION", "off").lower() == "bm25" and clean_chunks:
+            from rag_modules.context_compression import compress_chunks
+            prompt_chunks, context_compression = compress_chunks(
+                clean_chunks, search_query, max_tokens=int(os.getenv("CONTEXT_COMPRESSION_TOKENS", "1500")),
+                scores=scores
+            )
+            print(f"DEBUG: Context compressed {context_compression['tokens_before']} -> "
+                  f"{context_compression['tokens_after']} tokens "
+                  f"({context_compression['duplicate_rows']} duplicate table rows dropped)")
+
         # Extract detected language from Maya's response
         language_detected = maya_res.get("language_detected", "English")
-        
-        from rag_modules.chat_handler import generate_with_openai
+    
         system_prompt = "You are Astrology Guruji. Answer using only HTML tags (<b>, <ul>, <li>, <table>) for formatting. DO NOT use markdown stars (**). Answer using only context if possible. Speak with wisdom and compassion."
-        if os.path.exists("system_prompt.txt"):
-            with open("system_prompt.txt", "r", encoding="utf-8") as f:
-                system_prompt = f.read()
-                # Replace placeholders if present
-                system_prompt = system_prompt.replace("{{language_detected}}", language_detected)
-                current_date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                system_prompt = system_prompt.replace("{{current_date}}", current_date_str)
-
-        response, usage = generate_with_openai(
-            system_prompt=system_prompt,
-            context_chunks=clean_chunks,
-            conversation_history=request.history,
-            question=request.message,
-            json_mode=True
-        )
-        print(f"DEBUG: Guruji generation took {time.time() - t_gen_start:.2f}s")
-        
+        turn_note = None
+        prompt_template = read_prompt("system_prompt.txt")
+        if prompt_template is not None:
+            # Placeholder values change every turn; they move to the end of the
+            # request so the system prompt stays a cacheable, byte-identical prefix
+            from rag_modules.chat_handler import split_volatile_placeholders
+            system_prompt, turn_note = split_volatile_placeholders(prompt_template, {
+                "language_detected": language_detected,
+                "current_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
         # ----------------------------------------------------
-        # 3. Handle Guruji Response (Structured JSON Parsing)
+        # 4. Semantic Answer Cache
         # ----------------------------------------------------
-        import json
-        guruji_json = None
-        
-        try:
-            # Clean possible markdown code fences
-            clean_response = response.strip()
-            if clean_response.startswith("```"):
-                # Use regex to extract content within backticks
-                match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', clean_response, re.DOTALL)
-                if match:
-                    clean_response = match.group(1)
-                else:
-                    # Fallback: remove fences manually
-                    clean_response = re.sub(r'^```(json)?\s*', '', clean_response)
-                    clean_response = re.sub(r'\s*```$', '', clean_response)
-
-            # Try to parse response as JSON
-            temp_json = json.loads(clean_response)
-            # Ensure it has the expected keys
-            if any(k in temp_json for k in ["para1", "para2", "para3", "follow_up", "followup"]):
-                guruji_json = temp_json
-                
-                # Construct formatted HTML answer from paragraphs
-                parts = []
-                for k in ["para1", "para2", "para3"]:
-                    if temp_json.get(k):
-                        parts.append(temp_json[k])
-                
-                formatted_body = "<br><br>".join(parts)
-                follow_up = temp_json.get("follow_up") or temp_json.get("followup") or "🤔 What's Next?"
-                
-                final_answer = f"{formatted_body}<br><br>{follow_up}"
+        # Matched on the question as asked: the retrieval query is augmented
+        # with recent history, so its vector depends on the conversation
+        question_vector = None
+        cached_answer = None
+        if semantic_cache_mode() != "off":
+            if search_query == request.message:
+                question_vector = await speculative.query_vector_task
             else:
-                # Valid JSON but not our format - extract all string values
-                text_parts = []
-                for val in temp_json.values():
-                    if isinstance(val, str):
-                        text_parts.append(val)
-                if text_parts:
-                    final_answer = "<br><br>".join(text_parts)
-                else:
-                    final_answer = response.strip().replace("\n\n", "<br>").replace("\n", " ")
-        except:
-            # Not JSON, use raw response
-            final_answer = response.strip().replace("\n\n", "<br>").replace("\n", " ")
+                question_vector = await asyncio.to_thread(engine.embed_query, request.message)
+            cached_answer = get_semantic_cache().lookup(request.mobile, language_detected, question_vector)
+            if cached_answer:
+                print(f"DEBUG: Semantic cache hit ({cached_answer['similarity']:.3f}, mode {semantic_cache_mode()}) "
+                      f"for earlier question: {cached_answer['question']}")
 
         # ----------------------------------------------------
-        # 4. Save to History
+        # 5. Bounded History (running summary + recent messages)
         # ----------------------------------------------------
-        
-        # Save to Conversation History (new format with roles)
-        try:
-            conv_col = get_db_collection("conversation_history")
-            # Store user message
-            conv_col.insert_one({
-                "mobile": request.mobile,
-                "session_id": request.session_id,
-                "role": "user",
-                "message": request.message,
-                "timestamp": time.time()
-            })
-            # Store Guruji's response (store raw string to preserve format)
-            conv_col.insert_one({
-                "mobile": request.mobile,
-                "session_id": request.session_id,
-                "role": "guruji",
-                "message": response, # Raw string (could be JSON)
-                "cost": cost,
-                "metrics": {
-                    "rag_score": round(max_score * 100, 1),
-                    "modelling_score": round(avg_score * 100, 1)
-                },
-                "usage": usage,
-                "maya_usage": maya_res.get("usage"),
-                "maya_json": maya_res,
-                "guruji_json": guruji_json,
-                "timestamp": time.time()
-            })
-        except Exception as e:
-            print(f"Error storing Guruji conversation: {e}")
+        memory = get_session_memory()
+        history, memory_state = memory.window(request.session_id, request.history)
+        # Background fold of aged-out messages; ready for a later turn
+        memory.maybe_refresh(request.session_id, request.mobile, request.history, memory_state)
 
         return {
-            "answer": final_answer,
-            "amount": cost,
-            "assistant": "guruji",
-            "wallet_balance": current_balance,
-            "context": clean_chunks,
+            "reply": None,
+            "history": history,
+            "maya_res": maya_res,
+            "cost": cost,
+            "current_balance": current_balance,
+            "clean_chunks": clean_chunks,
+            "prompt_chunks": prompt_chunks,
+            "context_compression": context_compression,
             "metrics": {
                 "rag_score": round(max_score * 100, 1),
                 "modelling_score": round(avg_score * 100, 1)
             },
-            "maya_json": maya_res,
+            "system_prompt": system_prompt,
+            "turn_note": turn_note,
+            "language": language_detected,
+            "question_vector": question_vector,
+            "cached_answer": cached_answer
+        }
+
+def _serve_from_cache(turn: dict) -> bool:
+    return turn["cached_answer"] is not None and semantic_cache_mode() == "serve"
+
+def _generation_chunks(turn: dict) -> list:
+    """Context for Guruji; in draft mode a cached earlier answer rides along as one more chunk."""
+    cached = turn["cached_answer"]
+    if cached is None or semantic_cache_mode() != "draft":
+        return turn["prompt_chunks"]
+    return turn["prompt_chunks"] + [{
+        "text": cached["response"],
+        "heading": f"Your earlier answer to a similar question: {cached['question']}",
+        "doc_id": "answer_cache"
+    }]
+
+def _remember_answer(request: ChatMessage, turn: dict, response: str, guruji_json, gen_s: float):
+    # Only fresh, well-formed answers; a turn that already matched an entry adds no near-duplicate
+    if turn["question_vector"] is None or turn["cached_answer"] is not None or guruji_json is None:
+        return
+    get_semantic_cache().store(request.mobile, turn["language"], request.message, turn["question_vector"],
+                               response, guruji_json, gen_s)
+
+def _parse_guruji_response(response: str):
+    """Guruji's raw (JSON-mode) output -> (final HTML answer, guruji_json or None)."""
+    guruji_json = None
+    
+    try:
+        # Clean possible markdown code fences
+        clean_response = response.strip()
+        if clean_response.startswith("```"):
+            # Use regex to extract content within backticks
+            match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', clean_response, re.DOTALL)
+            if match:
+                clean_response = match.group(1)
+            else:
+                # Fallback: remove fences manually
+                clean_response = re.sub(r'^```(json)?\s*', '', clean_response)
+                clean_response = re.sub(r'\s*```$', '', clean_response)
+
+        # Try to parse response as JSON
+        temp_json = json.loads(clean_response)
+        # Ensure it has the expected keys
+        if any(k in temp_json for k in ["para1", "para2", "para3", "follow_up", "followup"]):
+            guruji_json = temp_json
+            
+            # Construct formatted HTML answer from paragraphs
+            parts = []
+            for k in ["para1", "para2", "para3"]:
+                if temp_json.get(k):
+                    parts.append(temp_json[k])
+            
+            formatted_body = "<br><br>".join(parts)
+            follow_up = temp_json.get("follow_up") or temp_json.get("followup") or "🤔 What's Next?"
+            
+            final_answer = f"{formatted_body}<br><br>{follow_up}"
+        else:
+            # Valid JSON but not our format - extract all string values
+            text_parts = []
+            for val in temp_json.values():
+                if isinstance(val, str):
+                    text_parts.append(val)
+            if text_parts:
+                final_answer = "<br><br>".join(text_parts)
+            else:
+                final_answer = response.strip().replace("\n\n", "<br>").replace("\n", " ")
+    except:
+        # Not JSON, use raw response
+        final_answer = response.strip().replace("\n\n", "<br>").replace("\n", " ")
+
+    return final_answer, guruji_json
+
+def _save_guruji_turn(request: ChatMessage, turn: dict, response: str, usage: dict, guruji_json):
+    # Save to Conversation History (new format with roles)
+    try:
+        conv_col = get_db_collection("conversation_history")
+        # Store user message
+        conv_col.insert_one({
+            "mobile": request.mobile,
+            "session_id": request.session_id,
+            "role": "user",
+            "message": request.message,
+            "timestamp": time.time()
+        })
+        # Store Guruji's response (store raw string to preserve format)
+        conv_col.insert_one({
+            "mobile": request.mobile,
+            "session_id": request.session_id,
+            "role": "guruji",
+            "message": response, # Raw string (could be JSON)
+            "cost": turn["cost"],
+            "metrics": turn["metrics"],
+            "usage": usage,
+            "maya_usage": turn["maya_res"].get("usage"),
+            "maya_json": turn["maya_res"],
             "guruji_json": guruji_json,
+            "semantic_cache": _cache_info(turn),
+            "context_compression": turn["context_compression"],
             "timestamp": time.time()
-        }
+        })
+    except Exception as e:
+        print(f"Error storing Guruji conversation: {e}")
+
+def _cache_info(turn: dict):
+    cached = turn["cached_answer"]
+    if cached is None:
+        return None
+    return {"mode": semantic_cache_mode(), "similarity": round(cached["similarity"], 4),
+            "question": cached["question"]}
+
+def _guruji_reply(turn: dict, final_answer: str, guruji_json) -> dict:
+    return {
+        "answer": final_answer,
+        "amount": turn["cost"],
+        "assistant": "guruji",
+        "wallet_balance": turn["current_balance"],
+        "context": turn["clean_chunks"],
+        "metrics": turn["metrics"],
+        "maya_json": turn["maya_res"],
+        "guruji_json": guruji_json,
+        "semantic_cache": _cache_info(turn),
+        "timestamp": time.time()
+    }
+
+@router.post("/chat")
+async def chat(request: ChatMessage):
+    try:
+        turn = await _prepare_chat_turn(request)
+        if turn["reply"] is not None:
+            return turn["reply"]
+
+        if _serve_from_cache(turn):
+            response, usage = turn["cached_answer"]["response"], {}
+            gen_s = 0.0
+        else:
+            t_gen_start = time.time()
+            from rag_modules.chat_handler import agenerate_with_openai
+            response, usage = await agenerate_with_openai(
+                system_prompt=turn["system_prompt"],
+                context_chunks=_generation_chunks(turn),
+                conversation_history=turn["history"],
+                question=request.message,
+                json_mode=True,
+                turn_note=turn["turn_note"]
+            )
+            gen_s = time.time() - t_gen_start
+            print(f"DEBUG: Guruji generation took {gen_s:.2f}s")
+        
+        # ----------------------------------------------------
+        # 3. Handle Guruji Response (Structured JSON Parsing)
+        # ----------------------------------------------------
+        final_answer, guruji_json = _parse_guruji_response(response)
+        _remember_answer(request, turn, response, guruji_json, gen_s)
+
+        # ----------------------------------------------------
+        # 4. Save to History
+        # ----------------------------------------------------
+        _save_guruji_turn(request, turn, response, usage, guruji_json)
+
+        return _guruji_reply(turn, final_answer, guruji_json)
         
     except Exception as e:
         import traceback
@@ -766,6 +898,90 @@ async def chat(request: ChatMessage):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatMessage):
+    """
+    /chat as Server-Sent Events. Guruji's JSON answer is parsed as it streams:
+      event: meta    {assistant, context, metrics, wallet_balance, maya_json}
+      event: delta   {"field": "para1" | "para2" | "para3" | "follow_up", "text": ...}
+      event: field   {"field": ..., "text": full value}   when a field is complete
+      event: done    same body as /chat's response (also sent alone when Maya answers)
+      event: error   {"detail": ...}
+    The turn is saved to conversation_history when the stream ends.
+    """
+    try:
+        turn = await _prepare_chat_turn(request)
+    except Exception as e:
+        import traceback
+        print(f"ERROR in chat stream: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        if turn["reply"] is not None:
+            yield _sse("done", turn["reply"])
+            return
+
+        from rag_modules.chat_handler import (
+            astream_openai, convert_markdown_to_html, GURUJI_INSTRUCTIONS, StreamingJSONFields
+        )
+        yield _sse("meta", {
+            "assistant": "guruji",
+            "context": turn["clean_chunks"],
+            "metrics": turn["metrics"],
+            "wallet_balance": turn["current_balance"],
+            "maya_json": turn["maya_res"]
+        })
+
+        if _serve_from_cache(turn):
+            response = turn["cached_answer"]["response"]
+            final_answer, guruji_json = _parse_guruji_response(response)
+            for field, value in (guruji_json or {}).items():
+                if isinstance(value, str):
+                    yield _sse("field", {"field": field, "text": value})
+            _save_guruji_turn(request, turn, response, {}, guruji_json)
+            yield _sse("done", _guruji_reply(turn, final_answer, guruji_json))
+            return
+
+        t_gen_start = time.time()
+        parser = StreamingJSONFields()
+        pieces = []
+        usage = {}
+        try:
+            async for text in astream_openai(
+                turn["system_prompt"], _generation_chunks(turn), turn["history"], request.message,
+                instructions=GURUJI_INSTRUCTIONS, json_mode=True, usage=usage, turn_note=turn["turn_note"]
+            ):
+                pieces.append(text)
+                for kind, field, value in parser.feed(text):
+                    if kind == "delta":
+                        yield _sse("delta", {"field": field, "text": value})
+                    else:
+                        yield _sse("field", {"field": field, "text": value})
+            gen_s = time.time() - t_gen_start
+            print(f"DEBUG: Guruji stream took {gen_s:.2f}s")
+        except Exception as e:
+            gen_s = None
+            print(f"ERROR in chat stream: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Persist whatever was generated, even if the client went away
+            response = convert_markdown_to_html("".join(pieces))
+            final_answer, guruji_json = _parse_guruji_response(response)
+            if response:
+                _save_guruji_turn(request, turn, response, usage, guruji_json)
+
+        if gen_s is not None:
+            _remember_answer(request, turn, response, guruji_json, gen_s)
+
+        yield _sse("done", _guruji_reply(turn, final_answer, guruji_json))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 class EndChatRequest(BaseModel):
     mobile: str
     history: list
@@ -774,23 +990,28 @@ class EndChatRequest(BaseModel):
 @router.post("/end-chat")
 async def end_chat(request: EndChatRequest):
     try:
-        from rag_modules.chat_handler import generate_with_openai
-        
-        history_text = ""
-        for msg in request.history:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            history_text += f"{role}: {msg['content']}\n"
+        from rag_modules.chat_handler import agenerate_with_openai
+        from rag_modules.session_memory import format_transcript
+        
+        # Long sessions already have a running summary; only the messages it
+        # does not cover yet are sent along with it
+        running_summary, remaining = get_session_memory().summary_and_rest(request.session_id, request.history)
+        history_text = format_transcript(remaining)
+        earlier = f"""
+        EARLIER IN THE CONSULTATION (summary):
+        {running_summary}
+        """ if running_summary else ""
             
         summary_prompt = f"""
         Provide a concise summary of the following astrology consultation. 
         Focus on the main concerns raised by the user and the advice given by the Guru.
         Keep it under 150 words.
-        
+        {earlier}
         CONVERSATION:
         {history_text}
         """
         
-        summary, s_usage = generate_with_openai(
+        summary, s_usage = await agenerate_with_openai(
             system_prompt="You are an expert summarizer for spiritual consultations.",
             context_chunks=[],
             conversation_history=[],
@@ -9,6 +9,7 @@ from backend.admin_routes import router as admin_router
 from backend.places_routes import router as places_router
 from backend.wallet_routes import router as wallet_router
 from backend.payment_module.payment_routes import router as payment_router
+from rag_modules.tokenizer import DEFAULT_MODEL, require_encoding
 
 app = FastAPI(
     title="Astrology Bot API",
@@ -37,6 +38,12 @@ app.include_router(admin_router)
 app.include_router(places_router)
 app.include_router(wallet_router)
 app.include_router(payment_router)
+
+@app.on_event("startup")
+def check_tokenizer():
+    # Chunk sizes and the context budget are token counts; don't serve on the estimate
+    require_encoding(DEFAULT_MODEL, "gpt-4o-mini")
+
 @app.get("/")
 async def root():
     return {"message": "Astrology Bot API is running!"}
@@ -1,17 +1,131 @@
 from rag_modules.vectorstore import InMemoryVectorStore
 from rag_modules.rag_engine import RAGEngine
+from rag_modules.ann_index import IVFIndex
+from rag_modules.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+from rag_modules.ingest import IngestionPipeline, chunk_document
+from rag_modules.semantic_cache import SemanticAnswerCache
+from rag_modules.session_memory import SessionMemory
+from backend.db import get_db_collection
 import os
 
 # Initialize global instances
 _vectorstore = None
 _engine = None
+_pipeline = None
+_semantic_cache = None
+_session_memory = None
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+def build_chunk_cache():
+    # Chunk-embedding cache (content-addressed): re-registration, profile
+    # updates, cold reloads and bulk re-indexing only embed chunks whose text
+    # changed. Persistent by default; set CHUNK_EMBED_CACHE_PATH="" to keep it in memory.
+    # The file keeps the CHUNK_EMBED_CACHE_MAX_ROWS most recently used
+    # embeddings (~6 KB each at 1536 dims).
+    chunk_cache_path = os.getenv("CHUNK_EMBED_CACHE_PATH", "embedding_cache/chunks.sqlite")
+    return EmbeddingCache(
+        max_entries=_env_int("CHUNK_EMBED_CACHE_SIZE") or 50000,
+        persistent=SQLiteEmbeddingStore(
+            chunk_cache_path, max_rows=_env_int("CHUNK_EMBED_CACHE_MAX_ROWS") or 200000
+        ) if chunk_cache_path else None
+    )
+
+def _rechunk_stored_report(doc_id):
+    # Chunks of a user's stored report, for re-embedding documents queued
+    # (in "pending_embeddings") by an earlier process
+    record = get_db_collection("reports").find_one({"mobile": doc_id}, {"report_text": 1})
+    if not record or not record.get("report_text"):
+        return None
+    return chunk_document(doc_id, record["report_text"])[1]
 
 def get_rag_engine():
     global _vectorstore, _engine
     if _vectorstore is None:
-        _vectorstore = InMemoryVectorStore()
+        # Optional resident-set budget: when either limit is set, users' vectors
+        # are loaded on first chat and the coldest ones are evicted.
+        max_docs = _env_int("VECTORSTORE_MAX_RESIDENT_DOCS")
+        max_mb = _env_int("VECTORSTORE_MAX_RESIDENT_MB")
+        # Optional IVF index for whole-corpus (doc_ids=None) searches;
+        # VECTORSTORE_ANN_NPROBE is the recall/latency knob.
+        ann_index = None
+        if os.getenv("VECTORSTORE_ANN", "").lower() == "ivf":
+            ann_index = IVFIndex(
+                n_probe=_env_int("VECTORSTORE_ANN_NPROBE") or 8,
+                min_size=_env_int("VECTORSTORE_ANN_MIN_SIZE") or 20000
+            )
+        _vectorstore = InMemoryVectorStore(
+            max_resident_docs=max_docs,
+            max_resident_bytes=max_mb * 1024 * 1024 if max_mb else None,
+            ann_index=ann_index,
+            # int8 rows with float32 re-ranking from disk (~4x less RAM)
+            quantize=os.getenv("VECTORSTORE_QUANTIZE", "").lower() == "int8"
+        )
         # In a real app, you might want to load existing chunks from disk/DB here
         # from rag_modules.vectorstore import MongoDBVectorStore
         # _vectorstore = MongoDBVectorStore()
-        _engine = RAGEngine(_vectorstore)
+        # Query-embedding cache: in-process LRU, plus an optional SQLite file
+        # shared by workers and kept across restarts
+        cache_path = os.getenv("QUERY_EMBED_CACHE_PATH")
+        query_cache = EmbeddingCache(
+            max_entries=_env_int("QUERY_EMBED_CACHE_SIZE") or 10000,
+            ttl_seconds=_env_int("QUERY_EMBED_CACHE_TTL"),
+            persistent=SQLiteEmbeddingStore(
+                cache_path, max_rows=_env_int("QUERY_EMBED_CACHE_MAX_ROWS") or 100000
+            ) if cache_path else None
+        )
+        _engine = RAGEngine(
+            _vectorstore, query_cache=query_cache, chunk_cache=build_chunk_cache(),
+            embed_batch_tokens=_env_int("EMBED_BATCH_TOKENS") or 50000,
+            embed_batch_items=_env_int("EMBED_BATCH_ITEMS") or 256,
+            embed_workers=_env_int("EMBED_WORKERS") or 4,
+            # Documents with chunks that failed to embed, kept across restarts
+            pending_collection=get_db_collection("pending_embeddings"),
+            reload_chunks=_rechunk_stored_report
+        )
     return _engine, _vectorstore
+
+def get_ingestion_pipeline():
+    # Parsing/chunking process pool (INGEST_WORKERS) feeding embedding threads
+    global _pipeline
+    if _pipeline is None:
+        engine, vectorstore = get_rag_engine()
+        _pipeline = IngestionPipeline(engine, vectorstore, workers=_env_int("INGEST_WORKERS"))
+    return _pipeline
+
+def get_semantic_cache():
+    # Per-user Guruji answer cache (Mongo "answer_cache"); how /chat uses it
+    # is set by semantic_cache_mode()
+    global _semantic_cache
+    if _semantic_cache is None:
+        ttl = os.getenv("SEMANTIC_CACHE_TTL")
+        _semantic_cache = SemanticAnswerCache(
+            get_db_collection("answer_cache"),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            ttl_seconds=int(ttl) if ttl else 7 * 86400,
+            max_entries_per_user=_env_int("SEMANTIC_CACHE_MAX_PER_USER") or 50
+        )
+    return _semantic_cache
+
+def semantic_cache_mode():
+    """
+    SEMANTIC_CACHE_MODE: "off" (default) disables lookups and stores;
+    "draft" still generates but passes the stored reply as extra context;
+    "serve" answers a near-duplicate question from the stored reply.
+    """
+    return os.getenv("SEMANTIC_CACHE_MODE", "off").lower()
+
+def get_session_memory():
+    # Rolling per-session memory (Mongo "session_memory"): the model sees a
+    # running summary plus the last MEMORY_KEEP_MESSAGES messages; the summary
+    # is refreshed in the background every MEMORY_REFRESH_EVERY messages
+    global _session_memory
+    if _session_memory is None:
+        _session_memory = SessionMemory(
+            get_db_collection("session_memory"),
+            keep_messages=_env_int("MEMORY_KEEP_MESSAGES") or 6,
+            refresh_every=_env_int("MEMORY_REFRESH_EVERY") or 4
+        )
+    return _session_memory
@@ -1,8 +1,37 @@
 from backend.db import get_db_collection
+import os
+import threading
+import time
+
+# Settings are read on most requests (/chat, /json-settings, wallet checks)
+# but change rarely, so lookups are cached per process for
+# SETTINGS_CACHE_TTL_S seconds. Writes through set_setting / toggle_wallet_system
+# clear this process's entry at once; other workers see them within the TTL.
+SETTINGS_CACHE_TTL_S = float(os.getenv("SETTINGS_CACHE_TTL_S", "5"))
+
+_lock = threading.Lock()
+_cache = {}  # (collection, key) -> (document or None, fetched at)
+
+def cached_setting_doc(collection: str, key: str, load):
+    """load() -> settings document (or None), cached under (collection, key) for the TTL."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get((collection, key))
+    if entry is not None and now - entry[1] < SETTINGS_CACHE_TTL_S:
+        return entry[0]
+    doc = load()
+    with _lock:
+        _cache[(collection, key)] = (doc, now)
+    return doc
+
+def invalidate_setting(collection: str, key: str):
+    with _lock:
+        _cache.pop((collection, key), None)
 
 def get_setting(key: str, default=None):
-    col = get_db_collection("system_settings")
-    doc = col.find_one({"_id": key})
+    doc = cached_setting_doc(
+        "system_settings", key, lambda: get_db_collection("system_settings").find_one({"_id": key})
+    )
     return doc["value"] if doc else default
 
 def set_setting(key: str, value):
@@ -11,4 +40,5 @@ def set_setting(key: str, value):
         {"_id": key},
         {"$set": {"value": value}},
         upsert=True
-    )
\ No newline at end of file
+    )
+    invalidate_setting("system_settings", key)
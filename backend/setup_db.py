@@ -32,6 +32,16 @@ def setup_indexes():
     except Exception as e:
         print(f"  - ERROR applying index to chats: {e}")
 
+    # Semantic answer cache: looked up per user and language, newest first
+    print("Applying Indexes on 'mobile, language, created_at' and TTL on 'expires_at' for 'answer_cache'...")
+    try:
+        db["answer_cache"].create_index([("mobile", 1), ("language", 1), ("created_at", -1)])
+        # Entries are deleted once past their expires_at (SEMANTIC_CACHE_TTL)
+        db["answer_cache"].create_index("expires_at", expireAfterSeconds=0)
+        print("  - SUCCESS: Indexes applied to answer_cache")
+    except Exception as e:
+        print(f"  - ERROR applying index to answer_cache: {e}")
+
     print("\nDatabase setup complete! 🚀")
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Dict
+import asyncio
 from backend.wallet_service import WalletService
 from pydantic import BaseModel
 
@@ -86,8 +87,9 @@ async def generate_report(request: ReportRequest):
         if not debit_res["success"]:
             return {"status": "insufficient_funds", "required_amount": amount}
             
-        # 3. Generate PDF
-        pdf_bytes = WalletService.generate_report_pdf(
+        # 3. Generate PDF (LLM call + rendering run in a worker thread, off the event loop)
+        pdf_bytes = await asyncio.to_thread(
+            WalletService.generate_report_pdf,
             request.mobile, 
             request.category, 
             transaction_id=debit_res["transaction_id"],
@@ -142,7 +144,9 @@ async def get_report_pdf(report_id: str):
         # Since WalletService.generate_report_pdf takes mobile/category and generates fresh content,
         # but we want the SAME content, let's add a method to WalletService to generate from existing content.
         
-        pdf_bytes = WalletService.generate_pdf_from_content(report['mobile'], report['category'], report['content'], report['user_name'])
+        pdf_bytes = await asyncio.to_thread(
+            WalletService.generate_pdf_from_content, report['mobile'], report['category'], report['content'], report['user_name']
+        )
         
         from fastapi import Response
         return Response(
@@ -1,6 +1,8 @@
 import time
 import uuid
 from backend.db import get_db_collection
+from backend.settings_service import cached_setting_doc, invalidate_setting
+from rag_modules.prompt_cache import read_prompt
 from typing import Optional, List, Dict
 from fpdf import FPDF
 import os
@@ -10,8 +12,10 @@ class WalletService:
     @staticmethod
     def is_wallet_enabled() -> bool:
         """Check if the wallet system is globally enabled."""
-        settings_col = get_db_collection("settings")
-        setting = settings_col.find_one({"key": "wallet_system_enabled"})
+        setting = cached_setting_doc(
+            "settings", "wallet_system_enabled",
+            lambda: get_db_collection("settings").find_one({"key": "wallet_system_enabled"})
+        )
         # Default to True if not set
         return setting.get("value", True) if setting else True
 
@@ -24,6 +28,7 @@ class WalletService:
             {"$set": {"value": enabled, "updated_at": time.time()}},
             upsert=True
         )
+        invalidate_setting("settings", "wallet_system_enabled")
 
     @staticmethod
     def get_wallet(mobile: str) -> Dict:
@@ -155,11 +160,9 @@ class WalletService:
 
             # 2. Load Report Prompt
             prompt_path = os.path.join(os.getcwd(), "guruji_detailed_report_prompt.txt")
-            if os.path.exists(prompt_path):
-                with open(prompt_path, "r", encoding="utf-8") as f:
-                    system_prompt = f.read()
-            else:
-                system_prompt = "Generate a short astrology report for {name} about {category}."
+            system_prompt = read_prompt(
+                prompt_path, default="Generate a short astrology report for {name} about {category}."
+            )
 
             # 3. Format Prompt
             formatted_prompt = system_prompt.format(
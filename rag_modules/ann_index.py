@@ -0,0 +1,158 @@
+import threading
+import numpy as np
+from typing import NamedTuple, Optional, Tuple
+
+from rag_modules.vectorstore import dequantize_rows, score_rows
+
+
+class _IVFState(NamedTuple):
+    """Immutable index state; searches read it once, rebuilds swap in a new one."""
+    centroids: np.ndarray   # (n_lists, dim) float32
+    assign: np.ndarray      # row -> list for rows [0, n_rows)
+    order: np.ndarray       # rows sorted by list
+    offsets: np.ndarray     # list c owns order[offsets[c]:offsets[c + 1]]
+    n_rows: int
+    trained_size: int
+    generation: int
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy.
+
+    Rows are clustered with spherical k-means; a query is scored only against
+    the rows of its n_probe closest clusters. Raising n_probe trades latency
+    for recall (n_probe == n_lists is exact). Below min_size rows the index
+    stays untrained and the vector store falls back to exact search.
+
+    The index relies on the store's append-only row layout: rows appended
+    after the last rebuild are scored exactly as a tail and folded into the
+    lists once the tail grows past tail_ratio of the indexed rows. A new
+    store generation (compaction moved rows) forces a reassignment.
+    Works over float32 or int8 (+ per-row scales) matrices.
+    """
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 min_size: int = 20000, kmeans_iters: int = 10, tail_ratio: float = 0.1,
+                 seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_size = min_size
+        self.kmeans_iters = kmeans_iters
+        self.tail_ratio = tail_ratio
+        self.seed = seed
+
+        self._state: Optional[_IVFState] = None
+        # Only one thread rebuilds at a time; others keep searching exactly
+        self._build_lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # Training
+    # --------------------------------------------------------
+    def _train(self, matrix: np.ndarray, scales: Optional[np.ndarray], size: int) -> np.ndarray:
+        n_lists = self.n_lists or max(1, int(2 * np.sqrt(size)))
+        n_lists = min(n_lists, size)
+        rng = np.random.default_rng(self.seed)
+
+        # Train on a sample; k-means quality saturates well before all rows
+        sample_size = min(size, 64 * n_lists)
+        sample = dequantize_rows(matrix, scales, rng.choice(size, sample_size, replace=False))
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            # Per-cluster sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=n_lists)
+            present = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] < 1e-8
+            # Keep the previous centroid for clusters that lost all points
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        print(f"DEBUG [IVFIndex]: Trained {n_lists} lists over {size} rows.")
+        return centroids
+
+    @staticmethod
+    def _nearest(matrix: np.ndarray, scales: Optional[np.ndarray], start: int, stop: int,
+                 centroids: np.ndarray) -> np.ndarray:
+        """Closest centroid for rows [start, stop)."""
+        assign = np.empty(stop - start, dtype=np.int32)
+        # Assign in slices to bound the temporary score matrix
+        for lo in range(start, stop, 16384):
+            hi = min(lo + 16384, stop)
+            part = dequantize_rows(matrix, scales, slice(lo, hi))
+            assign[lo - start:hi - start] = np.argmax(part @ centroids.T, axis=1)
+        return assign
+
+    def _rebuild(self, state: Optional[_IVFState], matrix: np.ndarray, scales: Optional[np.ndarray],
+                 size: int, generation: int):
+        """Build a new state covering rows [0, size) of matrix and publish it."""
+        if state is None or size > 4 * state.trained_size:
+            # First build, or the corpus has outgrown the centroids
+            centroids = self._train(matrix, scales, size)
+            assign = self._nearest(matrix, scales, 0, size, centroids)
+            trained_size = size
+        elif state.generation != generation or state.n_rows > size:
+            # Rows moved (compaction): reassign everything to the same centroids
+            centroids, trained_size = state.centroids, state.trained_size
+            assign = self._nearest(matrix, scales, 0, size, centroids)
+        else:
+            # Fold the tail into the lists
+            centroids, trained_size = state.centroids, state.trained_size
+            tail = self._nearest(matrix, scales, state.n_rows, size, centroids)
+            assign = np.concatenate([state.assign, tail])
+
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        self._state = _IVFState(centroids, assign, order, offsets, size, trained_size, generation)
+
+    # --------------------------------------------------------
+    # Search
+    # --------------------------------------------------------
+    def search(self, matrix: np.ndarray, size: int, q: np.ndarray, generation: int = 0,
+               scales: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Return (rows, scores) of candidate rows in [0, size) for the
+        normalised query q, or None when exact search should be used (small
+        collection, or another thread is still building the index).
+        """
+        if size < self.min_size:
+            return None
+
+        state = self._state
+        stale = (
+            state is None
+            or state.generation != generation
+            or size > 4 * state.trained_size
+            or size - state.n_rows > self.tail_ratio * state.n_rows
+        )
+        if stale and self._build_lock.acquire(blocking=False):
+            try:
+                self._rebuild(self._state, matrix, scales, size, generation)
+            finally:
+                self._build_lock.release()
+            state = self._state
+
+        if state is None or state.generation != generation:
+            return None
+
+        n_probe = min(self.n_probe, len(state.centroids))
+        probe = np.argpartition(state.centroids @ q, -n_probe)[-n_probe:]
+        rows = np.concatenate(
+            [state.order[state.offsets[c]:state.offsets[c + 1]] for c in probe]
+        )
+        # The state may cover rows appended after this caller's snapshot
+        if state.n_rows > size:
+            rows = rows[rows < size]
+        else:
+            # Rows appended since the last rebuild are scored exactly
+            rows = np.concatenate([rows, np.arange(state.n_rows, size)])
+        if not rows.size:
+            return rows, np.zeros(0, dtype=np.float32)
+        return rows, score_rows(matrix, scales, rows, q)
@@ -1,12 +1,16 @@
 # chat_handler.py
-import os
 import requests
 import json
-from openai import OpenAI
-import google.generativeai as genai
 import re
 from typing import List, Dict, Any
 
+# Pooled clients live in llm_clients; get_openai_client is re-exported for
+# existing callers and now returns the shared client instead of a new one.
+from rag_modules.llm_clients import (
+    get_openai_client, get_async_openai_client, get_gemini_model, llm_slot, openai_usage
+)
+from rag_modules.tokenizer import count_tokens, split_tokens
+
 
 def convert_markdown_to_html(text: str) -> str:
     """
@@ -17,59 +21,77 @@ def convert_markdown_to_html(text: str) -> str:
         return text
     return text.strip()
 
-def apply_token_budget(chunks, max_chars=100000):
+def apply_token_budget(chunks, max_tokens=25000, model="gpt-4o-mini"):
     """
-    Returns a subset of chunks that fits within the max_chars budget.
-    100,000 chars is approx 25k tokens. 
+    Returns the chunks, in order, whose context entries ("[chunk i] text")
+    fit within max_tokens tokens of model's encoding. Chunks that don't fit
+    are skipped so smaller ones after them can still use the budget; a
+    first chunk larger than the whole budget is cut to fit.
     """
     if not chunks:
         return []
 
-    current_chars = 0
+    current_tokens = 0
     selected_chunks = []
-    
+
     for chunk in chunks:
-        # Crude estimate: 
-        text_len = len(chunk['text']) + len(chunk['heading']) + 50 # overhead
-        
-        # If the first chunk itself is larger than max_chars, still include it 
-        # (GPT-4o can handle up to 128k tokens, so a single 30k char chunk is fine)
-        if not selected_chunks or (current_chars + text_len <= max_chars):
+        # Exactly the context entry sent for this chunk, plus the "\n\n" separator
+        entry = f"[chunk {len(selected_chunks) + 1}] {chunk['text']}"
+        entry_tokens = count_tokens(entry, model) + 1
+
+        if current_tokens + entry_tokens <= max_tokens:
             selected_chunks.append(chunk)
-            current_chars += text_len
-        else:
-            break
-            
+            current_tokens += entry_tokens
+        elif not selected_chunks:
+            # The best match alone exceeds the budget: keep as much of it as fits
+            text = split_tokens(chunk["text"], max(1, max_tokens - 10), model)[0]
+            selected_chunks.append({**chunk, "text": text})
+            current_tokens += count_tokens(f"[chunk 1] {text}", model) + 1
+
     return selected_chunks
 
-def get_openai_client(api_key: str = None):
-    if api_key is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set")
-    return OpenAI(api_key=api_key)
+GURUJI_INSTRUCTIONS = (
+    "You are in a live astrology consultation. "
+    "1. Use the provided context for all factual predictions and planetary details. "
+    "2. If a user provides a short response (like 'yes', 'ok', 'go on') to your previous question, "
+    "be conversational and proceed with the relevant details from the context. "
+    "3. If the answer is truly missing from the context and history, say 'Not found in document.' "
+    "4. Review the conversation history and avoid repeating information already shared."
+)
+STREAM_INSTRUCTIONS = "Use ONLY the retrieved context to answer. If missing, say 'Not found in document.'"
 
-def generate_with_openai(system_prompt, context_chunks, conversation_history, question,
-                         model="gpt-4o-mini", api_key=None, json_mode=False):
-
-    client = get_openai_client(api_key)
 
+def _build_context(context_chunks, model):
     # Build context text (apply budget)
-    budgeted_chunks = apply_token_budget(context_chunks)
+    budgeted_chunks = apply_token_budget(context_chunks, model=model)
     context = "\n\n".join([f"[chunk {i+1}] {c['text']}" for i, c in enumerate(budgeted_chunks)])
     print(f"DEBUG [ChatHandler]: Sending context with {len(context)} chars ({len(budgeted_chunks)} chunks).")
+    return context
+
 
-    # Build conversation messages
+def split_volatile_placeholders(prompt: str, values: dict):
+    """
+    Returns (static_prompt, turn_note) for OpenAI prompt caching, which only
+    reuses a byte-identical prefix. Each {{name}} in prompt is replaced by a
+    fixed pointer and its value moves to turn_note ("name: value" lines),
+    which _openai_messages puts at the very end of the request.
+    """
+    notes = []
+    for name, value in values.items():
+        placeholder = "{{" + name + "}}"
+        if placeholder in prompt:
+            prompt = prompt.replace(placeholder, f"[{name}: given at the end of the user's message]")
+            notes.append(f"{name}: {value}")
+    return prompt, "\n".join(notes)
+
+
+def _openai_messages(system_prompt, instructions, context, conversation_history, question, turn_note=None):
+    # Order matters for prompt caching: static system prompt and instructions,
+    # then the append-only history, then everything that changes per turn
+    # (retrieved context, question, turn_note) in the last message.
     messages = [
         {"role": "system", "content": system_prompt},
-        {"role": "system", "content": (
-            "You are in a live astrology consultation. "
-            "1. Use the provided context for all factual predictions and planetary details. "
-            "2. If a user provides a short response (like 'yes', 'ok', 'go on') to your previous question, "
-            "be conversational and proceed with the relevant details from the context. "
-            "3. If the answer is truly missing from the context and history, say 'Not found in document.' "
-            "4. Review the conversation history and avoid repeating information already shared."
-        )}
+        {"role": "system", "content": instructions}
     ]
     # Note: Structure/formatting is controlled by the main system_prompt.
 
@@ -78,45 +100,21 @@ def generate_with_openai(system_prompt, context_chunks, conversation_history, qu
         messages.append({"role": msg["role"], "content": msg["content"]})
 
     # Add new question with context
-    messages.append({
-        "role": "user",
-        "content": f"Context:\n{context}\n\nUser Question: {question}"
-    })
-
-    # Ask model
-    kwargs = {
-        "model": model,
-        "messages": messages
-    }
-    if json_mode:
-        kwargs["response_format"] = {"type": "json_object"}
-
-    resp = client.chat.completions.create(**kwargs)
-
-    ans = resp.choices[0].message.content
-    usage = {
-        "prompt_tokens": resp.usage.prompt_tokens,
-        "completion_tokens": resp.usage.completion_tokens,
-        "total_tokens": resp.usage.total_tokens
-    }
-    return convert_markdown_to_html(ans), usage
-
-def generate_with_gemini(system_prompt, context_chunks, conversation_history, question,
-                         model="gemini-1.5-pro", api_key=None):
-
-    gem_api_key = api_key or os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=gem_api_key)
+    content = f"Context:\n{context}\n\nUser Question: {question}"
+    if turn_note:
+        content += f"\n\n{turn_note}"
+    messages.append({"role": "user", "content": content})
+    return messages
 
-    budgeted_chunks = apply_token_budget(context_chunks)
-    context = "\n\n".join([f"[chunk {i+1}] {c['text']}" for i, c in enumerate(budgeted_chunks)])
 
+def _gemini_prompt(system_prompt, context, conversation_history, question, closing):
     # Build conversation transcript
     chat_history = ""
     for msg in conversation_history:
         role = "User" if msg["role"] == "user" else "Assistant"
         chat_history += f"{role}: {msg['content']}\n"
 
-    prompt = f"""
+    return f"""
         SYSTEM:
         {system_prompt}
 
@@ -129,14 +127,38 @@ def generate_with_gemini(system_prompt, context_chunks, conversation_history, qu
         QUESTION:
         {question}
 
-        Answer naturally as part of the conversation.
-        Use ONLY the context. If answer not found, say 'Not found in document.'
+        {closing}
         """
 
-    model_ai = genai.GenerativeModel(model)
-    res = model_ai.generate_content(prompt)
+
+GEMINI_GENERATE_CLOSING = """Answer naturally as part of the conversation.
+        Use ONLY the context. If answer not found, say 'Not found in document.'"""
+GEMINI_STREAM_CLOSING = "Answer using ONLY context. If missing, say 'Not found in document.'"
+
+
+def _openai_kwargs(system_prompt, context_chunks, conversation_history, question, model, json_mode,
+                   turn_note=None):
+    context = _build_context(context_chunks, model)
+    kwargs = {
+        "model": model,
+        "messages": _openai_messages(system_prompt, GURUJI_INSTRUCTIONS, context, conversation_history,
+                                     question, turn_note)
+    }
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+
+def _openai_result(resp):
+    ans = resp.choices[0].message.content
+    usage = openai_usage(resp.usage)
+    print(f"DEBUG [ChatHandler]: {usage.get('cached_tokens', 0)}/{usage.get('prompt_tokens', 0)} prompt tokens from cache.")
+    return convert_markdown_to_html(ans), usage
+
+
+def _gemini_result(res):
     ans = getattr(res, "text", str(res))
-    
+
     # Gemini token estimation (if usage metadata is available)
     usage = {
         "prompt_tokens": res.usage_metadata.prompt_token_count if hasattr(res, 'usage_metadata') else 0,
@@ -145,30 +167,48 @@ def generate_with_gemini(system_prompt, context_chunks, conversation_history, qu
     }
     return convert_markdown_to_html(ans), usage
 
-def stream_openai(system_prompt, context_chunks, conversation_history, question,
-                  model="gpt-4o-mini", api_key=None):
+
+def generate_with_openai(system_prompt, context_chunks, conversation_history, question,
+                         model="gpt-4o-mini", api_key=None, json_mode=False, turn_note=None):
 
     client = get_openai_client(api_key)
+    kwargs = _openai_kwargs(system_prompt, context_chunks, conversation_history, question, model, json_mode,
+                            turn_note)
+    resp = client.chat.completions.create(**kwargs)
+    return _openai_result(resp)
+
+async def agenerate_with_openai(system_prompt, context_chunks, conversation_history, question,
+                                model="gpt-4o-mini", api_key=None, json_mode=False, turn_note=None):
+    """generate_with_openai on the shared AsyncOpenAI client; doesn't block the event loop."""
+    client = get_async_openai_client(api_key)
+    kwargs = _openai_kwargs(system_prompt, context_chunks, conversation_history, question, model, json_mode,
+                            turn_note)
+    async with llm_slot():
+        resp = await client.chat.completions.create(**kwargs)
+    return _openai_result(resp)
 
-    # Apply Token Budget logic
-    context_chunks = apply_token_budget(context_chunks)
+def generate_with_gemini(system_prompt, context_chunks, conversation_history, question,
+                         model="gemini-1.5-pro", api_key=None):
 
-    # Build context text
-    context = "\n\n".join([f"[chunk {i+1}] {c['text']}" for i, c in enumerate(context_chunks)])
+    context = _build_context(context_chunks, model)
+    prompt = _gemini_prompt(system_prompt, context, conversation_history, question, GEMINI_GENERATE_CLOSING)
+    res = get_gemini_model(model, api_key).generate_content(prompt)
+    return _gemini_result(res)
 
-    # Messages list
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "system", "content": "Use ONLY the retrieved context to answer. If missing, say 'Not found in document.'"}
-    ]
+async def agenerate_with_gemini(system_prompt, context_chunks, conversation_history, question,
+                                model="gemini-1.5-pro", api_key=None):
+    context = _build_context(context_chunks, model)
+    prompt = _gemini_prompt(system_prompt, context, conversation_history, question, GEMINI_GENERATE_CLOSING)
+    async with llm_slot():
+        res = await get_gemini_model(model, api_key).generate_content_async(prompt)
+    return _gemini_result(res)
 
-    for msg in conversation_history:
-        messages.append({"role": msg["role"], "content": msg["content"]})
+def stream_openai(system_prompt, context_chunks, conversation_history, question,
+                  model="gpt-4o-mini", api_key=None):
 
-    messages.append({
-        "role": "user",
-        "content": f"Context:\n{context}\n\nUser Question: {question}"
-    })
+    client = get_openai_client(api_key)
+    context = _build_context(context_chunks, model)
+    messages = _openai_messages(system_prompt, STREAM_INSTRUCTIONS, context, conversation_history, question)
 
     # STREAM response
     stream = client.chat.completions.create(
@@ -184,51 +224,166 @@ def stream_openai(system_prompt, context_chunks, conversation_history, question,
             if hasattr(delta, "content") and delta.content:
                 yield convert_markdown_to_html(delta.content)
 
+async def astream_openai(system_prompt, context_chunks, conversation_history, question,
+                         model="gpt-4o-mini", api_key=None, instructions=STREAM_INSTRUCTIONS,
+                         json_mode=False, usage=None, turn_note=None):
+    """
+    Yields answer text as it arrives. json_mode yields the raw JSON deltas
+    (feed them to StreamingJSONFields); if a usage dict is passed it is
+    filled with the token counts once the stream finishes.
+    """
+    client = get_async_openai_client(api_key)
+    context = _build_context(context_chunks, model)
+    messages = _openai_messages(system_prompt, instructions, context, conversation_history, question, turn_note)
+    kwargs = {"model": model, "messages": messages, "stream": True}
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    if usage is not None:
+        kwargs["stream_options"] = {"include_usage": True}
+
+    async with llm_slot():
+        stream = await client.chat.completions.create(**kwargs)
+        async for chunk in stream:
+            if usage is not None and getattr(chunk, "usage", None):
+                usage.update(openai_usage(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta:
+                delta = chunk.choices[0].delta
+                if hasattr(delta, "content") and delta.content:
+                    # Raw in JSON mode: stripping each delta would eat the spaces between tokens
+                    yield delta.content if json_mode else convert_markdown_to_html(delta.content)
+
+
+class StreamingJSONFields:
+    """
+    Incremental reader for a streamed flat JSON object such as Guruji's
+    {"para1": ..., "para2": ..., "para3": ..., "follow_up": ...}.
+
+    feed(text) takes the next raw piece of the stream and returns a list of
+    ("delta", key, decoded_text) for string values as they grow and
+    ("field", key, full_value) when a string value closes. Escapes
+    (including \\uXXXX and surrogate pairs) may be split across pieces.
+    Non-string values are skipped; json.loads on the full text remains the
+    source of truth once the stream ends.
+    """
 
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self._state = "object"   # object | key | after_key | value | string | other
+        self._key = None
+        self._buf = []
+        self._escape = None      # None, "" after a backslash, or the pending escape text
+        self._high_surrogate = None
+        self._depth = 0
+
+    def _decode_escape(self, esc):
+        if esc[0] != "u":
+            return self._ESCAPES.get(esc, esc)
+        code = int(esc[1:], 16)
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def feed(self, text: str):
+        events = []
+        out = []  # decoded text of the current value within this piece
+        for ch in text:
+            state = self._state
+            if state in ("key", "string"):
+                if self._escape is not None:
+                    self._escape += ch
+                    if self._escape[0] != "u" or len(self._escape) == 5:
+                        decoded = self._decode_escape(self._escape)
+                        self._escape = None
+                        self._buf.append(decoded)
+                        if state == "string":
+                            out.append(decoded)
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    if state == "key":
+                        self._key = "".join(self._buf)
+                        self._state = "after_key"
+                    else:
+                        if out:
+                            events.append(("delta", self._key, "".join(out)))
+                            out = []
+                        value = "".join(self._buf)
+                        self.fields[self._key] = value
+                        events.append(("field", self._key, value))
+                        self._state = "object"
+                    self._buf = []
+                else:
+                    self._buf.append(ch)
+                    if state == "string":
+                        out.append(ch)
+            elif state == "object":
+                if ch == '"':
+                    self._state = "key"
+            elif state == "after_key":
+                if ch == ":":
+                    self._state = "value"
+            elif state == "value":
+                if ch == '"':
+                    self._state = "string"
+                elif ch in "[{":
+                    self._state, self._depth = "other", 1
+                elif not ch.isspace():
+                    # number / true / false / null: runs until the next comma or brace
+                    self._state, self._depth = "other", 0
+            elif state == "other":
+                if self._depth == 0:
+                    if ch in ",}":
+                        self._state = "object"
+                elif ch == '"':
+                    # Strings nested inside arrays/objects are only skipped
+                    self._state = "nested_string"
+                elif ch in "[{":
+                    self._depth += 1
+                elif ch in "]}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = "object"
+            elif state == "nested_string":
+                if self._escape is not None:
+                    self._escape = None
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    self._state = "other"
+        if out:
+            events.append(("delta", self._key, "".join(out)))
+        return events
 
 def stream_gemini(system_prompt, context_chunks, conversation_history, question,
                   model="gemini-1.5-pro", api_key=None):
 
-    gem_api_key = api_key or os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=gem_api_key)
-
-    # Apply Token Budget logic
-    context_chunks = apply_token_budget(context_chunks)
-
-    # Build context text
-    context = "\n\n".join([f"[chunk {i+1}] {c['text']}" for i, c in enumerate(context_chunks)])
-
-    # Build conversation transcript
-    history_text = ""
-    for msg in conversation_history:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        history_text += f"{role}: {msg['content']}\n"
-
-    prompt = f"""
-        SYSTEM:
-        {system_prompt}
-
-        CONVERSATION:
-        {history_text}
-
-        CONTEXT:
-        {context}
-
-        QUESTION:
-        {question}
-
-        Answer using ONLY context. If missing, say 'Not found in document.'
-        """
-
-    model_ai = genai.GenerativeModel(model)
+    context = _build_context(context_chunks, model)
+    prompt = _gemini_prompt(system_prompt, context, conversation_history, question, GEMINI_STREAM_CLOSING)
 
     # STREAM
-    stream = model_ai.generate_content(prompt, stream=True)
+    stream = get_gemini_model(model, api_key).generate_content(prompt, stream=True)
 
     for event in stream:
         if hasattr(event, "text"):
             yield convert_markdown_to_html(event.text)
 
+async def astream_gemini(system_prompt, context_chunks, conversation_history, question,
+                         model="gemini-1.5-pro", api_key=None):
+    context = _build_context(context_chunks, model)
+    prompt = _gemini_prompt(system_prompt, context, conversation_history, question, GEMINI_STREAM_CLOSING)
+
+    async with llm_slot():
+        stream = await get_gemini_model(model, api_key).generate_content_async(prompt, stream=True)
+        async for event in stream:
+            if hasattr(event, "text"):
+                yield convert_markdown_to_html(event.text)
+
 def build_gemini_prompt(system_prompt, chunks, history, question):
     context = "\n\n".join(
         [f"[chunk {i+1}] {c['text']}" for i, c in enumerate(chunks)]
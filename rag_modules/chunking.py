@@ -1,6 +1,12 @@
 from typing import List, Dict, Any
-from bs4 import BeautifulSoup
+from html import escape
+from html.parser import HTMLParser
 import re
+import zlib
+
+import numpy as np
+
+from rag_modules.tokenizer import count_tokens, split_tokens, tail_tokens
 
 # ============================================================
 # MARKDOWN HIERARCHY PARSER
@@ -47,71 +53,347 @@ def extract_hierarchy_from_markdown(md_text: str):
 
 
 # ============================================================
-# HTML HIERARCHY PARSER
+# HTML HIERARCHY PARSER (single-pass, streaming)
 # ============================================================
+# Tags that end the current text block. Inline tags (strong, span, b, ...)
+# are not listed, so their text joins the surrounding block.
+_BLOCK_TAGS = {
+    "p", "li", "div", "ul", "ol", "br", "hr", "section", "article", "header",
+    "footer", "blockquote", "pre", "dl", "dt", "dd", "h5", "h6",
+}
+_HEADING_TAGS = {"h1": 0, "h2": 1, "h3": 2, "h4": 3}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+_TABLE_STRUCTURE_TAGS = {"table", "thead", "tbody", "tfoot", "tr", "td", "th"}
+
+
+class _HierarchyParser(HTMLParser):
+    """
+    Event-driven h1-h4 + content extractor: one pass, no tree. Each text node
+    lands in exactly one record under the heading path current at that point;
+    tables are kept as one record of their original HTML.
+
+    Report HTML is not always well formed (e.g. a table "closed" with a second
+    <table>), so a table also ends at a <table> or h1-h4 outside any cell,
+    rather than swallowing the rest of the document; the tags it left open
+    are closed so the record is still a complete table. Headings inside a
+    cell are just cell content.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records: List[Dict[str, Any]] = []
+        self.path: List[Any] = [None, None, None, None]
+        self._text: List[str] = []
+        self._heading = None      # index into path while inside <h1>-<h4>
+        self._table: List[str] = []
+        self._table_open: List[str] = []  # open table/tr/td/... tags, innermost last
+        self._table_depth = 0
+        self._table_has_text = False
+        self._skip_depth = 0
+
+    def _emit(self, content: str):
+        self.records.append({
+            "h1": self.path[0], "h2": self.path[1], "h3": self.path[2], "h4": self.path[3],
+            "content": content
+        })
+
+    def _flush(self):
+        """End the current text block (heading text is consumed by handle_endtag)."""
+        if self._heading is not None:
+            return
+        text = " ".join("".join(self._text).split())
+        self._text = []
+        if text:
+            self._emit(text)
+
+    def _end_table(self):
+        # Keep the table's markup as-is (no whitespace collapsing); skip empty ones
+        if self._table_has_text:
+            closing = "".join(f"</{tag}>" for tag in reversed(self._table_open))
+            self._emit("".join(self._table) + closing)
+        self._table = []
+        self._table_open = []
+        self._table_depth = 0
+        self._table_has_text = False
+
+    def handle_starttag(self, tag, attrs):
+        if self._table_depth:
+            in_cell = bool(self._table_open) and self._table_open[-1] in ("td", "th")
+            if tag == "table" and in_cell:
+                # Nested table inside a cell
+                self._table_depth += 1
+            elif tag == "table" or (tag in _HEADING_TAGS and not in_cell):
+                # Malformed table: end it and handle the tag normally below
+                self._end_table()
+            if self._table_depth:
+                self._table.append(self.get_starttag_text())
+                if tag in _TABLE_STRUCTURE_TAGS:
+                    self._table_open.append(tag)
+                return
+
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "table":
+            self._flush()
+            self._table = [self.get_starttag_text()]
+            self._table_open = ["table"]
+            self._table_depth = 1
+        elif tag in _HEADING_TAGS:
+            self._flush()
+            self._heading = _HEADING_TAGS[tag]
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        if self._table_depth:
+            self._table.append(self.get_starttag_text())
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if self._table_depth:
+            self._table.append(f"</{tag}>")
+            if tag in self._table_open:
+                # Also pops tags the markup left unclosed inside it
+                del self._table_open[len(self._table_open) - 1 - self._table_open[::-1].index(tag):]
+            if tag == "table":
+                self._table_depth -= 1
+                if not self._table_depth:
+                    self._end_table()
+            return
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _HEADING_TAGS and self._heading is not None:
+            level = self._heading
+            title = " ".join("".join(self._text).split())
+            self._text = []
+            self._heading = None
+            # A heading resets everything below it
+            self.path[level:] = [title or None] + [None] * (3 - level)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._table_depth:
+            self._table.append(escape(data, quote=False))
+            self._table_has_text = self._table_has_text or bool(data.strip())
+        elif not self._skip_depth:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        if self._table_depth:
+            # Unclosed table: keep what was seen
+            self._end_table()
+        self._heading = None
+        self._flush()
+
+
 def extract_hierarchy(html: str):
     """
     Extract h1 → h2 → h3 → h4 → content structure from HTML or text.
+    Single streaming pass; each text node is emitted once and tables are
+    kept intact as HTML.
     """
-    soup = BeautifulSoup(html, "html.parser")
-    records = []
+    parser = _HierarchyParser()
+    parser.feed(html)
+    parser.close()
+    return parser.records
 
-    current_h1 = current_h2 = current_h3 = current_h4 = None
-
-    for tag in soup.find_all(["h1", "h2", "h3", "h4", "p", "li", "div", "ul", "table"]):
-        if tag.name == "table":
-            # Preserve the full HTML of the table so the LLM can see the structure
-            text = str(tag)
-        else:
-            text = tag.get_text(strip=True)
-
-        if tag.name == "h1":
-            current_h1 = text
-            current_h2 = current_h3 = current_h4 = None
-        elif tag.name == "h2":
-            current_h2 = text
-            current_h3 = current_h4 = None
-        elif tag.name == "h3":
-            current_h3 = text
-            current_h4 = None
-        elif tag.name == "h4":
-            current_h4 = text
-        else:
-            if text:
-                records.append({
-                    "h1": current_h1,
-                    "h2": current_h2,
-                    "h3": current_h3,
-                    "h4": current_h4,
-                    "content": text
-                })
 
-    return records
+# ============================================================
+# DEDUPLICATION (between extraction and chunking)
+# ============================================================
+_MINHASH_PRIME = 4294967311  # > 2^32, so a * crc32 fits in uint64
+_MINHASH_RNG = np.random.default_rng(1)
+_MINHASH_A = _MINHASH_RNG.integers(1, _MINHASH_PRIME, 64, dtype=np.uint64)
+_MINHASH_B = _MINHASH_RNG.integers(0, _MINHASH_PRIME, 64, dtype=np.uint64)
+
+
+def make_heading(r):
+    """Hierarchical heading string, most specific first ("h4 - h3 - h2 - h1")."""
+    parts = []
+    if r["h4"]: parts.append(r["h4"])
+    if r["h3"]: parts.append(r["h3"])
+    if r["h2"]: parts.append(r["h2"])
+    if r["h1"]: parts.append(r["h1"])
+    return " - ".join(parts)
+
+
+def _minhash(words: List[str], shingle: int) -> np.ndarray:
+    """64-value MinHash signature of the word shingles of a text."""
+    shingles = {" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _MINHASH_A) + _MINHASH_B) % _MINHASH_PRIME).min(axis=0)
+
+
+def dedupe_records(records: List[Dict[str, Any]], threshold: float = 0.85, shingle: int = 5,
+                   min_words: int = 12):
+    """
+    Drop repeated content within each heading: exact duplicates (after
+    case/whitespace normalisation) and near-duplicates whose estimated
+    Jaccard similarity of word shingles (MinHash) reaches threshold.
+    Records shorter than min_words, and tables, are only deduped exactly.
+    The first occurrence is kept. Returns (records, stats).
+    """
+    kept = []
+    seen_exact = set()
+    signatures: Dict[str, List[np.ndarray]] = {}
+    removed = removed_bytes = 0
+
+    for r in records:
+        heading = make_heading(r)
+        content = r["content"]
+        words = content.lower().split()
+        exact_key = (heading, " ".join(words))
+
+        duplicate = exact_key in seen_exact
+        sig = None
+        if not duplicate and len(words) >= min_words and not content.startswith("<table"):
+            sig = _minhash(words, shingle)
+            duplicate = any(np.mean(sig == other) >= threshold for other in signatures.get(heading, []))
+
+        if duplicate:
+            removed += 1
+            removed_bytes += len(content.encode("utf-8"))
+            continue
+        seen_exact.add(exact_key)
+        if sig is not None:
+            signatures.setdefault(heading, []).append(sig)
+        kept.append(r)
+
+    return kept, {"records_removed": removed, "bytes_removed": removed_bytes}
 
 
 # ============================================================
 # HIERARCHICAL CHUNKING
 # ============================================================
+_TABLE_TAG_RE = re.compile(r"<(/?)(table|tr)\b[^>]*>", re.IGNORECASE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?\u0964])\s+")
+
+
+def _table_rows(table: str):
+    """(opening <table ...> tag, top-level <tr>...</tr> rows) of a table record."""
+    opening, rows = None, []
+    depth, row_start = 0, None
+    for m in _TABLE_TAG_RE.finditer(table):
+        closing, tag = m.group(1), m.group(2).lower()
+        if tag == "table":
+            if not closing and depth == 0:
+                opening = m.group(0)
+            depth += -1 if closing else 1
+        elif depth == 1 and not closing:
+            row_start = m.start()
+        elif depth == 1 and row_start is not None:
+            rows.append(table[row_start:m.end()])
+            row_start = None
+    return opening, rows
+
+
+def _pack(units: List[str], max_tokens: int, wrap=lambda body: body, sep: str = " "):
+    """Greedily join units into pieces of at most max_tokens tokens (after wrap)."""
+    pieces, current = [], []
+    for unit in units:
+        if current and count_tokens(wrap(sep.join(current + [unit]))) > max_tokens:
+            pieces.append(wrap(sep.join(current)))
+            current = []
+        current.append(unit)
+    if current:
+        pieces.append(wrap(sep.join(current)))
+    return pieces
+
+
+def _split_line(line: str, max_tokens: int) -> List[str]:
+    """
+    Cut a line into pieces of at most max_tokens tokens: tables between rows
+    (each piece a complete <table> repeating a header row), prose between
+    sentences, and only what is still too long on token boundaries.
+    """
+    if line.startswith("<table"):
+        opening, rows = _table_rows(line)
+        if opening and rows:
+            header = rows[0] if "<th" in rows[0].lower() else ""
+            if header:
+                rows = rows[1:]
+                if count_tokens(f"{opening}{header}</table>") * 2 > max_tokens:
+                    header = ""  # too big to repeat in every piece
+            wrap = lambda body: f"{opening}{header}{body}</table>"
+            pieces, run = [], []
+            for row in rows:
+                if count_tokens(wrap(row)) <= max_tokens:
+                    run.append(row)
+                    continue
+                # A single row larger than a chunk: cut it on token boundaries
+                pieces.extend(_pack(run, max_tokens, wrap, sep=""))
+                run = []
+                pieces.extend(split_tokens(row, max_tokens))
+            pieces.extend(_pack(run, max_tokens, wrap, sep=""))
+            return pieces
+
+    units = []
+    for sentence in _SENTENCE_RE.split(line):
+        if count_tokens(sentence) > max_tokens:
+            units.extend(split_tokens(sentence, max_tokens))
+        elif sentence:
+            units.append(sentence)
+    return _pack(units, max_tokens)
+
+
+def _overlap_tail(line: str, max_tokens: int) -> str:
+    """
+    The end of line to carry into the next chunk, at most max_tokens tokens:
+    whole trailing rows of a table (as a complete table), whole trailing
+    sentences of prose, else the last tokens. "" when nothing whole fits.
+    """
+    if max_tokens <= 0:
+        return ""
+    if line.startswith("<table"):
+        opening, rows = _table_rows(line)
+        if not opening:
+            return ""
+        carried = []
+        for row in reversed(rows):
+            if "<th" in row.lower() or count_tokens(f"{opening}{row}{''.join(carried)}</table>") > max_tokens:
+                break
+            carried.insert(0, row)
+        return f"{opening}{''.join(carried)}</table>" if carried else ""
+
+    sentences = [s for s in _SENTENCE_RE.split(line) if s]
+    carried = []
+    for sentence in reversed(sentences):
+        if count_tokens(" ".join([sentence] + carried)) > max_tokens:
+            break
+        carried.insert(0, sentence)
+    if carried and len(carried) < len(sentences):
+        return " ".join(carried)
+    return tail_tokens(line, max_tokens)
+
+
 def chunk_hierarchy_for_rag(
     records: List[Dict[str, Any]],
-    chunk_size: int = 1500,  # Increased default slightly to accommodate full tables
-    overlap: int = 300
+    chunk_size: int = 400,  # tokens (~1500 chars)
+    overlap: int = 75,      # tokens carried over from the previous chunk
+    dedupe: bool = True
 ):
     """
     Converts hierarchical records (h1-h4 + content) into chunked blocks.
     Uses line-aware splitting to preserve table rows and list items.
+    Sizes are in tokens (rag_modules.tokenizer): each chunk, heading
+    included, fits in chunk_size, and each new chunk under a heading starts
+    with the last ~overlap tokens of the previous one (whole lines where
+    they fit). A table record is one line; lines longer than a chunk are
+    cut between table rows or sentences (token boundaries as a last
+    resort) into pieces that leave room for the overlap.
+    With dedupe, repeated content under a heading is dropped first (dedupe_records).
     """
 
     chunks = []
 
-    # Build hierarchical heading string
-    def make_heading(r):
-        parts = []
-        if r["h4"]: parts.append(r["h4"])
-        if r["h3"]: parts.append(r["h3"])
-        if r["h2"]: parts.append(r["h2"])
-        if r["h1"]: parts.append(r["h1"])
-        return " - ".join(parts)
+    if dedupe:
+        records, stats = dedupe_records(records)
+        if stats["records_removed"]:
+            print(f"DEBUG [Chunking]: Dedup removed {stats['records_removed']} records "
+                  f"({stats['bytes_removed']} bytes).")
 
     # Group content by heading
     grouped = {}
@@ -123,36 +405,62 @@ def chunk_hierarchy_for_rag(
             grouped[key].append(r["content"])
 
     for heading, contents in grouped.items():
-        
-        # Simple Line-Aware Chunking (User requested removal of Atomic Logic)
-        current_chunk_lines = []
-        current_chunk_size = len(heading) + 2
+        # Token budget for the lines (the heading and blank line come first)
+        budget = max(1, chunk_size - count_tokens(f"{heading}\n\n"))
+        overlap_budget = min(overlap, budget // 2)
 
-        # Flatten all content blocks into lines
+        # Flatten all content blocks into lines (a table stays one line); oversized
+        # lines are cut into pieces that fit next to the overlap carried before them
+        piece_budget = max(1, budget - overlap_budget - 1)
         all_lines = []
         for content_block in contents:
-            all_lines.extend(content_block.splitlines())
+            lines = [content_block] if content_block.startswith("<table") else content_block.splitlines()
+            for line in lines:
+                if count_tokens(line) + 1 > budget:
+                    all_lines.extend(_split_line(line, piece_budget))
+                else:
+                    all_lines.append(line)
+
+        current_chunk_lines = []
+        current_tokens = 0
+        fresh = 0  # lines in the current chunk that are not overlap
 
         for line in all_lines:
-            line_len = len(line) + 1
-            
-            # If adding this line exceeds chunk size, start a new chunk
-            # Note: If a single line is massive (> chunk_size), it will create an oversized chunk.
-            # But we rely on token budgeting in retrieval to handle context size.
-            if (current_chunk_size + line_len > chunk_size) and current_chunk_lines:
+            line_tokens = count_tokens(line) + 1  # + newline
+
+            # If adding this line exceeds the budget, start a new chunk
+            if current_tokens + line_tokens > budget and fresh:
                 chunk_text = f"{heading}\n\n" + "\n".join(current_chunk_lines)
                 chunks.append({"heading": heading, "text": chunk_text})
-                
-                # Simple overlap could be added here, but for now we reset cleanly 
-                # to avoid complexity as per user request.
-                current_chunk_lines = []
-                current_chunk_size = len(heading) + 2
-            
+
+                # Carry the trailing lines that fit in the overlap budget
+                carried = []
+                carried_tokens = 0
+                for prev in reversed(current_chunk_lines):
+                    prev_tokens = count_tokens(prev) + 1
+                    if carried_tokens + prev_tokens > overlap_budget:
+                        break
+                    carried.insert(0, prev)
+                    carried_tokens += prev_tokens
+                if not carried and overlap_budget > 1:
+                    # Last line is longer than the overlap: carry its final rows/sentences/tokens
+                    tail = _overlap_tail(current_chunk_lines[-1], overlap_budget - 1)
+                    if tail:
+                        carried = [tail]
+                        carried_tokens = count_tokens(tail) + 1
+                # Drop overlap that would leave no room for the new line
+                while carried and carried_tokens + line_tokens > budget:
+                    carried_tokens -= count_tokens(carried.pop(0)) + 1
+                current_chunk_lines = carried
+                current_tokens = carried_tokens
+                fresh = 0
+
             current_chunk_lines.append(line)
-            current_chunk_size += line_len
-            
+            current_tokens += line_tokens
+            fresh += 1
+
         # Final flush
-        if current_chunk_lines:
+        if fresh:
             chunk_text = f"{heading}\n\n" + "\n".join(current_chunk_lines)
             chunks.append({"heading": heading, "text": chunk_text})
 
@@ -0,0 +1,164 @@
+# context_compression.py
+# Optional stage between retrieval and generation. Retrieved report chunks
+# are long and mostly off-topic for the question, and prompt tokens
+# dominate generation latency. This keeps, within each chunk, the sentences
+# that best match the query (BM25 over the retrieved sentences, weighted by
+# the chunk's retrieval score), minifies table markup, drops table rows
+# already seen, and stops at a token budget. Everything runs locally.
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from rag_modules.tokenizer import count_tokens
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=\S)")
+# A table, possibly cut off by the chunk end
+_TABLE_RE = re.compile(r"<table\b.*?(?:</table>|$)", re.IGNORECASE | re.DOTALL)
+# The tail of a table cut off by the chunk start
+_TABLE_TAIL_RE = re.compile(r"^(?:(?!<table\b).)*?</table>", re.IGNORECASE | re.DOTALL)
+_ROW_RE = re.compile(r"<tr\b.*?</tr>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "please", "tell", "that", "the", "this", "to", "what", "when",
+    "which", "will", "with", "you", "your", "about", "get", "any", "there", "have", "has"
+}
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _minify_table(html: str) -> str:
+    return re.sub(r">\s+<", "><", html.strip())
+
+
+def _row_key(row_html: str) -> str:
+    return " ".join(_TAG_RE.sub(" ", row_html).split()).lower()
+
+
+def _split_units(body: str):
+    """Chunk body -> [(kind, text)]: "sentence" units of prose, "table" units of table HTML."""
+    units = []
+    pos = 0
+    tail = _TABLE_TAIL_RE.match(body)
+    if tail:
+        units.append(("table", tail.group(0)))
+        pos = tail.end()
+    for m in _TABLE_RE.finditer(body, pos):
+        units.extend(_prose_units(body[pos:m.start()]))
+        units.append(("table", m.group(0)))
+        pos = m.end()
+    units.extend(_prose_units(body[pos:]))
+    return units
+
+
+def _prose_units(text: str):
+    units = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        units.extend(("sentence", s) for s in _SENTENCE_RE.split(line) if s.strip())
+    return units
+
+
+class _BM25:
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.docs = [Counter(d) for d in docs]
+        self.lengths = [len(d) for d in docs]
+        self.avg_len = (sum(self.lengths) / len(docs)) if docs else 0.0
+        self.k1, self.b = k1, b
+        df = Counter(t for d in self.docs for t in d)
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def score(self, i: int, query: List[str]) -> float:
+        tf, length = self.docs[i], self.lengths[i]
+        s = 0.0
+        for t in query:
+            f = tf.get(t)
+            if f:
+                s += self.idf[t] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1)))
+        return s
+
+
+def compress_chunks(chunks: List[Dict[str, Any]], query: str, max_tokens: int = 1500,
+                    scores: Optional[List[float]] = None, model: str = "gpt-4o-mini"):
+    """
+    Returns (compressed chunks, stats). Each chunk keeps its first line
+    (the heading path) and its best sentences in original order; tables are
+    minified and rows already seen in an earlier chunk are dropped. Units
+    are added best-first (BM25 against query, scaled by the chunk's
+    retrieval score) until max_tokens is reached; every chunk keeps at
+    least its best sentence. stats has tokens_before / tokens_after and
+    duplicate_rows.
+    """
+    tokens_before = sum(count_tokens(c["text"], model) for c in chunks)
+    query_terms = _terms(query)
+    if scores is None:
+        # Retrieval order as a weak prior
+        scores = [1.0 / (1 + i) for i in range(len(chunks))]
+    top = max(scores) if scores else 0
+    priors = [(s / top) if top > 0 else 1.0 for s in scores]
+
+    # (chunk index, position, kind, text) for every unit of every chunk
+    heads, units = [], []
+    seen_rows = set()
+    duplicate_rows = 0
+    for ci, chunk in enumerate(chunks):
+        head, _, body = chunk["text"].partition("\n")
+        heads.append(head)
+        for pos, (kind, text) in enumerate(_split_units(body)):
+            if kind == "table":
+                # Only complete rows survive; a row cut by chunking is dropped
+                rows = _ROW_RE.findall(text)
+                kept = []
+                for ri, row in enumerate(rows):
+                    key = _row_key(row)
+                    # The header row is kept with its table even if repeated
+                    if ri > 0 and key in seen_rows:
+                        duplicate_rows += 1
+                        continue
+                    seen_rows.add(key)
+                    kept.append(row)
+                if len(kept) < 2:
+                    # Nothing left beyond a header row
+                    continue
+                text = _minify_table("<table>" + "".join(kept) + "</table>")
+            units.append((ci, pos, kind, text))
+
+    bm25 = _BM25([_terms(_TAG_RE.sub(" ", u[3])) for u in units])
+    ranked = []
+    for i, (ci, pos, kind, text) in enumerate(units):
+        relevance = bm25.score(i, query_terms)
+        # Ties (no term overlap, e.g. a Hindi question) fall back to chunk rank, then position
+        ranked.append((relevance * priors[ci], priors[ci], -pos, i))
+    ranked.sort(reverse=True)
+
+    used = sum(count_tokens(h, model) for h in heads)
+    keep = set()
+    # Best unit of every chunk first, then best-first across chunks
+    best_per_chunk = {}
+    for entry in ranked:
+        best_per_chunk.setdefault(units[entry[3]][0], entry[3])
+    required = set(best_per_chunk.values())
+    order = list(best_per_chunk.values()) + [e[3] for e in ranked if e[3] not in required]
+    for i in order:
+        cost = count_tokens(units[i][3], model)
+        if used + cost > max_tokens and i not in required:
+            continue
+        keep.add(i)
+        used += cost
+
+    compressed = []
+    for ci, chunk in enumerate(chunks):
+        parts = [units[i][3] for i in sorted(keep) if units[i][0] == ci]
+        text = heads[ci] + ("\n" + " ".join(parts) if parts else "")
+        compressed.append({**chunk, "text": text})
+
+    tokens_after = sum(count_tokens(c["text"], model) for c in compressed)
+    return compressed, {"tokens_before": tokens_before, "tokens_after": tokens_after,
+                        "duplicate_rows": duplicate_rows}
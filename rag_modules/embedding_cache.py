@@ -0,0 +1,183 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query ("Tell me  more" == "tell me more")."""
+    return " ".join(text.lower().split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Cache key for an embedding of text under model."""
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """
+    Persistent embedding tier in a local SQLite file. Vectors are stored as
+    raw float32 blobs keyed by cache_key; survives restarts and is shared by
+    worker processes on the same host.
+
+    With max_rows set the file is bounded: rows carry a last_used time
+    (refreshed on every hit) and put() prunes the least recently used rows
+    once the table grows past max_rows. The count is checked every
+    prune_every puts so the common put stays a single insert.
+    """
+
+    def __init__(self, path: str, max_rows: Optional[int] = None, prune_every: Optional[int] = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_rows = max_rows
+        self.prune_every = prune_every or (max(1, max_rows // 100) if max_rows else None)
+        self._puts_since_prune = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL, last_used REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_used" not in columns:
+                # Files written before the size bound
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL")
+                self._conn.execute("UPDATE embeddings SET last_used = created")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+        if self.max_rows is not None:
+            self.prune()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector, created FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.max_rows is not None:
+                self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, key: str, vector: np.ndarray):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now)
+            )
+            self._conn.commit()
+            self._puts_since_prune += 1
+            due = self.max_rows is not None and self._puts_since_prune >= self.prune_every
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete the least recently used rows beyond max_rows; returns how many were removed."""
+        if self.max_rows is None:
+            return 0
+        with self._lock:
+            self._puts_since_prune = 0
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            excess = count - self.max_rows
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (excess,)
+            )
+            self._conn.commit()
+        print(f"DEBUG [EmbeddingCache]: Pruned {excess} least recently used rows from {self.path}")
+        return excess
+
+
+class EmbeddingCache:
+    """
+    Bounded in-process LRU of embeddings with an optional TTL and an optional
+    persistent tier (anything with get(key, max_age) / put(key, vector), e.g.
+    SQLiteEmbeddingStore). Persistent hits are promoted into the LRU.
+    Thread-safe; stats() reports hit rates for the admin dashboard.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = None,
+                 persistent: Optional[Any] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+
+        # key -> (float32 vector, insert time), least recently used first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.ttl_seconds is not None and now - entry[1] > self.ttl_seconds:
+                    del self._entries[key]
+                    self._stats["expired"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+
+        vector = None
+        if self.persistent is not None:
+            try:
+                vector = self.persistent.get(key, max_age=self.ttl_seconds)
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+
+        with self._lock:
+            if vector is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["persistent_hits"] += 1
+            self._insert(key, vector, now)
+        return vector
+
+    def put(self, key: str, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._insert(key, vector, time.time())
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, vector)
+            except Exception as e:
+                print(f"Error writing embedding cache: {e}")
+
+    def _insert(self, key: str, vector: np.ndarray, now: float):
+        self._entries[key] = (vector, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        return [self.get(k) for k in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = type(self.persistent).__name__ if self.persistent is not None else None
+        return stats
@@ -0,0 +1,110 @@
+# ingest.py
+# Multi-document ingestion: HTML parsing + chunking in a process pool,
+# embedding + indexing in threads, so CPU work on one document overlaps the
+# embedding API calls of another and never runs on the event loop.
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
+
+from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag
+
+
+def chunk_document(doc_id: str, html: str) -> Tuple[str, List[Dict[str, Any]], Dict[str, float]]:
+    """Process-pool worker: parse and chunk one document; returns (doc_id, chunks, timings)."""
+    t0 = time.perf_counter()
+    records = extract_hierarchy(html)
+    t1 = time.perf_counter()
+    chunks = chunk_hierarchy_for_rag(records)
+    t2 = time.perf_counter()
+    for i, c in enumerate(chunks):
+        c["doc_id"] = doc_id
+        c["chunk_index"] = i
+    return doc_id, chunks, {"parse_s": t1 - t0, "chunk_s": t2 - t1}
+
+
+class IngestionPipeline:
+    """
+    ingest([(doc_id, file_name, html), ...]) parses and chunks documents on
+    a process pool and, as each one finishes, hands its chunks to a thread
+    that embeds (RAGEngine.embed_chunks) and indexes (add_document) them.
+    Returns per-document chunk counts and per-stage timings: parse/chunk
+    are CPU seconds summed over workers, embed/index are summed thread
+    seconds, wall is end to end.
+    """
+
+    def __init__(self, engine, vectorstore, workers: int = None, embed_workers: int = 2):
+        self.engine = engine
+        self.vectorstore = vectorstore
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.embed_workers = embed_workers
+        # Created on first use and kept warm across requests. ingest() runs
+        # in executor threads, so creation is locked: concurrent first calls
+        # must not each start a process pool.
+        self._process_pool = None
+        self._thread_pool = None
+        self._pools_lock = threading.Lock()
+
+    def _pools(self):
+        with self._pools_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.embed_workers)
+            return self._process_pool, self._thread_pool
+
+    def _embed_and_index(self, doc_id: str, file_name: str, chunks: List[Dict[str, Any]]):
+        t0 = time.perf_counter()
+        chunks = self.engine.embed_chunks(chunks)
+        t1 = time.perf_counter()
+        self.vectorstore.add_document(doc_id, file_name, chunks)
+        t2 = time.perf_counter()
+        indexed = sum(1 for c in chunks if not c.get("embedding_pending"))
+        return doc_id, len(chunks), indexed, {"embed_s": t1 - t0, "index_s": t2 - t1}
+
+    def ingest(self, documents: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+        t_start = time.perf_counter()
+        process_pool, thread_pool = self._pools()
+        file_names = {doc_id: file_name for doc_id, file_name, _ in documents}
+        timings = {"parse_s": 0.0, "chunk_s": 0.0, "embed_s": 0.0, "index_s": 0.0}
+        docs: Dict[str, Dict[str, int]] = {}
+        errors: Dict[str, str] = {}
+
+        chunk_futures = {
+            process_pool.submit(chunk_document, doc_id, html): doc_id for doc_id, _, html in documents
+        }
+        embed_futures = {}
+        # Start embedding each document as soon as its chunks are ready
+        for future in as_completed(chunk_futures):
+            doc_id = chunk_futures[future]
+            try:
+                _, chunks, stage = future.result()
+            except Exception as e:
+                print(f"Error chunking {doc_id}: {e}")
+                errors[doc_id] = str(e)
+                continue
+            for k, v in stage.items():
+                timings[k] += v
+            embed_futures[thread_pool.submit(self._embed_and_index, doc_id, file_names[doc_id], chunks)] = doc_id
+
+        for future in as_completed(embed_futures):
+            doc_id = embed_futures[future]
+            try:
+                _, n_chunks, n_indexed, stage = future.result()
+            except Exception as e:
+                print(f"Error indexing {doc_id}: {e}")
+                errors[doc_id] = str(e)
+                continue
+            for k, v in stage.items():
+                timings[k] += v
+            docs[doc_id] = {"chunks": n_chunks, "indexed": n_indexed}
+
+        timings = {k: round(v, 3) for k, v in timings.items()}
+        timings["wall_s"] = round(time.perf_counter() - t_start, 3)
+        print(f"DEBUG [Ingest]: {len(docs)} docs, {sum(d['chunks'] for d in docs.values())} chunks; timings {timings}")
+        return {"docs": docs, "errors": errors, "timings": timings}
+
+    async def ingest_async(self, documents: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+        """ingest() off the event loop, for FastAPI handlers and background tasks."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.ingest, documents)
@@ -0,0 +1,138 @@
+# llm_clients.py
+# Shared, pooled LLM clients. Building an OpenAI client per request opens a
+# new connection pool (and TLS handshake) every time; these are created once
+# per API key and reused with keep-alive connections.
+#
+# Config (env):
+#   LLM_TIMEOUT_S          total request timeout (default 60)
+#   LLM_CONNECT_TIMEOUT_S  connect timeout (default 5)
+#   LLM_MAX_CONNECTIONS    pooled connections per client (default 100)
+#   LLM_MAX_CONCURRENCY    in-flight LLM calls per process (default 50)
+#   LLM_MAX_RETRIES        SDK retries on 429/5xx/timeouts (default 2)
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+import google.generativeai as genai
+
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "50"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_sync_clients = {}
+_gemini_models = {}
+_gemini_key = None
+# Per-loop state is keyed on the loop object itself, not id(loop): an id can
+# be reused by a later loop, which would inherit a dead loop's pool or
+# semaphore. Entries of closed loops are dropped on the next lookup.
+_async_clients = weakref.WeakKeyDictionary()  # loop -> {api_key: AsyncOpenAI}
+_semaphores = weakref.WeakKeyDictionary()     # loop -> asyncio.Semaphore
+
+
+def _timeout():
+    return httpx.Timeout(LLM_TIMEOUT_S, connect=LLM_CONNECT_TIMEOUT_S)
+
+
+def _limits():
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS, keepalive_expiry=60)
+
+
+def _for_running_loop(table, factory):
+    """table[running loop], created with factory() on first use (caller holds _lock)."""
+    loop = asyncio.get_running_loop()
+    for closed in [other for other in table if other.is_closed()]:
+        del table[closed]
+    value = table.get(loop)
+    if value is None:
+        value = table[loop] = factory()
+    return value
+
+
+def _resolve_key(api_key):
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set")
+    return api_key
+
+
+def get_openai_client(api_key: str = None) -> OpenAI:
+    """Process-wide synchronous OpenAI client for api_key (pooled, keep-alive)."""
+    api_key = _resolve_key(api_key)
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key, max_retries=LLM_MAX_RETRIES, timeout=_timeout(),
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout())
+            )
+            _sync_clients[api_key] = client
+    return client
+
+
+def get_async_openai_client(api_key: str = None) -> AsyncOpenAI:
+    """
+    AsyncOpenAI client for api_key on the running event loop (pooled,
+    keep-alive). httpx async pools are tied to the loop that created them,
+    hence one client per (key, loop); uvicorn has one loop per worker.
+    """
+    api_key = _resolve_key(api_key)
+    with _lock:
+        clients = _for_running_loop(_async_clients, dict)
+        client = clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key, max_retries=LLM_MAX_RETRIES, timeout=_timeout(),
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            )
+            clients[api_key] = client
+    return client
+
+
+def get_gemini_model(model: str, api_key: str = None):
+    """Cached GenerativeModel; genai is configured once per key rather than per call."""
+    global _gemini_key
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    with _lock:
+        if api_key != _gemini_key:
+            genai.configure(api_key=api_key)
+            _gemini_key = api_key
+            _gemini_models.clear()
+        model_ai = _gemini_models.get(model)
+        if model_ai is None:
+            model_ai = genai.GenerativeModel(model)
+            _gemini_models[model] = model_ai
+    return model_ai
+
+
+def openai_usage(usage) -> dict:
+    """
+    Token usage as a plain dict. cached_tokens is the part of the prompt
+    served from OpenAI's prompt cache (identical prefixes of 1024+ tokens),
+    billed at a discount and faster to process.
+    """
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+    }
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Bound the number of in-flight async LLM calls (LLM_MAX_CONCURRENCY) on this loop."""
+    with _lock:
+        sem = _for_running_loop(_semaphores, lambda: asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+    async with sem:
+        yield
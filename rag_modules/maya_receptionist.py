@@ -1,81 +1,328 @@
 
 import json
 import os
-from rag_modules.chat_handler import get_openai_client
+import re
+import numpy as np
+from rag_modules.llm_clients import get_openai_client, get_async_openai_client, llm_slot, openai_usage
+from rag_modules.prompt_cache import read_prompt
 from pydantic import BaseModel, Field, ValidationError
 
 def load_maya_prompt():
-    prompt_path = "maya_system_prompt.txt"
-    if os.path.exists(prompt_path):
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
-    return "" 
+    # Served from memory; re-read only when the file changes
+    return read_prompt("maya_system_prompt.txt", default="")
 
-def check_with_maya(question: str, history: list, user_details: dict = None) -> dict:
+def _maya_messages(system_prompt: str, question: str, history: list, user_details: dict = None) -> list:
+    # Prepare valid messages for OpenAI
+    messages = [{"role": "system", "content": system_prompt}]
+
+    # Inject User Context if available
+    if user_details:
+        user_context = (
+            f"Current User Details:\n"
+            f"Name: {user_details.get('name', 'Unknown')}\n"
+            f"Date of Birth: {user_details.get('dob', 'Unknown')}\n"
+            f"Time of Birth: {user_details.get('tob', 'Unknown')}\n"
+            f"Place of Birth: {user_details.get('pob', 'Unknown')}\n"
+            f"Gender: {user_details.get('gender', 'Unknown')}\n"
+            f"Chart Style: {user_details.get('chart_style', 'Unknown')}\n"
+            f"Note: The user is already registered with these details. Do NOT ask for them again."
+        )
+        messages.append({"role": "system", "content": user_context})
+
+    # Add last 2 turns of history for context
+    recent_history = history[-3:] if history else []
+    for msg in recent_history:
+         messages.append({"role": msg["role"], "content": msg["content"]})
+
+    messages.append({"role": "user", "content": question})
+    return messages
+
+def _parse_maya_response(content: str) -> dict:
+    print(f"MAYA RAW RESPONSE: {content}")
+
+    try:
+        result = json.loads(content)
+        # Ensure pass_to_guruji defaults to True if missing
+        if "pass_to_guruji" not in result:
+            result["pass_to_guruji"] = False
+    except json.JSONDecodeError as e:
+        print(f"MAYA JSON ERROR: {e}. Fallback to default.")
+        result = {
+            "response_message": "",
+            "pass_to_guruji": False
+        }
+
+    print(f"MAYA FINAL JSON: {result}")
+    return result
+
+# ---------------------------------------------------------
+# Local fast path: settle clear cases before the LLM call
+# ---------------------------------------------------------
+# Canned replies are the ones the Maya prompt prescribes for these cases.
+IDENTITY_REPLY = ("I am Maya, the moderator for this session. I cannot pass technical or meta-questions "
+                  "to Guruji. Please ask a question related to your horoscope or life path.")
+VAGUE_REPLY = ("Guruji needs a specific area of focus to guide you. "
+               "Would you like to know about your career, relationships, or health?")
+
+_FOLLOW_UPS = {
+    "yes", "yeah", "yep", "ya", "haan", "han", "ha", "ji", "haan ji", "ji haan", "no", "nope", "nahi",
+    "nahin", "not yet", "nothing", "ok", "okay", "sure", "go on", "continue", "please continue",
+    "tell me more", "more", "and", "then", "what else", "anything else", "ok tell me more"
+}
+_VAGUE = {
+    "tell me something", "what does my future hold", "what is my future", "tell me my future",
+    "my future", "predict my future", "tell me about my future", "future"
+}
+_IDENTITY_RE = re.compile(
+    r"\b(are|r)\s+(you|u)\s+(an?\s+)?(ai|bot|robot|chatbot|human|real|machine|computer|program)\b"
+    r"|\b(chat\s?gpt|openai|gpt|llm|language model)\b"
+    r"|\bwho\s+(made|built|created|trained|programmed)\s+(you|u)\b"
+)
+# Only terms that are astrological on their own: life areas ("job", "husband",
+# "money") also appear in off-topic asks Maya has to turn away, so those are
+# left to the centroid layer and the LLM.
+_ASTRO_RE = re.compile(
+    r"\b(horoscope|kundli|kundali|birth\s?chart|natal\s?chart|dasha|mahadasha|antardasha|antar\s?dasha|"
+    r"nakshatra|lagna|ascendant|rashi|sade\s?sati|manglik|mangal\s?dosha|kaal\s?sarp|pitra\s?dosh|dosha|"
+    r"rahu|ketu|shani|saturn\s+return|gochar|navamsa|moon\s+sign|sun\s+sign|rising\s+sign|zodiac|"
+    r"astrology|astrological|astrologer|jyotish)\b"
+)
+_QUESTION_RE = re.compile(
+    r"\?\s*$|^(when|will|what|how|should|is|are|can|could|which|why|where|do|does|tell|please|explain|"
+    r"kab|kya|kaise|kaisa|kaisi)\b"
+)
+
+
+def _normalize_message(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s?']", " ", text.lower()).split()).strip(" ?")
+
+
+def _is_guruji_turn(message: dict) -> bool:
+    # Client history marks assistant turns with "assistant" (see /history);
+    # conversation_history records carry it as the role
+    return message.get("assistant") == "guruji" or message.get("role") == "guruji"
+
+
+class MayaFastPath:
+    """
+    Two-layer local pre-classifier for Maya's gatekeeping decision.
+
+    1. Rules (microseconds): identity/meta questions -> REFUSE and fully
+       vague asks -> CLARIFY with the prompt's canned replies; short
+       follow-ups right after a Guruji answer and questions naming an
+       astrology-specific term ("when does my Rahu mahadasha end?") -> PROCEED.
+    2. Nearest centroid over query embeddings, trained from logged
+       maya_json decisions (scripts/train_maya_fastpath.py). Only a
+       confident PROCEED is settled here; anything else goes to the LLM.
+
+    classify() returns a Maya-shaped result with "fast_path" set, or None
+    to fall back to the LLM.
+    """
+
+    def __init__(self, centroids: np.ndarray = None, labels: list = None,
+                 min_similarity: float = 0.45, min_margin: float = 0.05, min_words: int = 4):
+        self.centroids = centroids
+        self.labels = labels or []
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        # Shorter messages mean little without the history, which the embedding does not see
+        self.min_words = min_words
+
+    # -- rules ------------------------------------------------
+    def classify_rules(self, question: str, history: list):
+        text = _normalize_message(question)
+        if not text:
+            return None
+        if _IDENTITY_RE.search(text):
+            return self._result("REFUSE", IDENTITY_REPLY, "rules", 1.0)
+        if text in _VAGUE:
+            return self._result("CLARIFY", VAGUE_REPLY, "rules", 1.0)
+        if text in _FOLLOW_UPS:
+            # "yes"/"go on" continues Guruji's answer; after one of Maya's own
+            # turns (a clarifying question, a refusal) it is hers to judge
+            if history and _is_guruji_turn(history[-1]):
+                return self._result("PROCEED", "", "rules", 1.0)
+            return None
+        if len(text.split()) >= 3 and _ASTRO_RE.search(text) and _QUESTION_RE.search(question.lower().strip()):
+            return self._result("PROCEED", "", "rules", 1.0)
+        return None
+
+    # -- nearest centroid -------------------------------------
+    def wants_embedding(self, question: str) -> bool:
+        return self.centroids is not None and len(question.split()) >= self.min_words
+
+    def classify_vector(self, query_vector):
+        """(label, best similarity, margin over the runner-up) or None without centroids / a usable vector."""
+        if self.centroids is None:
+            return None
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return None
+        sims = self.centroids @ (q / norm)
+        order = np.argsort(-sims)
+        best = float(sims[order[0]])
+        margin = best - float(sims[order[1]]) if len(order) > 1 else best
+        return self.labels[int(order[0])], best, margin
+
+    def classify_embedding(self, query_vector):
+        scored = self.classify_vector(query_vector)
+        if scored is None:
+            return None
+        label, best, margin = scored
+        if label == "PROCEED" and best >= self.min_similarity and margin >= self.min_margin:
+            return self._result("PROCEED", "", "centroid", round(margin, 4))
+        return None
+
+    def classify(self, question: str, history: list, embed=None, search_query: str = None):
+        """embed(search_query or question) feeds the centroid layer; centroids are trained on retrieval queries."""
+        result = self.classify_rules(question, history)
+        if result is None and embed is not None and self.wants_embedding(question):
+            result = self.classify_embedding(embed(search_query or question))
+        return result
+
+    @staticmethod
+    def _result(category: str, message: str, layer: str, confidence: float) -> dict:
+        return {"category": category, "response_message": message, "pass_to_guruji": category == "PROCEED",
+                "fast_path": layer, "confidence": confidence}
+
+    # -- training / persistence -------------------------------
+    @staticmethod
+    def train(vectors, labels: list, **kwargs) -> "MayaFastPath":
+        """One unit-length centroid per label from (query embedding, Maya category) examples."""
+        X = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(X, axis=1)
+        # Zero rows are failed embedding calls
+        keep = norms > 0
+        X = X[keep] / norms[keep][:, None]
+        y = np.asarray(labels)[keep]
+        names = sorted(set(y.tolist()))
+        centroids = np.stack([X[y == name].mean(axis=0) for name in names])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        return MayaFastPath(centroids, names, **kwargs)
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, labels=np.asarray(self.labels))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str, **kwargs) -> "MayaFastPath":
+        data = np.load(path)
+        return MayaFastPath(data["centroids"].astype(np.float32), [str(x) for x in data["labels"]], **kwargs)
+
+
+_fast_path = None
+_fast_path_version = None
+
+
+def get_fast_path():
+    """
+    Shared MayaFastPath when MAYA_FASTPATH=on, else None (the default, until
+    centroids have been trained and checked with
+    scripts/train_maya_fastpath.py). Centroids come from MAYA_CENTROIDS_PATH
+    and are reloaded when the file changes; without the file only the rules
+    layer runs.
+    """
+    global _fast_path, _fast_path_version
+    if os.getenv("MAYA_FASTPATH", "off").lower() != "on":
+        return None
+    path = os.getenv("MAYA_CENTROIDS_PATH", "embedding_cache/maya_centroids.npz")
+    try:
+        st = os.stat(path)
+        version = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        version = None
+    if _fast_path is None or version != _fast_path_version:
+        kwargs = {
+            "min_similarity": float(os.getenv("MAYA_FASTPATH_MIN_SIM", "0.45")),
+            "min_margin": float(os.getenv("MAYA_FASTPATH_MARGIN", "0.05"))
+        }
+        try:
+            _fast_path = MayaFastPath.load(path, **kwargs) if version else MayaFastPath(**kwargs)
+        except Exception as e:
+            print(f"MAYA FASTPATH: could not load centroids from {path}: {e}")
+            _fast_path = MayaFastPath(**kwargs)
+        _fast_path_version = version
+    return _fast_path
+
+
+def _maya_failsafe(e: Exception) -> dict:
+    print(f"MAYA ERROR: {e}")
+    import traceback
+    print(f"MAYA TRACEBACK: {traceback.format_exc()}")
+    # Fail safe
+    return {
+        "response_message": "",
+        "pass_to_guruji": False
+    }
+
+def check_with_maya(question: str, history: list, user_details: dict = None, embed=None,
+                    search_query: str = None) -> dict:
     """
     Analyzes the question using Maya's logic.
     Returns dict from JSON: {"response_message": str, "pass_to_guruji": bool, ...}
+    Clear cases are settled by the local fast path (result has "fast_path");
+    embed(text) -> vector enables its centroid layer, which embeds
+    search_query (the retrieval query) when given.
     """
-    SYSTEM_PROMPT = load_maya_prompt() # Reload prompt on every request
+    fast_path = get_fast_path()
+    if fast_path is not None:
+        result = fast_path.classify(question, history, embed=embed, search_query=search_query)
+        if result is not None:
+            print(f"DEBUG: Maya fast path ({result['fast_path']}): {result['category']}")
+            return result
+
+    SYSTEM_PROMPT = load_maya_prompt() # Picks up edits to the prompt file
     print(f"DEBUG: LOADED PROMPT LENGTH: {len(SYSTEM_PROMPT)}")
     try:
         client = get_openai_client()
-        
-        # Prepare valid messages for OpenAI
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        
-        # Inject User Context if available
-        if user_details:
-            user_context = (
-                f"Current User Details:\n"
-                f"Name: {user_details.get('name', 'Unknown')}\n"
-                f"Date of Birth: {user_details.get('dob', 'Unknown')}\n"
-                f"Time of Birth: {user_details.get('tob', 'Unknown')}\n"
-                f"Place of Birth: {user_details.get('pob', 'Unknown')}\n"
-                f"Gender: {user_details.get('gender', 'Unknown')}\n"
-                f"Chart Style: {user_details.get('chart_style', 'Unknown')}\n"
-                f"Note: The user is already registered with these details. Do NOT ask for them again."
-            )
-            messages.append({"role": "system", "content": user_context})
-
-        # Add last 2 turns of history for context
-        recent_history = history[-3:] if history else []
-        for msg in recent_history:
-             messages.append({"role": msg["role"], "content": msg["content"]})
-             
-        messages.append({"role": "user", "content": question})
-        
         response = client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=messages,
+            messages=_maya_messages(SYSTEM_PROMPT, question, history, user_details),
             response_format={"type": "json_object"},
             temperature=0.0
         )
-        
-        content = response.choices[0].message.content
-        print(f"MAYA RAW RESPONSE: {content}")
-        
-        try:
-            result = json.loads(content)
-            # Ensure pass_to_guruji defaults to True if missing
-            if "pass_to_guruji" not in result:
-                result["pass_to_guruji"] = False
-        except json.JSONDecodeError as e:
-            print(f"MAYA JSON ERROR: {e}. Fallback to default.")
-            result = {
-                "response_message": "",
-                "pass_to_guruji": False
-            }
-
-        print(f"MAYA FINAL JSON: {result}")
+        result = _parse_maya_response(response.choices[0].message.content)
+        result["usage"] = openai_usage(response.usage)
         return result
 
     except Exception as e:
-        print(f"MAYA ERROR: {e}")
-        import traceback
-        print(f"MAYA TRACEBACK: {traceback.format_exc()}")
-        # Fail safe
-        return {
-            "response_message": "",
-            "pass_to_guruji": False
-        }
+        return _maya_failsafe(e)
+
+async def acheck_with_maya(question: str, history: list, user_details: dict = None, query_vector=None) -> dict:
+    """
+    check_with_maya on the shared AsyncOpenAI client (for async routes).
+    query_vector is an awaitable for the retrieval query's embedding (the
+    task /chat already runs for retrieval), so the centroid layer adds no
+    embeddings call of its own.
+    """
+    fast_path = get_fast_path()
+    if fast_path is not None:
+        result = fast_path.classify_rules(question, history)
+        if result is None and query_vector is not None and fast_path.wants_embedding(question):
+            result = fast_path.classify_embedding(await query_vector)
+        if result is not None:
+            print(f"DEBUG: Maya fast path ({result['fast_path']}): {result['category']}")
+            return result
+
+    SYSTEM_PROMPT = load_maya_prompt() # Picks up edits to the prompt file
+    print(f"DEBUG: LOADED PROMPT LENGTH: {len(SYSTEM_PROMPT)}")
+    try:
+        client = get_async_openai_client()
+        async with llm_slot():
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=_maya_messages(SYSTEM_PROMPT, question, history, user_details),
+                response_format={"type": "json_object"},
+                temperature=0.0
+            )
+        result = _parse_maya_response(response.choices[0].message.content)
+        result["usage"] = openai_usage(response.usage)
+        return result
+
+    except Exception as e:
+        return _maya_failsafe(e)
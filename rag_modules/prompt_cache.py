@@ -0,0 +1,38 @@
+# prompt_cache.py
+# Prompt files (system_prompt.txt, maya_system_prompt.txt,
+# guruji_detailed_report_prompt.txt) are read on every chat and report
+# request. This keeps their contents in memory and re-reads a file only
+# when its mtime or size changes, so admin edits apply on the next request.
+import os
+import threading
+
+_lock = threading.Lock()
+_prompts = {}  # abs path -> ((mtime_ns, size), text)
+
+
+def read_prompt(path: str, default=None):
+    """Contents of the prompt file at path, or default if it does not exist."""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        with _lock:
+            _prompts.pop(path, None)
+        return default
+    version = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        entry = _prompts.get(path)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with _lock:
+        _prompts[path] = (version, text)
+    return text
+
+
+def invalidate_prompt(path: str):
+    """Forget path's cached contents (after writing it, in case the mtime did not tick)."""
+    with _lock:
+        _prompts.pop(os.path.abspath(path), None)
@@ -1,55 +1,265 @@
 from openai import OpenAI
 import numpy as np
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+from rag_modules.embedding_cache import EmbeddingCache, cache_key, normalize_query
+from rag_modules.tokenizer import batch_by_tokens, count_tokens, split_tokens
+
+EMBED_MODEL = "text-embedding-3-small"
+# Longest input the embeddings endpoint accepts
+EMBED_MAX_INPUT_TOKENS = 8191
+
 class RAGEngine:
 
-    def __init__(self, vectorstore):
+    def __init__(self, vectorstore, query_cache: EmbeddingCache = None,
+                 chunk_cache: EmbeddingCache = None, embed_batch_tokens: int = 50000,
+                 embed_batch_items: int = 256, embed_workers: int = 4, embed_retries: int = 3,
+                 pending_collection=None, reload_chunks=None):
         self.vectorstore = vectorstore
         self.client = OpenAI()
+        # Query embeddings keyed on model + normalised text; common chat
+        # turns ("yes", "tell me more") skip the embeddings round-trip
+        self.query_cache = query_cache if query_cache is not None else EmbeddingCache()
+        # Chunk embeddings keyed on model + exact chunk text, so re-indexing
+        # a report only embeds the chunks whose text changed
+        self.chunk_cache = chunk_cache if chunk_cache is not None else EmbeddingCache()
+
+        # embed_chunks splits texts into batches of at most embed_batch_tokens
+        # tokens / embed_batch_items texts, sent embed_workers at a time
+        self.embed_batch_tokens = embed_batch_tokens
+        self.embed_batch_items = embed_batch_items
+        self.embed_workers = embed_workers
+        self.embed_retries = embed_retries
+
+        # doc_id -> full chunk list of documents with chunks still missing an
+        # embedding; retry_pending_embeddings() re-embeds and re-indexes them.
+        # With pending_collection (Mongo) the doc ids also survive a restart:
+        # reload_chunks(doc_id) rebuilds the chunk list of a document queued
+        # by an earlier process.
+        self._pending_embeddings: dict[str, list[dict[str, Any]]] = {}
+        self._pending_lock = threading.Lock()
+        self.pending_collection = pending_collection
+        self.reload_chunks = reload_chunks
 
     # ---------------------------------------------------------
-    # Compute embedding for user queries
+    # Embed one batch of chunk texts, retrying with backoff
+    # ---------------------------------------------------------
+    def _embed_batch(self, texts: list[str]):
+        for attempt in range(self.embed_retries):
+            try:
+                resp = self.client.embeddings.create(
+                    model=EMBED_MODEL,
+                    input=texts
+                )
+                return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+            except Exception as e:
+                print(f"Error in batch embedding ({len(texts)} texts, attempt {attempt + 1}): {e}")
+                if attempt < self.embed_retries - 1:
+                    # Exponential backoff with jitter so parallel batches don't retry in lockstep
+                    time.sleep(2 ** attempt + random.random())
+        return None
+
+    # ---------------------------------------------------------
+    # Compute embedding for report chunks
     # ---------------------------------------------------------
     def embed_chunks(self, chunks: list[dict[str, Any]]):
-        """Adds embedding to each chunk using batch processing."""
+        """
+        Adds embedding to each chunk. Unchanged texts come from the cache; the
+        rest are sent in token-bounded batches over a small thread pool, each
+        retried independently. Chunks of a batch that still fails get no
+        embedding and "embedding_pending": True, so the vector store skips
+        them instead of indexing zero vectors, and their document is queued
+        for retry_pending_embeddings().
+        """
         if not chunks:
             return chunks
-            
-        texts = [c["text"] for c in chunks]
+
+        keys = [cache_key(EMBED_MODEL, c["text"]) for c in chunks]
+        missing = []
+        for i, key in enumerate(keys):
+            chunks[i].pop("embedding_pending", None)
+            cached = self.chunk_cache.get(key)
+            if cached is not None:
+                chunks[i]["embedding"] = cached.tolist()
+            else:
+                missing.append(i)
+        print(f"DEBUG [RAGEngine]: {len(chunks) - len(missing)}/{len(chunks)} chunk embeddings from cache.")
+
+        if missing:
+            # One vector per chunk, so a text over the model's input limit is
+            # embedded from its first EMBED_MAX_INPUT_TOKENS tokens
+            inputs = {}
+            for i in missing:
+                text = chunks[i]["text"]
+                if count_tokens(text) > EMBED_MAX_INPUT_TOKENS:
+                    print(f"WARN [RAGEngine]: Chunk {chunks[i].get('chunk_index')} of {chunks[i].get('doc_id')} "
+                          f"is over {EMBED_MAX_INPUT_TOKENS} tokens; embedding its start.")
+                    text = split_tokens(text, EMBED_MAX_INPUT_TOKENS)[0]
+                inputs[i] = text
+            batches = [
+                [missing[j] for j in batch]
+                for batch in batch_by_tokens([inputs[i] for i in missing], self.embed_batch_tokens,
+                                             self.embed_batch_items)
+            ]
+            workers = max(1, min(self.embed_workers, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(lambda b: self._embed_batch([inputs[i] for i in b]), batches)
+                for batch, embeddings in zip(batches, results):
+                    if embeddings is None or len(embeddings) != len(batch):
+                        for i in batch:
+                            chunks[i].pop("embedding", None)
+                            chunks[i]["embedding_pending"] = True
+                        continue
+                    for i, emb in zip(batch, embeddings):
+                        chunks[i]["embedding"] = emb
+                        self.chunk_cache.put(keys[i], emb)
+
+            failed = sum(1 for c in chunks if c.get("embedding_pending"))
+            print(f"DEBUG [RAGEngine]: Embedded {len(missing) - failed} chunks in {len(batches)} batches; {failed} pending.")
+
+        # Track documents that still need re-embedding
+        by_doc: dict[str, list[dict[str, Any]]] = {}
+        for c in chunks:
+            if "doc_id" in c:
+                by_doc.setdefault(c["doc_id"], []).append(c)
+        with self._pending_lock:
+            for doc_id, doc_chunks in by_doc.items():
+                if any(c.get("embedding_pending") for c in doc_chunks):
+                    self._pending_embeddings[doc_id] = doc_chunks
+                else:
+                    self._pending_embeddings.pop(doc_id, None)
+        for doc_id, doc_chunks in by_doc.items():
+            self._persist_pending(doc_id, any(c.get("embedding_pending") for c in doc_chunks))
+        return chunks
+
+    def _persist_pending(self, doc_id: str, pending: bool):
+        if self.pending_collection is None:
+            return
         try:
-            resp = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
-            embeddings = [d.embedding for d in resp.data]
-            for i, emb in enumerate(embeddings):
-                chunks[i]["embedding"] = emb
-            return chunks
+            if pending:
+                self.pending_collection.update_one(
+                    {"_id": doc_id}, {"$set": {"updated_at": time.time()}}, upsert=True
+                )
+            else:
+                self.pending_collection.delete_one({"_id": doc_id})
         except Exception as e:
-            print(f"Error in batch embedding: {e}")
-            # Fallback to zeros if API fails (so indexing doesn't crash)
-            for c in chunks:
-                if "embedding" not in c:
-                    c["embedding"] = np.zeros(1536).tolist()
-            return chunks
+            print(f"WARN [RAGEngine]: Could not record pending embeddings for {doc_id}: {e}")
+
+    def _persisted_pending(self) -> list[str]:
+        if self.pending_collection is None:
+            return []
+        try:
+            return [d["_id"] for d in self.pending_collection.find({}, {"_id": 1})]
+        except Exception as e:
+            print(f"WARN [RAGEngine]: Could not read pending embeddings: {e}")
+            return []
+
+    # ---------------------------------------------------------
+    # Re-embed documents whose chunks failed to embed earlier
+    # ---------------------------------------------------------
+    def pending_embedding_docs(self) -> list[str]:
+        with self._pending_lock:
+            docs = list(self._pending_embeddings)
+        return docs + [d for d in self._persisted_pending() if d not in docs]
+
+    def retry_pending_embeddings(self):
+        """Re-embed queued documents (cached chunks are free) and re-index the complete ones."""
+        with self._pending_lock:
+            queued = dict(self._pending_embeddings)
+
+        # Queued by an earlier process: rebuild the chunks from the source
+        for doc_id in self._persisted_pending():
+            if doc_id in queued or self.reload_chunks is None:
+                continue
+            try:
+                doc_chunks = self.reload_chunks(doc_id)
+            except Exception as e:
+                print(f"Error reloading chunks for {doc_id}: {e}")
+                continue
+            if doc_chunks:
+                queued[doc_id] = doc_chunks
+            else:
+                # Source gone; nothing left to index
+                self._persist_pending(doc_id, False)
+
+        completed = []
+        for doc_id, doc_chunks in queued.items():
+            self.embed_chunks(doc_chunks)
+            if not any(c.get("embedding_pending") for c in doc_chunks):
+                self.vectorstore.add_chunks(doc_chunks)
+                completed.append(doc_id)
+        return {"completed": completed, "still_pending": self.pending_embedding_docs()}
 
     # ---------------------------------------------------------
     # Compute embedding for user queries
     # ---------------------------------------------------------
     def embed_query(self, text: str):
+        """Embedding of text as a list of floats, the same type whether cached or fetched."""
+        key = cache_key(EMBED_MODEL, normalize_query(text))
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached.tolist()
         try:
             emb = self.client.embeddings.create(
-                model="text-embedding-3-small",
+                model=EMBED_MODEL,
                 input=text
             )
-            return emb.data[0].embedding
+            vector = emb.data[0].embedding
+            self.query_cache.put(key, vector)
+            return vector
         except Exception:
+            # Not cached, so the next call retries the API
             return np.zeros(1536).tolist()
 
+    # ---------------------------------------------------------
+    # Compute embeddings for a batch of queries (one API call)
+    # ---------------------------------------------------------
+    def embed_queries(self, texts: list[str]):
+        """One embedding (list of floats, as embed_query) per text, in order."""
+        if not texts:
+            return []
+        keys = [cache_key(EMBED_MODEL, normalize_query(t)) for t in texts]
+        vectors = [v.tolist() if v is not None else None for v in self.query_cache.get_many(keys)]
+        # First text per uncached key; duplicates in the batch are embedded once
+        missing: dict[str, int] = {}
+        for i, v in enumerate(vectors):
+            if v is None:
+                missing.setdefault(keys[i], i)
+        if not missing:
+            return vectors
+        fetched = {}
+        try:
+            order = list(missing)
+            resp = self.client.embeddings.create(
+                model=EMBED_MODEL,
+                input=[texts[missing[k]] for k in order]
+            )
+            # The API returns items tagged with their input index
+            for d in resp.data:
+                fetched[order[d.index]] = d.embedding
+                self.query_cache.put(order[d.index], d.embedding)
+        except Exception as e:
+            print(f"Error in batch query embedding: {e}")
+        for i, v in enumerate(vectors):
+            if v is None:
+                vectors[i] = fetched.get(keys[i], np.zeros(1536).tolist())
+        return vectors
+
     # ---------------------------------------------------------
     # Retrieve relevant chunks using vectorstore similarity search
     # ---------------------------------------------------------
     def retrieve(self, query: str, top_k: int = 4, doc_ids: list[str] = None):
         query_vector = self.embed_query(query)
         return self.vectorstore.similarity_search(query_vector, top_k=top_k, doc_ids=doc_ids)
+
+    # ---------------------------------------------------------
+    # Retrieve for many queries at once (one embedding call, one search)
+    # ---------------------------------------------------------
+    def retrieve_many(self, queries: list[str], doc_ids: list[str] = None, top_k: int = 4):
+        """Returns one list of (chunk, score) per query, in the order given."""
+        query_vectors = self.embed_queries(queries)
+        return self.vectorstore.similarity_search_many(query_vectors, top_k=top_k, doc_ids=doc_ids)
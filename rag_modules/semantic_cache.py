@@ -0,0 +1,144 @@
+# semantic_cache.py
+# Per-user semantic answer cache for Guruji. Users often re-ask the same
+# question in a new session ("when will I get married?"); a match against
+# one of their earlier questions can be answered from the stored reply
+# instead of another gpt-4o-mini call. Matching uses the embedding of the
+# question as asked, not the history-augmented retrieval query, so a match
+# doesn't depend on the conversation around it (without history the two are
+# the same and the retrieval embedding is reused). Off unless
+# SEMANTIC_CACHE_MODE is set (backend/rag_service.py).
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Stored Guruji answers keyed by (mobile, language), matched by cosine
+    similarity of the question embedding. Entries live in a Mongo
+    collection so every worker shares them; invalidate(mobile) drops a
+    user's entries when their report is regenerated.
+
+    Entry: {mobile, language, question, embedding, response, guruji_json,
+    gen_s, created_at, expires_at, hits}. gen_s is the generation time the
+    entry saves on each hit, which stats() sums up as seconds saved.
+
+    Expired entries are removed by the TTL index on expires_at (see
+    backend/setup_db.py), and store() trims each (mobile, language) to its
+    newest max_entries_per_user entries.
+    """
+
+    def __init__(self, collection, threshold: float = 0.95, ttl_seconds: Optional[float] = 7 * 86400,
+                 max_entries_per_user: int = 50):
+        self.collection = collection
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_user = max_entries_per_user
+
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "invalidations": 0,
+                       "trimmed": 0, "saved_s": 0.0, "lookup_s": 0.0}
+
+    @staticmethod
+    def _unit(vector) -> Optional[np.ndarray]:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        # Zero vector = the embedding call failed; never match on it
+        return v / norm if norm > 0 else None
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def lookup(self, mobile: str, language: str, query_vector) -> Optional[Dict[str, Any]]:
+        """Best stored answer for this user above the threshold (with its "similarity"), or None."""
+        t0 = time.perf_counter()
+        q = self._unit(query_vector)
+        if q is None:
+            return None
+
+        query = {"mobile": mobile, "language": language}
+        if self.ttl_seconds:
+            query["created_at"] = {"$gte": time.time() - self.ttl_seconds}
+        try:
+            entries = list(self.collection.find(query).sort("created_at", -1).limit(self.max_entries_per_user))
+        except Exception as e:
+            print(f"Error reading semantic cache: {e}")
+            return None
+
+        best, best_score = None, self.threshold
+        if entries:
+            matrix = np.asarray([e["embedding"] for e in entries], dtype=np.float32)
+            scores = matrix @ q / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+            i = int(np.argmax(scores))
+            if scores[i] >= best_score:
+                best, best_score = entries[i], float(scores[i])
+
+        lookup_s = time.perf_counter() - t0
+        if best is None:
+            self._count(lookups=1, misses=1, lookup_s=lookup_s)
+            return None
+
+        self._count(lookups=1, hits=1, lookup_s=lookup_s, saved_s=max(0.0, best.get("gen_s", 0.0) - lookup_s))
+        try:
+            self.collection.update_one({"_id": best["_id"]}, {"$inc": {"hits": 1}, "$set": {"last_hit_at": time.time()}})
+        except Exception as e:
+            print(f"Error updating semantic cache: {e}")
+        best = {k: v for k, v in best.items() if k != "embedding"}
+        best["similarity"] = best_score
+        return best
+
+    def store(self, mobile: str, language: str, question: str, query_vector, response: str,
+              guruji_json: Optional[Dict[str, Any]], gen_s: float):
+        q = self._unit(query_vector)
+        if q is None:
+            return
+        now = time.time()
+        entry = {
+            "mobile": mobile,
+            "language": language,
+            "question": question,
+            "embedding": q.tolist(),
+            "response": response,
+            "guruji_json": guruji_json,
+            "gen_s": gen_s,
+            "created_at": now,
+            "hits": 0
+        }
+        if self.ttl_seconds:
+            # TTL indexes only expire BSON dates
+            entry["expires_at"] = datetime.fromtimestamp(now + self.ttl_seconds, timezone.utc)
+        try:
+            self.collection.insert_one(entry)
+            self._count(stores=1)
+            # Only the newest max_entries_per_user are ever looked up; drop the rest
+            stale = self.collection.find({"mobile": mobile, "language": language}, {"_id": 1}) \
+                .sort("created_at", -1).skip(self.max_entries_per_user)
+            stale_ids = [e["_id"] for e in stale]
+            if stale_ids:
+                removed = self.collection.delete_many({"_id": {"$in": stale_ids}}).deleted_count
+                self._count(trimmed=removed)
+        except Exception as e:
+            print(f"Error writing semantic cache: {e}")
+
+    def invalidate(self, mobile: str):
+        """Drop every cached answer for mobile (their report changed)."""
+        try:
+            removed = self.collection.delete_many({"mobile": mobile}).deleted_count
+            self._count(invalidations=removed)
+        except Exception as e:
+            print(f"Error invalidating semantic cache for {mobile}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["avg_saved_s"] = stats["saved_s"] / stats["hits"] if stats["hits"] else 0.0
+        stats["avg_lookup_ms"] = stats["lookup_s"] / stats["lookups"] * 1000 if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
@@ -0,0 +1,148 @@
+# session_memory.py
+# Rolling conversation memory for Guruji. Instead of the whole client
+# history, the model gets a running summary of the older part of the
+# session plus the recent messages verbatim. The summary is folded forward
+# incrementally in the background (old summary + the messages that aged
+# out), so prompt size stays bounded however long the consultation runs.
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from rag_modules.chat_handler import agenerate_with_openai
+
+SUMMARY_SYSTEM_PROMPT = "You are an expert summarizer for spiritual consultations."
+
+UPDATE_SUMMARY_PROMPT = """
+        Update the running summary of this astrology consultation with the new messages below.
+        Keep every concern the user raised, personal facts they shared, and the predictions,
+        timings and remedies the Guru gave. Drop greetings and repetition.
+        Keep it under 250 words.
+
+        RUNNING SUMMARY:
+        {summary}
+
+        NEW MESSAGES:
+        {transcript}
+        """
+
+
+def format_transcript(messages: List[Dict[str, Any]]) -> str:
+    lines = []
+    for msg in messages:
+        role = "User" if msg["role"] == "user" else "Assistant"
+        lines.append(f"{role}: {msg['content']}")
+    return "\n".join(lines)
+
+
+class SessionMemory:
+    """
+    Per-session state in a Mongo collection: {_id: session_id, mobile,
+    summary, summarized_upto, usage, updated_at}. summary covers
+    history[:summarized_upto] of the client's (append-only) history.
+
+    window() gives the model the summary plus history[summarized_upto:].
+    Between refreshes that list only grows at the end, which keeps the
+    prompt prefix cacheable; once it reaches keep_messages + refresh_every
+    messages, everything but the last keep_messages is folded into the
+    summary by a background task. max_messages is a hard cap in case a
+    refresh is slow or failing. Without a session_id there is nothing to
+    key a summary on, so the history is passed through whole.
+    """
+
+    def __init__(self, collection, keep_messages: int = 6, refresh_every: int = 4,
+                 max_messages: Optional[int] = None, model: str = "gpt-4o-mini"):
+        self.collection = collection
+        self.keep_messages = keep_messages
+        self.refresh_every = refresh_every
+        self.max_messages = max_messages or keep_messages + 2 * refresh_every
+        self.model = model
+        # session_id -> running refresh task (keeps a reference so it is not collected)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if not session_id:
+            return None
+        try:
+            return self.collection.find_one({"_id": session_id})
+        except Exception as e:
+            print(f"Error reading session memory: {e}")
+            return None
+
+    @staticmethod
+    def _start(state, history: list) -> int:
+        start = (state or {}).get("summarized_upto", 0)
+        # A shorter history than we summarized means the client started over
+        return start if start <= len(history) else 0
+
+    def window(self, session_id: str, history: list):
+        """(bounded history for the model, memory state or None)."""
+        history = history or []
+        if not session_id:
+            # Cutting without a summary would silently drop the earlier turns
+            return history, None
+        state = self.get(session_id)
+        start = self._start(state, history)
+        if state and start == 0:
+            state = None
+        recent = history[start:][-self.max_messages:]
+        if state and state.get("summary"):
+            recent = [{"role": "system", "content": f"Summary of the earlier consultation:\n{state['summary']}"}] + recent
+        if len(history) > len(recent):
+            print(f"DEBUG [Memory]: {len(history)} history messages -> {len(recent)} sent "
+                  f"(summary covers {start}).")
+        return recent, state
+
+    def summary_and_rest(self, session_id: str, history: list):
+        """(running summary or None, the messages it does not cover yet)."""
+        history = history or []
+        state = self.get(session_id)
+        start = self._start(state, history)
+        if not state or start == 0 or not state.get("summary"):
+            return None, history
+        return state["summary"], history[start:]
+
+    def maybe_refresh(self, session_id: str, mobile: str, history: list, state=None):
+        """Schedule a background summary refresh if enough messages have aged out of the window."""
+        history = history or []
+        if not session_id or session_id in self._refreshing:
+            return
+        start = self._start(state, history)
+        if len(history) - start < self.keep_messages + self.refresh_every:
+            return
+        upto = len(history) - self.keep_messages
+        summary = (state or {}).get("summary") if start else None
+        expected = state.get("summarized_upto") if state else None
+        task = asyncio.create_task(self._refresh(session_id, mobile, summary, history[start:upto], expected, upto))
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(session_id, None))
+
+    async def _refresh(self, session_id, mobile, summary, new_messages, expected, upto):
+        t0 = time.time()
+        try:
+            new_summary, usage = await self.fold(summary, new_messages)
+            # Only advance from the state we read (another worker may have
+            # refreshed meanwhile); the first summary of a session is an insert
+            match = {"_id": session_id} if expected is None else {"_id": session_id, "summarized_upto": expected}
+            # pymongo blocks; keep it off the event loop
+            await asyncio.to_thread(self.collection.update_one, match, {"$set": {
+                "mobile": mobile,
+                "summary": new_summary,
+                "summarized_upto": upto,
+                "usage": usage,
+                "updated_at": time.time()
+            }}, upsert=expected is None)
+            print(f"DEBUG [Memory]: Session {session_id} summary now covers {upto} messages "
+                  f"({time.time() - t0:.2f}s).")
+        except Exception as e:
+            print(f"Error refreshing session memory for {session_id}: {e}")
+
+    async def fold(self, summary: Optional[str], messages: List[Dict[str, Any]]):
+        """Running summary updated with messages -> (summary, usage)."""
+        return await agenerate_with_openai(
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            context_chunks=[],
+            conversation_history=[],
+            question=UPDATE_SUMMARY_PROMPT.format(summary=summary or "(none yet)",
+                                                  transcript=format_transcript(messages)),
+            model=self.model
+        )
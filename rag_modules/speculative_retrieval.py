@@ -0,0 +1,55 @@
+# speculative_retrieval.py
+# Guruji's retrieval for a /chat turn, started before Maya has decided
+# whether Guruji answers at all. The query embedding and the vector search
+# run in worker threads alongside Maya's call; if Maya answers herself the
+# result is discarded. Used as an async context manager so no task outlives
+# the turn, whether it returns early or raises.
+import asyncio
+import time
+from typing import List
+
+
+class SpeculativeRetrieval:
+    """
+    Starts embed_query(query) and a doc_ids-filtered similarity_search on
+    entry. query_vector_task is awaitable on its own (Maya's centroid layer
+    and the semantic cache share the embedding); results() waits for
+    (results, seconds). On exit, tasks still running are cancelled and
+    awaited.
+    """
+
+    def __init__(self, engine, vectorstore, query: str, doc_ids: List[str], top_k: int = 5):
+        self.engine = engine
+        self.vectorstore = vectorstore
+        self.query = query
+        self.doc_ids = doc_ids
+        self.top_k = top_k
+        self.query_vector_task = None
+        self.retrieval_task = None
+
+    async def _retrieve(self):
+        t0 = time.time()
+        query_vector = await self.query_vector_task
+        results = await asyncio.to_thread(self.vectorstore.similarity_search, query_vector, self.top_k, self.doc_ids)
+        return results, time.time() - t0
+
+    async def __aenter__(self):
+        self.query_vector_task = asyncio.create_task(asyncio.to_thread(self.engine.embed_query, self.query))
+        self.retrieval_task = asyncio.create_task(self._retrieve())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.discard()
+        return False
+
+    async def results(self):
+        return await self.retrieval_task
+
+    async def discard(self):
+        """Cancel whatever is still running and wait for it to finish."""
+        tasks = [t for t in (self.retrieval_task, self.query_vector_task) if t is not None]
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # A worker thread can't be interrupted; this waits for the task, not the thread
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,145 @@
+# tokenizer.py
+# Shared token counting for chunk sizing, embedding batches and the context
+# budget. Uses tiktoken's local BPE tables when installed (set
+# TIKTOKEN_CACHE_DIR to a pre-populated directory to run fully offline) and
+# falls back to the ~4 chars/token estimate otherwise. The fallback is only
+# an estimate: English prose is close, but HTML tables and Devanagari can
+# take several times as many real tokens, so the chunk sizes and context
+# budgets built on these counts (chunk_hierarchy_for_rag, apply_token_budget)
+# are only token-accurate when a BPE table loads. A failed load is retried
+# after TOKENIZER_RETRY_SECONDS, and require_encoding() lets the app refuse to
+# start without one.
+import os
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "text-embedding-3-small"
+_CHARS_PER_TOKEN = 4
+_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", "300"))
+
+# Only successful loads are cached; a failure is remembered just long
+# enough to avoid retrying the download on every call.
+_encodings: Dict[str, object] = {}
+_failed_at: Dict[str, float] = {}
+
+
+def _load_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Model tiktoken does not know: its nearest general encoding
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    enc = _encodings.get(model)
+    if enc is not None:
+        return enc
+    failed = _failed_at.get(model)
+    if failed is not None and time.monotonic() - failed < _RETRY_SECONDS:
+        return None
+    try:
+        enc = _load_encoding(model)
+    except Exception as e:
+        # No network and no cached BPE file
+        _failed_at[model] = time.monotonic()
+        print(f"WARN [Tokenizer]: Could not load encoding for {model}, estimating: {e}")
+        return None
+    _encodings[model] = enc
+    if _failed_at.pop(model, None) is not None:
+        # Counts cached while estimating are not token counts
+        count_tokens.cache_clear()
+    return enc
+
+
+def reset_encodings():
+    """Forget loaded encodings, recorded failures and cached counts."""
+    _encodings.clear()
+    _failed_at.clear()
+    count_tokens.cache_clear()
+
+
+def require_encoding(*models: str):
+    """
+    Raise RuntimeError unless a BPE table loads for every model (default:
+    DEFAULT_MODEL). Called at startup so a missing table fails loudly
+    instead of silently sizing everything by the estimate; set
+    TOKENIZER_ALLOW_ESTIMATE=1 to only warn.
+    """
+    missing = [m for m in (models or (DEFAULT_MODEL,)) if _get_encoding(m) is None]
+    if not missing:
+        return
+    message = (
+        f"No tiktoken BPE table for {', '.join(missing)}; install tiktoken and "
+        "pre-populate TIKTOKEN_CACHE_DIR, or set TOKENIZER_ALLOW_ESTIMATE=1"
+    )
+    if os.getenv("TOKENIZER_ALLOW_ESTIMATE", "0").lower() in ("1", "true", "yes"):
+        print(f"WARN [Tokenizer]: {message}")
+        return
+    raise RuntimeError(message)
+
+
+def encode(text: str, model: str = DEFAULT_MODEL) -> List:
+    """Token ids for text (or fixed-size character pieces when no BPE table is available)."""
+    enc = _get_encoding(model)
+    if enc is not None:
+        return enc.encode(text, disallowed_special=())
+    return [text[i:i + _CHARS_PER_TOKEN] for i in range(0, len(text), _CHARS_PER_TOKEN)]
+
+
+def decode(tokens: List, model: str = DEFAULT_MODEL) -> str:
+    enc = _get_encoding(model)
+    if enc is not None:
+        return enc.decode(tokens)
+    return "".join(tokens)
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Token count of text under model's encoding; cached, since chunks are re-counted often."""
+    enc = _get_encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def split_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> List[str]:
+    """Cut text into pieces of at most max_tokens tokens, on token boundaries."""
+    tokens = encode(text, model)
+    return [decode(tokens[i:i + max_tokens], model) for i in range(0, len(tokens), max_tokens)]
+
+
+def tail_tokens(text: str, n: int, model: str = DEFAULT_MODEL) -> str:
+    """The last n tokens of text."""
+    if n <= 0:
+        return ""
+    return decode(encode(text, model)[-n:], model)
+
+
+def batch_by_tokens(texts: List[str], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Split texts (in order) into batches of indices with at most max_items
+    texts and max_tokens tokens each. A single text over max_tokens gets a
+    batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text)
+        if current and (current_tokens + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
@@ -1,7 +1,154 @@
 import os
 import json
+import itertools
+import threading
 import numpy as np
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, NamedTuple
+
+# On-disk layout per document:
+#   {doc_id}.npy        float32 (n_chunks, dim) raw embeddings, memory-mappable
+#   {doc_id}.meta.json  {"doc_id", "file_name", "chunks": [...]} without embeddings
+# Legacy {doc_id}.json files (chunks with inline embedding lists) are still
+# readable; scripts/convert_processed_docs.py rewrites them in the new layout.
+VECTORS_SUFFIX = ".npy"
+META_SUFFIX = ".meta.json"
+LEGACY_SUFFIX = ".json"
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first."""
+    if len(scores) <= top_k:
+        return np.argsort(scores)[::-1]
+    top = np.argpartition(scores, -top_k)[-top_k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _top_k_indices_batch(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Row-wise _top_k_indices for a (n_queries, n_rows) score matrix."""
+    k = min(top_k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64)
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def quantize_rows(block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 codes and per-row float32 scales such that block ~= codes * scales[:, None]."""
+    absmax = np.abs(block).max(axis=1) if len(block) else np.zeros(0, dtype=np.float32)
+    scales = np.maximum(absmax / 127.0, 1e-12).astype(np.float32)
+    codes = np.rint(block / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def dequantize_rows(matrix: np.ndarray, scales: Optional[np.ndarray], sel) -> np.ndarray:
+    """Float32 rows matrix[sel]; a no-op view/copy when the matrix is not quantized."""
+    if scales is None:
+        return matrix[sel]
+    return matrix[sel].astype(np.float32) * scales[sel, None]
+
+
+def score_rows(matrix: np.ndarray, scales: Optional[np.ndarray], sel, q: np.ndarray) -> np.ndarray:
+    """
+    Dot products of q with matrix[sel], dequantizing int8 rows when scales is
+    given. q is one query (dim,) or a batch laid out as columns (dim, n_queries).
+    """
+    if scales is None:
+        return matrix[sel] @ q
+    block = matrix[sel]
+    out = np.empty((len(block),) + q.shape[1:], dtype=np.float32)
+    # Convert in slices so a whole-corpus scan never builds a float copy of the matrix
+    for start in range(0, len(block), 65536):
+        out[start:start + 65536] = block[start:start + 65536].astype(np.float32) @ q
+    row_scales = scales[sel]
+    return out * (row_scales[:, None] if q.ndim == 2 else row_scales)
+
+
+def split_embeddings(chunk_list: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+    """
+    Separate inline embeddings from chunk dicts.
+    Returns (chunks_without_embedding, float32 matrix). Chunks with a missing
+    or empty embedding, or whose dimension differs from the first one, are dropped.
+    """
+    kept = []
+    vectors = []
+    dim = None
+    for c in chunk_list:
+        emb = c.get("embedding")
+        if emb is None or len(emb) == 0:
+            continue
+        if dim is None:
+            dim = len(emb)
+        elif len(emb) != dim:
+            print(f"WARN [VectorStore]: Skipping chunk of {c.get('doc_id')} with dim {len(emb)} (expected {dim})")
+            continue
+        kept.append({k: v for k, v in c.items() if k != "embedding"})
+        vectors.append(emb)
+
+    if not kept:
+        return [], None
+    return kept, np.asarray(vectors, dtype=np.float32)
+
+
+def save_document_files(storage_dir: str, doc_id: str, file_name: str,
+                        chunk_list: List[Dict[str, Any]], vectors: np.ndarray):
+    """
+    Write a document in the binary layout. Vectors are written first and the
+    metadata last, so a .meta.json on disk always has its .npy next to it.
+    """
+    vec_path = os.path.join(storage_dir, f"{doc_id}{VECTORS_SUFFIX}")
+    meta_path = os.path.join(storage_dir, f"{doc_id}{META_SUFFIX}")
+
+    tmp_vec = vec_path + ".tmp"
+    with open(tmp_vec, "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(tmp_vec, vec_path)
+
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"doc_id": doc_id, "file_name": file_name, "chunks": chunk_list}, f)
+    os.replace(tmp_meta, meta_path)
+
+
+def convert_legacy_json(storage_dir: str, filename: str, delete_json: bool = False) -> Optional[str]:
+    """
+    Rewrite one legacy {doc_id}.json file as .npy + .meta.json.
+    Returns the converted doc_id, or None if the file held no embeddings.
+    """
+    full_path = os.path.join(storage_dir, filename)
+    with open(full_path, "r", encoding="utf-8") as f:
+        doc_json = json.load(f)
+
+    doc_id = doc_json["doc_id"]
+    for c in doc_json["chunks"]:
+        c.setdefault("doc_id", doc_id)
+
+    chunks, vectors = split_embeddings(doc_json["chunks"])
+    if vectors is None:
+        return None
+
+    save_document_files(storage_dir, doc_id, doc_json.get("file_name", doc_id), chunks, vectors)
+    if delete_json:
+        os.remove(full_path)
+    return doc_id
+
+
+class _Snapshot(NamedTuple):
+    """
+    Immutable view of the index. Searches read one snapshot and never lock;
+    writers build a new snapshot and swap it in with a single assignment.
+    Rows below `size` are never modified in place, so a snapshot stays valid
+    while writers append after it.
+    """
+    matrix: Optional[np.ndarray]          # (capacity, dim) float32 or int8, rows [0, size) in use
+    scales: Optional[np.ndarray]          # (capacity,) per-row scales when int8, else None
+    size: int
+    row_chunks: List[Dict[str, Any]]      # append-only; row i -> chunk dict
+    doc_ranges: Dict[str, Tuple[int, int]]  # live doc_id -> (start, stop)
+    dead_ranges: Tuple[Tuple[int, int], ...]  # tombstoned rows awaiting compaction
+    dead_rows: int
+    generation: int                       # bumped whenever rows move (compaction)
+    doc_vectors: Dict[str, Any]           # int8 mode: doc_id -> .npy path (or in-memory float32 vectors) for re-ranking
 
 
 class InMemoryVectorStore:
@@ -9,16 +156,72 @@ class InMemoryVectorStore:
     # --------------------------------------------------------
     # Initialization
     # --------------------------------------------------------
-    def __init__(self, storage_dir="processed_docs"):
+    def __init__(self, storage_dir="processed_docs", initial_capacity: int = 1024,
+                 max_resident_docs: Optional[int] = None, max_resident_bytes: Optional[int] = None,
+                 ann_index=None, compact_ratio: float = 0.5,
+                 quantize: bool = False, rerank_factor: int = 4):
+        """
+        With no budget every document stays resident once searched. Setting
+        max_resident_docs and/or max_resident_bytes turns on lazy mode: only
+        doc ids are listed at startup, a document is loaded on first search and
+        the least recently searched documents are evicted to stay in budget.
+
+        ann_index (e.g. rag_modules.ann_index.IVFIndex) is used for
+        whole-corpus searches over the resident rows; filtered searches are
+        always exact.
+
+        Searches are lock-free and safe to run concurrently with writers
+        (add/delete/evict). Deleted or replaced rows are tombstoned and the
+        matrix is compacted once they exceed compact_ratio of all rows.
+
+        With quantize=True rows are held as int8 codes with a per-row scale
+        (about 4x smaller than float32). Searches rank on the int8 matrix,
+        then re-score the best top_k * rerank_factor candidates exactly
+        against the document's float32 vectors, memory-mapped from disk for
+        the duration of the search (no file stays open per resident document).
+        """
         os.makedirs(storage_dir, exist_ok=True)
 
         self.storage_dir = storage_dir
 
         # Internal private store (no setter errors)
         self._document_names: List[str] = []
-        self.chunks: List[Tuple[Dict[str, Any], float]] = []  # (chunk_dict, score)
 
-        # Load existing JSON documents at startup
+        # Rows are L2-normalised once on insert so a search is a single
+        # matrix-vector product; the matrix grows by doubling. Each
+        # document's rows are appended in one block, so a per-user search is
+        # a single slice of its (start, stop) range.
+        self._snapshot = _Snapshot(
+            matrix=None, scales=None, size=0, row_chunks=[], doc_ranges={},
+            dead_ranges=(), dead_rows=0, generation=0, doc_vectors={}
+        )
+        self._initial_capacity = initial_capacity
+        self.compact_ratio = compact_ratio
+        self.quantize = quantize
+        self.rerank_factor = rerank_factor
+
+        # Serialises writers only; searches never take it
+        self._write_lock = threading.RLock()
+
+        # doc_id -> chunk metadata (or None if not read yet) for documents
+        # whose vectors are still on disk. They are paged into the matrix the
+        # first time they are searched.
+        self._pending: Dict[str, Optional[List[Dict[str, Any]]]] = {}
+
+        # Resident-set budget (lazy mode) and its counters. _last_used is
+        # updated by searches with plain dict stores (atomic under the GIL).
+        self.max_resident_docs = max_resident_docs
+        self.max_resident_bytes = max_resident_bytes
+        self._bounded = max_resident_docs is not None or max_resident_bytes is not None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "compactions": 0}
+        self._clock = itertools.count()
+        self._last_used: Dict[str, int] = {}
+
+        # Optional approximate index for doc_ids=None searches
+        self.ann_index = ann_index
+
+        # Read document metadata at startup (just doc ids in lazy mode);
+        # vectors load lazily
         self._load_all_documents()
 
     # --------------------------------------------------------
@@ -28,61 +231,393 @@ class InMemoryVectorStore:
     def document_names(self) -> List[str]:
         return self._document_names
 
+    @property
+    def chunks(self) -> List[Tuple[Dict[str, Any], float]]:
+        """All resident chunks as (chunk_dict, score) pairs with score=0."""
+        snap = self._snapshot
+        return [
+            (snap.row_chunks[i], 0.0)
+            for start, stop in sorted(snap.doc_ranges.values())
+            for i in range(start, stop)
+        ]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Resident-set counters: hits, misses and evictions since startup plus current usage."""
+        snap = self._snapshot
+        live_rows = snap.size - snap.dead_rows
+        return {
+            **self._stats,
+            "resident_docs": len(snap.doc_ranges),
+            "resident_chunks": live_rows,
+            "resident_bytes": self._row_bytes(snap, live_rows),
+            "dead_chunks": snap.dead_rows,
+            "pending_docs": len(self._pending),
+            "max_resident_docs": self.max_resident_docs,
+            "max_resident_bytes": self.max_resident_bytes,
+        }
+
+    @staticmethod
+    def _row_bytes(snap: _Snapshot, rows: int) -> int:
+        if snap.matrix is None:
+            return 0
+        per_row = snap.matrix.shape[1] * snap.matrix.itemsize
+        if snap.scales is not None:
+            per_row += snap.scales.itemsize
+        return rows * per_row
+
+    # --------------------------------------------------------
+    # Embedding matrix maintenance (callers hold _write_lock)
+    # --------------------------------------------------------
+    def _append_rows(self, doc_id: str, chunk_list: List[Dict[str, Any]], vectors: np.ndarray) -> int:
+        """
+        Append vectors (normalised) to the matrix as one contiguous block for
+        doc_id, with chunk_list[i] describing vectors[i]. Any previous rows of
+        doc_id are tombstoned. In int8 mode the float source for re-ranking
+        is the .npy file behind a memory-mapped vectors (only its path is
+        kept), else vectors itself. Returns the number of rows added.
+        """
+        snap = self._snapshot
+        n = len(chunk_list)
+        if n == 0:
+            return 0
+        if snap.matrix is not None and vectors.shape[1] != snap.matrix.shape[1]:
+            print(f"WARN [VectorStore]: Skipping {doc_id} with dim {vectors.shape[1]} (store dim {snap.matrix.shape[1]})")
+            return 0
+
+        block = np.array(vectors, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        # Zero vectors stay zero and simply score 0
+        norms[norms < 1e-8] = 1.0
+        block /= norms
+
+        dtype = np.int8 if self.quantize else np.float32
+        matrix, scales = snap.matrix, snap.scales
+        if matrix is None:
+            capacity = max(self._initial_capacity, n)
+            matrix = np.zeros((capacity, block.shape[1]), dtype=dtype)
+            scales = np.zeros(capacity, dtype=np.float32) if self.quantize else None
+        elif snap.size + n > matrix.shape[0]:
+            # Readers of older snapshots keep the old arrays
+            capacity = max(matrix.shape[0] * 2, snap.size + n)
+            grown = np.zeros((capacity, matrix.shape[1]), dtype=dtype)
+            grown[:snap.size] = matrix[:snap.size]
+            matrix = grown
+            if scales is not None:
+                grown_scales = np.zeros(capacity, dtype=np.float32)
+                grown_scales[:snap.size] = scales[:snap.size]
+                scales = grown_scales
+
+        # Rows past snap.size are invisible to every published snapshot
+        if self.quantize:
+            codes, row_scales = quantize_rows(block)
+            matrix[snap.size:snap.size + n] = codes
+            scales[snap.size:snap.size + n] = row_scales
+        else:
+            matrix[snap.size:snap.size + n] = block
+        snap.row_chunks.extend(chunk_list)
+
+        doc_ranges = dict(snap.doc_ranges)
+        dead_ranges, dead_rows = snap.dead_ranges, snap.dead_rows
+        old = doc_ranges.get(doc_id)
+        if old is not None:
+            dead_ranges += (old,)
+            dead_rows += old[1] - old[0]
+        doc_ranges[doc_id] = (snap.size, snap.size + n)
+        doc_vectors = snap.doc_vectors
+        if self.quantize:
+            # Keep the path, not the memory-map: each open map holds a file descriptor
+            source = vectors.filename if isinstance(vectors, np.memmap) and vectors.filename else vectors
+            doc_vectors = {**doc_vectors, doc_id: source}
+
+        self._snapshot = snap._replace(
+            matrix=matrix, scales=scales, size=snap.size + n, doc_ranges=doc_ranges,
+            dead_ranges=dead_ranges, dead_rows=dead_rows, doc_vectors=doc_vectors
+        )
+        self._last_used[doc_id] = next(self._clock)
+        self._maybe_compact()
+        return n
+
+    def _remove_rows(self, doc_id: str):
+        """Tombstone the row range of doc_id; the rows themselves are not touched."""
+        snap = self._snapshot
+        row_range = snap.doc_ranges.get(doc_id)
+        self._last_used.pop(doc_id, None)
+        if row_range is None:
+            return
+        doc_ranges = dict(snap.doc_ranges)
+        del doc_ranges[doc_id]
+        doc_vectors = {d: v for d, v in snap.doc_vectors.items() if d != doc_id}
+        self._snapshot = snap._replace(
+            doc_ranges=doc_ranges,
+            doc_vectors=doc_vectors,
+            dead_ranges=snap.dead_ranges + (row_range,),
+            dead_rows=snap.dead_rows + row_range[1] - row_range[0]
+        )
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """
+        Copy live rows into a fresh matrix once tombstones dominate. This is
+        the only operation that copies the corpus; its cost is amortised over
+        the deletes that made it necessary, and readers keep using the old
+        snapshot until the new one is published.
+        """
+        snap = self._snapshot
+        if snap.dead_rows <= max(self._initial_capacity, self.compact_ratio * snap.size):
+            return
+
+        live = sorted(snap.doc_ranges.items(), key=lambda item: item[1][0])
+        live_rows = snap.size - snap.dead_rows
+        capacity = max(self._initial_capacity, 2 * live_rows)
+        matrix = np.zeros((capacity, snap.matrix.shape[1]), dtype=snap.matrix.dtype)
+        scales = np.zeros(capacity, dtype=np.float32) if snap.scales is not None else None
+        row_chunks = []
+        doc_ranges = {}
+        pos = 0
+        for doc_id, (start, stop) in live:
+            n = stop - start
+            matrix[pos:pos + n] = snap.matrix[start:stop]
+            if scales is not None:
+                scales[pos:pos + n] = snap.scales[start:stop]
+            row_chunks.extend(snap.row_chunks[start:stop])
+            doc_ranges[doc_id] = (pos, pos + n)
+            pos += n
+
+        self._snapshot = _Snapshot(
+            matrix=matrix, scales=scales, size=pos, row_chunks=row_chunks, doc_ranges=doc_ranges,
+            dead_ranges=(), dead_rows=0, generation=snap.generation + 1,
+            doc_vectors=snap.doc_vectors
+        )
+        self._stats["compactions"] += 1
+
+    def _read_document(self, doc_id: str, chunk_list: Optional[List[Dict[str, Any]]] = None):
+        """
+        Read (chunk_list, vectors) for doc_id from disk. Vectors of the binary
+        layout are memory-mapped; chunk_list is read from the metadata file
+        unless already known. Falls back to a legacy {doc_id}.json file.
+        """
+        meta_path = os.path.join(self.storage_dir, f"{doc_id}{META_SUFFIX}")
+        vec_path = os.path.join(self.storage_dir, f"{doc_id}{VECTORS_SUFFIX}")
+
+        if chunk_list is None:
+            if not os.path.exists(meta_path):
+                legacy_path = os.path.join(self.storage_dir, f"{doc_id}{LEGACY_SUFFIX}")
+                with open(legacy_path, "r", encoding="utf-8") as f:
+                    doc_json = json.load(f)
+                for c in doc_json["chunks"]:
+                    c.setdefault("doc_id", doc_id)
+                return split_embeddings(doc_json["chunks"])
+
+            with open(meta_path, "r", encoding="utf-8") as f:
+                chunk_list = json.load(f)["chunks"]
+            for c in chunk_list:
+                c.setdefault("doc_id", doc_id)
+
+        vectors = np.load(vec_path, mmap_mode="r")
+        if len(vectors) != len(chunk_list):
+            raise ValueError(f"{len(vectors)} vectors for {len(chunk_list)} chunks")
+        return chunk_list, vectors
+
+    def _page_in(self, doc_id: str):
+        """Read a pending document and append its rows (no-op once it isn't pending)."""
+        # Disk reads happen outside the write lock unless the caller holds it
+        try:
+            chunk_list, vectors = self._read_document(doc_id, self._pending.get(doc_id))
+        except Exception as e:
+            print(f"Error loading vectors for {doc_id}: {e}")
+            with self._write_lock:
+                self._pending.pop(doc_id, None)
+            return
+
+        with self._write_lock:
+            # Another search or a writer may have got here first
+            if doc_id not in self._pending:
+                return
+            self._stats["misses"] += 1
+            if vectors is not None:
+                self._append_rows(doc_id, chunk_list, vectors)
+            del self._pending[doc_id]
+
+    def _ensure_resident(self, doc_ids) -> _Snapshot:
+        """
+        Page any non-resident documents in doc_ids into the matrix, enforce
+        the budget, and return a snapshot in which every requested document
+        that could be loaded is resident. When everything requested is
+        already resident this only records recency and takes no lock.
+        """
+        snap = self._snapshot
+        missing = []
+        for doc_id in doc_ids:
+            if doc_id in snap.doc_ranges:
+                self._last_used[doc_id] = next(self._clock)
+                self._stats["hits"] += 1
+            elif doc_id in self._pending:
+                missing.append(doc_id)
+
+        if not missing:
+            return snap
+
+        for doc_id in missing:
+            self._page_in(doc_id)
+
+        with self._write_lock:
+            # A concurrent search may have evicted a document loaded above
+            # before this point; eviction needs this lock, so re-loading it
+            # here and taking the snapshot before releasing is race-free.
+            for doc_id in doc_ids:
+                if doc_id in self._pending:
+                    self._page_in(doc_id)
+            self._evict(protect=set(doc_ids))
+            return self._snapshot
+
+    def _over_budget(self) -> bool:
+        snap = self._snapshot
+        if self.max_resident_docs is not None and len(snap.doc_ranges) > self.max_resident_docs:
+            return True
+        if self.max_resident_bytes is not None and \
+                self._row_bytes(snap, snap.size - snap.dead_rows) > self.max_resident_bytes:
+            return True
+        return False
+
+    def _evict(self, protect=()):
+        """Evict least recently searched documents (except protect) until within budget."""
+        if not self._bounded:
+            return
+        while self._over_budget():
+            candidates = [d for d in self._snapshot.doc_ranges if d not in protect]
+            if not candidates:
+                break
+            victim = min(candidates, key=lambda d: self._last_used.get(d, -1))
+            self._remove_rows(victim)
+            # Metadata is dropped too; it is re-read on the next miss
+            self._pending[victim] = None
+            self._stats["evictions"] += 1
+
+    def _search_cold(self, q: np.ndarray, top_k: int, doc_ids) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Score documents straight from their memory-mapped vectors without
+        making them resident (whole-corpus search in lazy mode). Returns up
+        to top_k candidates per document.
+        """
+        candidates = []
+        for doc_id in doc_ids:
+            try:
+                chunk_list, vectors = self._read_document(doc_id, self._pending.get(doc_id))
+            except Exception as e:
+                print(f"Error reading {doc_id}: {e}")
+                continue
+            if vectors is None or vectors.shape[1] != len(q):
+                continue
+            norms = np.linalg.norm(vectors, axis=1)
+            norms[norms < 1e-8] = 1.0
+            scores = (vectors @ q) / norms
+            for i in _top_k_indices(scores, top_k):
+                candidates.append((chunk_list[i], float(scores[i])))
+        return candidates
+
+    @staticmethod
+    def _rerank(snap: _Snapshot, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """Exact cosine scores for rows from each document's float32 vectors."""
+        scores = np.empty(len(rows), dtype=np.float32)
+        by_doc: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            by_doc.setdefault(snap.row_chunks[row]["doc_id"], []).append(i)
+
+        # One gather per document (a per-user search touches a single file)
+        for doc_id, idx in by_doc.items():
+            start, stop = snap.doc_ranges[doc_id]
+            local = rows[idx] - start
+            source = snap.doc_vectors[doc_id]
+            try:
+                if isinstance(source, str):
+                    # Mapped only for this gather, so the descriptor is released right after
+                    source = np.load(source, mmap_mode="r")
+                if len(source) != stop - start:
+                    raise ValueError(f"{len(source)} vectors on disk for {stop - start} rows")
+                vecs = np.asarray(source[local], dtype=np.float32)
+            except Exception as e:
+                # File replaced or removed since this snapshot: keep the int8 scores
+                print(f"WARN [VectorStore]: Re-ranking {doc_id} from int8 rows: {e}")
+                vecs = dequantize_rows(snap.matrix, snap.scales, rows[idx])
+            del source
+            norms = np.linalg.norm(vecs, axis=1)
+            norms[norms < 1e-8] = np.inf
+            scores[idx] = (vecs @ q) / norms
+        return scores
+
     # --------------------------------------------------------
     # Load all docs from storage directory
     # --------------------------------------------------------
     def _load_all_documents(self):
-        for filename in os.listdir(self.storage_dir):
-            if not filename.endswith(".json"):
-                continue
+        filenames = os.listdir(self.storage_dir)
+        converted = {f[:-len(META_SUFFIX)] for f in filenames if f.endswith(META_SUFFIX)}
 
+        for filename in filenames:
             full_path = os.path.join(self.storage_dir, filename)
 
             try:
-                with open(full_path, "r", encoding="utf-8") as f:
-                    doc_json = json.load(f)
+                if filename.endswith(META_SUFFIX):
+                    doc_id = filename[:-len(META_SUFFIX)]
+                    if self._bounded:
+                        # Lazy mode: metadata is read on first search
+                        self._pending[doc_id] = None
+                    else:
+                        with open(full_path, "r", encoding="utf-8") as f:
+                            doc_json = json.load(f)
+                        doc_id = doc_json["doc_id"]
+                        for c in doc_json["chunks"]:
+                            c.setdefault("doc_id", doc_id)
+                        self._pending[doc_id] = doc_json["chunks"]
 
-                doc_id = doc_json["doc_id"]
-                self._document_names.append(doc_id)
-
-                # Add each chunk with score=0 (default)
-                for c in doc_json["chunks"]:
-                    if "embedding" not in c or not c["embedding"]:
+                elif filename.endswith(LEGACY_SUFFIX):
+                    doc_id = filename[:-len(LEGACY_SUFFIX)]
+                    if doc_id in converted:
                         continue
-                    # Ensure doc_id is in chunk
-                    if "doc_id" not in c:
-                        c["doc_id"] = doc_id
-                    self.chunks.append((c, 0.0))
+                    # Legacy layout: embeddings are inline in the JSON
+                    self._pending[doc_id] = None
+                    print(f"WARN [VectorStore]: {filename} uses the legacy JSON layout; run scripts/convert_processed_docs.py")
+
+                else:
+                    continue
+
+                if doc_id not in self._document_names:
+                    self._document_names.append(doc_id)
 
             except Exception as e:
                 print(f"Error loading {filename}: {e}")
 
     # --------------------------------------------------------
-    # Add a new processed document (save JSON + load into memory)
+    # Add a new processed document (save to disk + load into memory)
     # --------------------------------------------------------
     def add_document(self, doc_id: str, file_name: str, chunk_list: List[Dict[str, Any]]):
-        """Save a document as a JSON file and load into memory."""
+        """Save a document in the binary layout and load into memory, replacing any previous version."""
 
         # Inject doc_id into all chunks
         for c in chunk_list:
             c["doc_id"] = doc_id
 
-        # Prepare JSON structure
-        doc_json = {
-            "doc_id": doc_id,
-            "file_name": file_name,
-            "chunks": chunk_list
-        }
+        stored_chunks, vectors = split_embeddings(chunk_list)
+        if vectors is None:
+            print(f"WARN [VectorStore]: {doc_id} has no embedded chunks; nothing indexed.")
+            return
 
-        # Save to file
-        file_path = os.path.join(self.storage_dir, f"{doc_id}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(doc_json, f, indent=2)
+        with self._write_lock:
+            # Save to disk
+            save_document_files(self.storage_dir, doc_id, file_name, stored_chunks, vectors)
+            legacy_path = os.path.join(self.storage_dir, f"{doc_id}{LEGACY_SUFFIX}")
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
 
-        # Load into memory
-        self._document_names.append(doc_id)
-        for c in chunk_list:
-            self.chunks.append((c, 0.0))
+            if self.quantize:
+                # Re-rank from the file just written rather than pinning the list-built array
+                vectors = np.load(os.path.join(self.storage_dir, f"{doc_id}{VECTORS_SUFFIX}"), mmap_mode="r")
+
+            # Load into memory (re-indexing a user tombstones their old rows)
+            self._pending.pop(doc_id, None)
+            if doc_id not in self._document_names:
+                self._document_names = self._document_names + [doc_id]
+            self._append_rows(doc_id, stored_chunks, vectors)
+            self._evict(protect={doc_id})
 
     # --------------------------------------------------------
     # Add multiple chunks (helper for registration flow)
@@ -91,10 +626,10 @@ class InMemoryVectorStore:
         """Helper to add chunks directly. Infers doc_id from first chunk."""
         if not chunks:
             return
-            
+
         # Group by doc_id (usually just one for a new report)
         doc_ids_in_batch = set(c.get("doc_id") for c in chunks if "doc_id" in c)
-        
+
         for d_id in doc_ids_in_batch:
             # Filter chunks for this doc_id
             doc_chunks = [c for c in chunks if c.get("doc_id") == d_id]
@@ -105,31 +640,24 @@ class InMemoryVectorStore:
     # Delete a document from storage + memory
     # --------------------------------------------------------
     def delete_document(self, doc_id: str):
-        """Remove a stored document JSON and delete its chunks."""
-
-        # Delete JSON file
-        json_path = os.path.join(self.storage_dir, f"{doc_id}.json")
-        if os.path.exists(json_path):
-            os.remove(json_path)
-
-        # Remove chunks in memory
-        self.chunks = [
-            (chunk, score)
-            for (chunk, score) in self.chunks
-            if chunk.get("doc_id") != doc_id
-        ]
+        """Remove a stored document's files and delete its chunks."""
 
-        # Remove from names
-        self._document_names = [
-            d for d in self._document_names if d != doc_id
-        ]
+        with self._write_lock:
+            # Delete files (binary layout and any legacy JSON)
+            for suffix in (META_SUFFIX, VECTORS_SUFFIX, LEGACY_SUFFIX):
+                path = os.path.join(self.storage_dir, f"{doc_id}{suffix}")
+                if os.path.exists(path):
+                    os.remove(path)
+
+            # Remove rows in memory
+            self._pending.pop(doc_id, None)
+            self._remove_rows(doc_id)
+
+            # Remove from names
+            self._document_names = [
+                d for d in self._document_names if d != doc_id
+            ]
 
-    # --------------------------------------------------------
-    # Similarity Search
-    # --------------------------------------------------------
-    # --------------------------------------------------------
-    # Similarity Search (Vectorized)
-    # --------------------------------------------------------
     # --------------------------------------------------------
     # Similarity Search (Vectorized)
     # --------------------------------------------------------
@@ -139,76 +667,164 @@ class InMemoryVectorStore:
         top_k: int = 4,
         doc_ids: List[str] = None
     ) -> List[Tuple[Dict[str, Any], float]]:
-        """Retrieve top-K most similar chunks using vectorized operations."""
+        """Retrieve top-K most similar chunks using one matrix-vector product."""
 
-        if not self.chunks:
+        # Everything below works on one immutable snapshot
+        if doc_ids is not None:
+            snap = self._ensure_resident(doc_ids)
+            cold_doc_ids = []
+        elif self._bounded:
+            # Don't blow the budget on a whole-corpus search: score
+            # non-resident documents straight from disk instead
+            cold_doc_ids = list(self._pending)
+            snap = self._snapshot
+        else:
+            snap = self._ensure_resident(list(self._pending))
+            cold_doc_ids = []
+
+        if snap.size == 0 and not cold_doc_ids:
             return []
 
-        # Prepare data
-        q = np.array(query_vector)
+        q = np.asarray(query_vector, dtype=np.float32)
         q_norm = np.linalg.norm(q)
-        
+
         # Avoid division by zero
         if q_norm < 1e-8:
             return []
+        q = q / q_norm
 
-        # Filter chunks if doc_ids provided
-        # We need to keep track of original indices if we filter
+        # Rows are pre-normalised, so the dot product is the cosine score
         if doc_ids is not None:
-            allowed_set = set(doc_ids)
-            # Create a list of (index, chunk_tuple) for allowed chunks
-            filtered_indices_chunks = [
-                (i, c) for i, c in enumerate(self.chunks)
-                if c[0]["doc_id"] in allowed_set
-            ]
-            
-            if not filtered_indices_chunks:
+            ranges = [snap.doc_ranges[d] for d in set(doc_ids) if d in snap.doc_ranges]
+            if not ranges:
                 return []
-                
-            # Unzip
-            indices = [x[0] for x in filtered_indices_chunks]
-            active_chunks = [x[1] for x in filtered_indices_chunks]
+            if len(ranges) == 1:
+                rows = np.arange(*ranges[0])
+                scores = score_rows(snap.matrix, snap.scales, slice(*ranges[0]), q)
+            else:
+                rows = np.concatenate([np.arange(s, e) for s, e in ranges])
+                scores = score_rows(snap.matrix, snap.scales, rows, q)
         else:
-            indices = list(range(len(self.chunks)))
-            active_chunks = self.chunks
+            approx = None
+            if self.ann_index is not None and snap.size:
+                approx = self.ann_index.search(
+                    snap.matrix, snap.size, q, generation=snap.generation, scales=snap.scales
+                )
+            if approx is not None:
+                rows, scores = approx
+                if snap.dead_ranges:
+                    live = np.ones(len(rows), dtype=bool)
+                    for start, stop in snap.dead_ranges:
+                        live &= (rows < start) | (rows >= stop)
+                    rows, scores = rows[live], scores[live]
+            elif snap.matrix is None:
+                # Lazy mode before anything is resident: only cold documents
+                rows = np.arange(0)
+                scores = np.zeros(0, dtype=np.float32)
+            else:
+                rows = np.arange(snap.size)
+                scores = score_rows(snap.matrix, snap.scales, slice(0, snap.size), q)
+                if snap.dead_ranges:
+                    live = np.ones(snap.size, dtype=bool)
+                    for start, stop in snap.dead_ranges:
+                        live[start:stop] = False
+                    rows, scores = rows[live], scores[live]
+
+        if snap.scales is not None:
+            # Shortlist on the int8 scores, then re-score exactly in float32
+            shortlist = _top_k_indices(scores, top_k * self.rerank_factor)
+            rows = rows[shortlist]
+            scores = self._rerank(snap, rows, q)
+
+        top_relative_indices = _top_k_indices(scores, top_k)
 
-        # Extract embeddings matrix from active chunks
-        embeddings = [c[0]["embedding"] for c in active_chunks]
-        
-        if not embeddings:
-            return []
-            
-        E = np.array(embeddings)
-        
-        # Calculate cosine similarity: (E . q) / (|E| * |q|)
-        # Dot product
-        dot_products = np.dot(E, q)
-        
-        # Norms of all embeddings
-        E_norms = np.linalg.norm(E, axis=1)
-        
-        # Avoid division by zero for embeddings
-        E_norms[E_norms < 1e-8] = 1e-8
-        
-        # Cosine scores
-        scores = dot_products / (E_norms * q_norm)
-        
-        # Get top_k indices (relative to active_chunks)
-        if len(scores) <= top_k:
-            top_relative_indices = np.argsort(scores)[::-1]
-        else:
-            top_relative_indices = np.argpartition(scores, -top_k)[-top_k:]
-            top_relative_indices = top_relative_indices[np.argsort(scores[top_relative_indices])[::-1]]
-            
         # Construct result
         results = []
-        print(f"DEBUG [VectorStore]: Found {len(active_chunks)} active chunks for {doc_ids}. Top scores: {scores[top_relative_indices][:3]}")
+        print(f"DEBUG [VectorStore]: Found {len(rows)} active chunks for {doc_ids}. Top scores: {scores[top_relative_indices][:3]}")
         for rel_idx in top_relative_indices:
-            # Map back to chunk
-            chunk = active_chunks[rel_idx][0]
-            score = float(scores[rel_idx])
-            results.append((chunk, score))
-            
+            chunk = snap.row_chunks[rows[rel_idx]]
+            results.append((chunk, float(scores[rel_idx])))
+
+        if cold_doc_ids:
+            results.extend(self._search_cold(q, top_k, cold_doc_ids))
+            results.sort(key=lambda r: r[1], reverse=True)
+            results = results[:top_k]
+
         return results
 
+    # --------------------------------------------------------
+    # Batched Similarity Search (many queries, one product)
+    # --------------------------------------------------------
+    def similarity_search_many(
+        self,
+        query_vectors: List[List[float]],
+        top_k: int = 4,
+        doc_ids: List[str] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        similarity_search for a batch of queries: one matrix-matrix product
+        (Q @ E^T) over the selected rows and a row-wise top-k. Returns one
+        result list per query, in order.
+
+        Whole-corpus searches that go through the ANN index or score cold
+        documents from disk (lazy mode) fall back to one search per query.
+        """
+        if len(query_vectors) == 0:
+            return []
+
+        if doc_ids is None and (self.ann_index is not None or self._bounded):
+            return [self.similarity_search(q, top_k=top_k, doc_ids=None) for q in query_vectors]
+
+        snap = self._ensure_resident(doc_ids if doc_ids is not None else list(self._pending))
+        results: List[List[Tuple[Dict[str, Any], float]]] = [[] for _ in query_vectors]
+        if snap.size == 0 or snap.matrix is None:
+            return results
 
+        Q = np.asarray(query_vectors, dtype=np.float32)
+        q_norms = np.linalg.norm(Q, axis=1)
+        # Zero queries get no results, matching similarity_search
+        valid = np.flatnonzero(q_norms >= 1e-8)
+        if not valid.size:
+            return results
+        Q = Q[valid] / q_norms[valid, None]
+
+        if doc_ids is not None:
+            ranges = [snap.doc_ranges[d] for d in set(doc_ids) if d in snap.doc_ranges]
+            if not ranges:
+                return results
+            if len(ranges) == 1:
+                rows = np.arange(*ranges[0])
+                scores = score_rows(snap.matrix, snap.scales, slice(*ranges[0]), Q.T)
+            else:
+                rows = np.concatenate([np.arange(s, e) for s, e in ranges])
+                scores = score_rows(snap.matrix, snap.scales, rows, Q.T)
+        else:
+            rows = np.arange(snap.size)
+            scores = score_rows(snap.matrix, snap.scales, slice(0, snap.size), Q.T)
+            if snap.dead_ranges:
+                live = np.ones(snap.size, dtype=bool)
+                for start, stop in snap.dead_ranges:
+                    live[start:stop] = False
+                rows, scores = rows[live], scores[live]
+
+        # (n_queries, n_rows) so each query's scores are contiguous
+        scores = np.ascontiguousarray(scores.T)
+
+        if snap.scales is None:
+            top = _top_k_indices_batch(scores, top_k)
+            for idx, qi in enumerate(valid):
+                results[qi] = [
+                    (snap.row_chunks[rows[j]], float(scores[idx, j])) for j in top[idx]
+                ]
+        else:
+            # Shortlist on the int8 scores, then re-score each query exactly in float32
+            shortlist = _top_k_indices_batch(scores, top_k * self.rerank_factor)
+            for idx, qi in enumerate(valid):
+                cand = rows[shortlist[idx]]
+                exact = self._rerank(snap, cand, Q[idx])
+                results[qi] = [
+                    (snap.row_chunks[cand[j]], float(exact[j])) for j in _top_k_indices(exact, top_k)
+                ]
+
+        print(f"DEBUG [VectorStore]: Batched search of {len(query_vectors)} queries over {len(rows)} active chunks for {doc_ids}.")
+        return results
@@ -0,0 +1,91 @@
+"""
+Compare the streaming extract_hierarchy with the previous BeautifulSoup
+find_all extractor on real report files: time, peak Python memory, and how
+much text each one hands to the chunker, before and after the dedup stage.
+
+    python scripts/bench_chunking.py [--reports-dir reports] [--repeat 20]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag, dedupe_records
+
+
+def extract_hierarchy_find_all(html):
+    """The previous extractor, kept here as the baseline."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    records = []
+    current_h1 = current_h2 = current_h3 = current_h4 = None
+    for tag in soup.find_all(["h1", "h2", "h3", "h4", "p", "li", "div", "ul", "table"]):
+        text = str(tag) if tag.name == "table" else tag.get_text(strip=True)
+        if tag.name == "h1":
+            current_h1 = text
+            current_h2 = current_h3 = current_h4 = None
+        elif tag.name == "h2":
+            current_h2 = text
+            current_h3 = current_h4 = None
+        elif tag.name == "h3":
+            current_h3 = text
+            current_h4 = None
+        elif tag.name == "h4":
+            current_h4 = text
+        elif text:
+            records.append({"h1": current_h1, "h2": current_h2, "h3": current_h3, "h4": current_h4, "content": text})
+    return records
+
+
+def measure(fn, docs, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for html in docs:
+            fn(html)
+    ms = (time.perf_counter() - t0) / (repeat * len(docs)) * 1000
+
+    tracemalloc.start()
+    records = [fn(html) for html in docs]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    deduped = [dedupe_records(r) for r in records]
+    return {
+        "ms_per_doc": ms,
+        "peak_kb": peak / 1024,
+        "records": sum(len(r) for r in records),
+        "content_chars": sum(len(x["content"]) for r in records for x in r),
+        "chunks": sum(len(chunk_hierarchy_for_rag(r, dedupe=False)) for r in records),
+        "dedup_bytes": sum(st["bytes_removed"] for _, st in deduped),
+        "dedup_chunks": sum(len(chunk_hierarchy_for_rag(r, dedupe=False)) for r, _ in deduped),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports-dir", default="reports")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = []
+    for path in sorted(glob.glob(os.path.join(args.reports_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            docs.append(f.read())
+    if not docs:
+        print(f"No reports found in {args.reports_dir}.")
+        return
+    print(f"{len(docs)} reports, {sum(len(d) for d in docs) / 1024:.0f} KB of HTML")
+
+    for name, fn in (("find_all (bs4)", extract_hierarchy_find_all), ("streaming", extract_hierarchy)):
+        r = measure(fn, docs, args.repeat)
+        print(f"{name:15s} {r['ms_per_doc']:7.2f} ms/doc  peak {r['peak_kb']:8.0f} KB  "
+              f"{r['records']:5d} records  {r['content_chars']:7d} chars  {r['chunks']:4d} chunks  "
+              f"| dedup -{r['dedup_bytes']} bytes -> {r['dedup_chunks']} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Micro-benchmark for InMemoryVectorStore.similarity_search.
+
+Builds a throwaway store of synthetic "reports" (one doc per user, ~50 chunks
+each, 1536-dim vectors like text-embedding-3-small) and times per-user and
+whole-corpus queries. Vectors are drawn around shared topic centres so that,
+like real report embeddings, they have cluster structure.
+
+With --ann-probes the whole-corpus search is repeated through an IVF index
+for each n_probe value and recall@k against exact search is reported.
+The batched API (similarity_search_many) is timed over the same queries.
+With --quantize the same documents are reloaded into an int8 store and its
+memory, latency and recall@k against the float32 store are reported.
+
+    python scripts/bench_vectorstore.py --docs 2000 --chunks 50 --queries 200 --ann-probes 4 8 16 --quantize
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_modules.vectorstore import InMemoryVectorStore
+from rag_modules.ann_index import IVFIndex
+
+
+def synthetic_vectors(rng, centres, n):
+    picks = centres[rng.integers(0, len(centres), n)]
+    return (picks + 0.5 * rng.standard_normal(picks.shape)).astype(np.float32)
+
+
+def build_store(storage_dir, n_docs, n_chunks, centres, rng):
+    store = InMemoryVectorStore(storage_dir=storage_dir)
+    t0 = time.perf_counter()
+    for d in range(n_docs):
+        doc_id = f"9{d:09d}"
+        vectors = synthetic_vectors(rng, centres, n_chunks)
+        chunks = [
+            {"heading": f"Section {i}", "text": f"Section {i}\n\nsynthetic text", "embedding": vectors[i]}
+            for i in range(n_chunks)
+        ]
+        store.add_document(doc_id, doc_id, chunks)
+    print(f"Indexed {n_docs} docs x {n_chunks} chunks in {time.perf_counter() - t0:.2f}s")
+    return store
+
+
+def run_queries(fn, queries):
+    """Run fn over all queries; returns (ms/query, results)."""
+    # The store prints a debug line per query; keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        t0 = time.perf_counter()
+        results = [fn(q) for q in queries]
+        elapsed = time.perf_counter() - t0
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return elapsed / len(queries) * 1000, results
+
+
+def recall_at_k(exact, approx):
+    hits = total = 0
+    for e, a in zip(exact, approx):
+        truth = {(c["doc_id"], c["heading"]) for c, _ in e}
+        hits += sum(1 for c, _ in a if (c["doc_id"], c["heading"]) in truth)
+        total += len(truth)
+    return hits / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--ann-probes", type=int, nargs="*", default=[])
+    parser.add_argument("--quantize", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.topics, args.dim)).astype(np.float32)
+    queries = synthetic_vectors(rng, centres, args.queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store(tmp, args.docs, args.chunks, centres, rng)
+        doc_ids = store.document_names
+
+        def per_user(q):
+            return store.similarity_search(q, top_k=args.top_k, doc_ids=[doc_ids[int(abs(q[0]) * 1000) % len(doc_ids)]])
+
+        def whole_corpus(q):
+            return store.similarity_search(q, top_k=args.top_k, doc_ids=None)
+
+        ms, exact_user = run_queries(per_user, queries)
+        print(f"per-user search: {ms:.3f} ms/query")
+        ms, exact = run_queries(whole_corpus, queries)
+        print(f"whole-corpus search (exact): {ms:.3f} ms/query")
+        print(f"resident vectors (float32): {store.cache_stats()['resident_bytes'] / 1e6:.1f} MB")
+
+        ms, batched = run_queries(lambda qs: store.similarity_search_many(qs, top_k=args.top_k), [queries])
+        print(f"whole-corpus search (batched, {len(queries)} queries): {ms / len(queries):.3f} ms/query, "
+              f"recall@{args.top_k} {recall_at_k(exact, batched[0]):.3f}")
+
+        if args.quantize:
+            float_store = store
+            store = InMemoryVectorStore(storage_dir=tmp, quantize=True)
+            ms, approx_user = run_queries(per_user, queries)
+            print(f"per-user search (int8 + rerank): {ms:.3f} ms/query, "
+                  f"recall@{args.top_k} {recall_at_k(exact_user, approx_user):.3f}")
+            ms, approx = run_queries(whole_corpus, queries)
+            print(f"whole-corpus search (int8 + rerank): {ms:.3f} ms/query, "
+                  f"recall@{args.top_k} {recall_at_k(exact, approx):.3f}")
+            print(f"resident vectors (int8): {store.cache_stats()['resident_bytes'] / 1e6:.1f} MB")
+            store = float_store
+
+        for n_probe in args.ann_probes:
+            store.ann_index = IVFIndex(n_probe=n_probe, min_size=0)
+            run_queries(whole_corpus, queries[:1])  # trains the index
+            ms, approx = run_queries(whole_corpus, queries)
+            print(f"whole-corpus search (IVF n_probe={n_probe}): {ms:.3f} ms/query, "
+                  f"recall@{args.top_k} {recall_at_k(exact, approx):.3f}")
+
+
+if __name__ == "__main__":
+    main()
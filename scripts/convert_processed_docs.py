@@ -0,0 +1,56 @@
+"""
+One-shot converter from the legacy processed_docs/{doc_id}.json layout
+(pretty-printed JSON with inline embedding lists) to the binary layout read
+by InMemoryVectorStore: {doc_id}.npy (float32 vectors) + {doc_id}.meta.json.
+
+    python scripts/convert_processed_docs.py [--storage-dir processed_docs] [--delete-json]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_modules.vectorstore import convert_legacy_json, META_SUFFIX, LEGACY_SUFFIX
+
+
+def convert_processed_docs(storage_dir: str, delete_json: bool = False):
+    filenames = sorted(
+        f for f in os.listdir(storage_dir)
+        if f.endswith(LEGACY_SUFFIX) and not f.endswith(META_SUFFIX)
+    )
+    print(f"Found {len(filenames)} legacy JSON documents in {storage_dir}.")
+
+    converted = skipped = failed = 0
+    bytes_before = bytes_after = 0
+    for filename in filenames:
+        full_path = os.path.join(storage_dir, filename)
+        size = os.path.getsize(full_path)
+        try:
+            doc_id = convert_legacy_json(storage_dir, filename, delete_json=delete_json)
+        except Exception as e:
+            print(f"Error converting {filename}: {e}")
+            failed += 1
+            continue
+
+        if doc_id is None:
+            print(f"Skipped {filename}: no embedded chunks.")
+            skipped += 1
+            continue
+
+        converted += 1
+        bytes_before += size
+        for suffix in (".npy", META_SUFFIX):
+            bytes_after += os.path.getsize(os.path.join(storage_dir, f"{doc_id}{suffix}"))
+
+    print(f"Conversion complete. {converted} converted, {skipped} skipped, {failed} failed.")
+    if converted:
+        print(f"Size on disk: {bytes_before / 1e6:.1f} MB JSON -> {bytes_after / 1e6:.1f} MB binary.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage-dir", default="processed_docs")
+    parser.add_argument("--delete-json", action="store_true", help="Remove each legacy file once converted")
+    args = parser.parse_args()
+    convert_processed_docs(args.storage_dir, delete_json=args.delete_json)
@@ -0,0 +1,153 @@
+"""
+Bulk re-index of every stored report into the vector store files.
+
+Streams `reports` documents from Mongo (sorted by mobile), chunks them in a
+process pool with extract_hierarchy + chunk_hierarchy_for_rag, embeds each
+window of documents through RAGEngine.embed_chunks (token-bounded parallel
+batches, chunk-embedding cache) and writes {mobile}.npy + {mobile}.meta.json
+straight into the storage directory. Nothing is loaded into memory beyond
+the current window; running servers pick the files up on their next start.
+
+A checkpoint file records the last fully written mobile, so an interrupted
+run continues where it stopped with --resume. Documents whose chunks failed
+to embed are listed in the checkpoint and redone with --retry-pending.
+--dry-run chunks and counts tokens only: no embedding calls, no files, no
+checkpoint.
+
+    python scripts/reindex_reports.py [--storage-dir processed_docs] [--workers 4]
+        [--window 64] [--resume | --retry-pending] [--dry-run] [--limit N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.db import get_db_collection
+from rag_modules.chunking import extract_hierarchy, chunk_hierarchy_for_rag
+from rag_modules.tokenizer import count_tokens
+from rag_modules.vectorstore import split_embeddings, save_document_files, LEGACY_SUFFIX
+
+load_dotenv()
+
+
+def chunk_report(job):
+    """Process-pool worker: (mobile, report_text) -> (mobile, chunks, n_tokens)."""
+    mobile, report_text = job
+    chunks = chunk_hierarchy_for_rag(extract_hierarchy(report_text))
+    for i, c in enumerate(chunks):
+        c["doc_id"] = mobile
+        c["chunk_index"] = i
+    return mobile, chunks, sum(count_tokens(c["text"]) for c in chunks)
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"last_mobile": None, "pending": []}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def iter_windows(cursor, size):
+    window = []
+    for record in cursor:
+        if record.get("report_text"):
+            window.append((record["mobile"], record["report_text"]))
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def reindex_reports(storage_dir, checkpoint_path="reindex_checkpoint.json", workers=4, window=64,
+                    resume=False, retry_pending=False, dry_run=False, limit=None, engine=None):
+    """Re-index stored reports (see the module docstring); engine defaults to an embedding-only RAGEngine."""
+    os.makedirs(storage_dir, exist_ok=True)
+    fresh = {"last_mobile": None, "pending": []}
+    checkpoint = load_checkpoint(checkpoint_path) if resume or retry_pending else fresh
+
+    query = {"report_text": {"$exists": True}}
+    if retry_pending:
+        query["mobile"] = {"$in": checkpoint["pending"]}
+        print(f"Retrying {len(checkpoint['pending'])} pending docs.")
+        # Keep the resume position; docs that fail again are re-listed
+        checkpoint["pending"] = []
+    elif checkpoint["last_mobile"] is not None:
+        query["mobile"] = {"$gt": checkpoint["last_mobile"]}
+        print(f"Resuming after {checkpoint['last_mobile']}.")
+    cursor = get_db_collection("reports").find(query, {"mobile": 1, "report_text": 1}).sort("mobile", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    if engine is None and not dry_run:
+        # Only the embedding side of the engine is used; no in-memory store
+        from backend.rag_service import build_chunk_cache
+        from rag_modules.rag_engine import RAGEngine
+        engine = RAGEngine(None, chunk_cache=build_chunk_cache())
+
+    docs = chunks_total = tokens_total = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for jobs in iter_windows(cursor, window):
+            chunked = list(pool.map(chunk_report, jobs))
+
+            if not dry_run:
+                all_chunks = [c for _, chunks, _ in chunked for c in chunks]
+                engine.embed_chunks(all_chunks)
+                for mobile, chunks, _ in chunked:
+                    stored_chunks, vectors = split_embeddings(chunks)
+                    if len(stored_chunks) < len(chunks):
+                        checkpoint["pending"].append(mobile)
+                    if vectors is None:
+                        continue
+                    save_document_files(storage_dir, mobile, mobile, stored_chunks, vectors)
+                    legacy_path = os.path.join(storage_dir, f"{mobile}{LEGACY_SUFFIX}")
+                    if os.path.exists(legacy_path):
+                        os.remove(legacy_path)
+                if not retry_pending:
+                    checkpoint["last_mobile"] = jobs[-1][0]
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            docs += len(chunked)
+            chunks_total += sum(len(chunks) for _, chunks, _ in chunked)
+            tokens_total += sum(n for _, _, n in chunked)
+            elapsed = time.perf_counter() - t0
+            print(f"{docs} docs, {chunks_total} chunks, {tokens_total} tokens | "
+                  f"{docs / elapsed:.1f} docs/s, {chunks_total / elapsed:.1f} chunks/s, "
+                  f"{tokens_total / elapsed:.0f} tokens/s")
+
+    elapsed = time.perf_counter() - t0
+    print(f"Re-index {'dry run ' if dry_run else ''}complete: {docs} docs, {chunks_total} chunks, "
+          f"{tokens_total} tokens in {elapsed:.1f}s.")
+    if checkpoint["pending"]:
+        print(f"{len(checkpoint['pending'])} docs have chunks that failed to embed "
+              f"(listed in {checkpoint_path}); redo them with --retry-pending.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage-dir", default="processed_docs")
+    parser.add_argument("--checkpoint", default="reindex_checkpoint.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Chunking processes")
+    parser.add_argument("--window", type=int, default=64, help="Documents embedded and checkpointed together")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last checkpointed mobile")
+    parser.add_argument("--retry-pending", action="store_true", help="Redo docs that failed to embed")
+    parser.add_argument("--dry-run", action="store_true", help="Chunk and count tokens only")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    reindex_reports(args.storage_dir, checkpoint_path=args.checkpoint, workers=args.workers,
+                    window=args.window, resume=args.resume, retry_pending=args.retry_pending,
+                    dry_run=args.dry_run, limit=args.limit)
@@ -0,0 +1,179 @@
+"""
+Train and evaluate Maya's local fast path from logged decisions.
+
+Replays `conversation_history`: every Maya turn decided by the LLM (its
+maya_json) is paired with the user message it judged and the history
+before it. Embeddings of the retrieval query /chat builds from them
+(build_search_query) train one centroid per Maya category; sessions hashed into the hold-out split are used only for
+evaluation. Reports, per layer (rules, centroid) and overall, how many
+messages the fast path settles, how often it agrees with the logged LLM
+decision (pass_to_guruji and category) and the Maya latency it saves
+(logged latency_s, or --llm-latency for older records). Then writes the
+centroids, trained on all examples, to MAYA_CENTROIDS_PATH. /chat uses
+them once MAYA_FASTPATH=on is set.
+
+    python scripts/train_maya_fastpath.py [--holdout 0.2] [--out embedding_cache/maya_centroids.npz]
+        [--min-sim 0.45] [--margin 0.05] [--llm-latency 1.0] [--limit N] [--dry-run]
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.auth_routes import build_search_query
+from backend.db import get_db_collection
+from rag_modules.maya_receptionist import MayaFastPath
+
+load_dotenv()
+
+
+def _history_entry(record):
+    # Same shape as the client history /chat receives (see /history)
+    entry = {"role": "user" if record["role"] == "user" else "assistant", "content": record.get("message") or ""}
+    if record["role"] != "user":
+        entry["assistant"] = record["role"]
+    return entry
+
+
+def load_examples(limit=None):
+    """[{message, history, label, pass, latency_s, session_id}] for LLM-decided Maya turns."""
+    cursor = get_db_collection("conversation_history").find(
+        {"role": {"$in": ["user", "maya", "guruji"]}},
+        {"session_id": 1, "role": 1, "message": 1, "maya_json": 1, "user_message": 1, "latency_s": 1, "timestamp": 1}
+    ).sort([("session_id", 1), ("timestamp", 1)])
+    if limit:
+        cursor = cursor.limit(limit)
+
+    examples = []
+    for session_id, records in itertools.groupby(cursor, key=lambda r: r.get("session_id")):
+        records = list(records)
+        for i, rec in enumerate(records):
+            maya_json = rec.get("maya_json")
+            if rec["role"] != "maya" or not isinstance(maya_json, dict) or maya_json.get("fast_path"):
+                continue
+            passed = bool(maya_json.get("pass_to_guruji"))
+            # Maya's own replies are saved after the user turn; when she passes,
+            # the user turn is saved afterwards together with Guruji's answer
+            j = i + 1 if passed else i - 1
+            user_rec = records[j] if 0 <= j < len(records) and records[j]["role"] == "user" else None
+            message = rec.get("user_message") or (user_rec or {}).get("message")
+            if not message:
+                continue
+            cut = i if passed or user_rec is None else j
+            history = [_history_entry(r) for r in records[:cut] if r.get("message")]
+            examples.append({
+                "message": message,
+                "history": history,
+                "label": str(maya_json.get("category") or ("PROCEED" if passed else "NOT_PROCEED")).upper(),
+                "pass": passed,
+                "latency_s": rec.get("latency_s"),
+                "session_id": session_id
+            })
+    return examples
+
+
+def in_holdout(session_id, fraction):
+    digest = hashlib.sha1(str(session_id).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % 1000 < fraction * 1000
+
+
+def evaluate(fast_path, examples, vectors, llm_latency):
+    layers = {"rules": {"settled": 0, "pass_agree": 0, "category_agree": 0, "saved_s": 0.0, "time_s": 0.0},
+              "centroid": {"settled": 0, "pass_agree": 0, "category_agree": 0, "saved_s": 0.0, "time_s": 0.0}}
+    for ex, vector in zip(examples, vectors):
+        t0 = time.perf_counter()
+        result = fast_path.classify_rules(ex["message"], ex["history"])
+        layers["rules"]["time_s"] += time.perf_counter() - t0
+        if result is None and fast_path.wants_embedding(ex["message"]):
+            t0 = time.perf_counter()
+            result = fast_path.classify_embedding(vector)
+            layers["centroid"]["time_s"] += time.perf_counter() - t0
+        if result is None:
+            continue
+        layer = layers[result["fast_path"]]
+        layer["settled"] += 1
+        layer["pass_agree"] += result["pass_to_guruji"] == ex["pass"]
+        layer["category_agree"] += result["category"] == ex["label"]
+        layer["saved_s"] += ex["latency_s"] or llm_latency
+    return layers
+
+
+def report(name, layers, n):
+    print(f"\n{name}: {n} messages")
+    total = {"settled": 0, "pass_agree": 0, "category_agree": 0, "saved_s": 0.0}
+    for layer_name, layer in layers.items():
+        for k in total:
+            total[k] += layer[k]
+        settled = layer["settled"]
+        print(f"  {layer_name:8s} settled {settled:5d} ({settled / max(n, 1):6.1%})  "
+              f"pass agreement {layer['pass_agree'] / max(settled, 1):6.1%}  "
+              f"category agreement {layer['category_agree'] / max(settled, 1):6.1%}  "
+              f"{layer['time_s'] / max(n, 1) * 1e6:7.1f} us/msg")
+    settled = total["settled"]
+    print(f"  {'overall':8s} settled {settled:5d} ({settled / max(n, 1):6.1%})  "
+          f"pass agreement {total['pass_agree'] / max(settled, 1):6.1%}  "
+          f"category agreement {total['category_agree'] / max(settled, 1):6.1%}  "
+          f"Maya latency saved {total['saved_s']:.1f}s ({total['saved_s'] / max(n, 1):.3f}s/msg)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of sessions kept for evaluation")
+    parser.add_argument("--out", default=os.getenv("MAYA_CENTROIDS_PATH", "embedding_cache/maya_centroids.npz"))
+    parser.add_argument("--min-sim", type=float, default=float(os.getenv("MAYA_FASTPATH_MIN_SIM", "0.45")))
+    parser.add_argument("--margin", type=float, default=float(os.getenv("MAYA_FASTPATH_MARGIN", "0.05")))
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Assumed Maya LLM seconds when not logged")
+    parser.add_argument("--limit", type=int, default=None, help="Read at most N history records")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate only; do not write centroids")
+    args = parser.parse_args()
+
+    examples = load_examples(args.limit)
+    if not examples:
+        print("No LLM-decided Maya turns found in conversation_history.")
+        return
+    labels = sorted({ex["label"] for ex in examples})
+    print(f"{len(examples)} Maya decisions; labels: " +
+          ", ".join(f"{l}={sum(ex['label'] == l for ex in examples)}" for l in labels))
+
+    # Same query and embeddings as /chat; reuses the server's query cache file when configured
+    from rag_modules.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+    from rag_modules.rag_engine import RAGEngine
+    cache_path = os.getenv("QUERY_EMBED_CACHE_PATH")
+    engine = RAGEngine(None, query_cache=EmbeddingCache(
+        max_entries=len(examples) + 1, persistent=SQLiteEmbeddingStore(cache_path) if cache_path else None
+    ))
+    t0 = time.perf_counter()
+    queries = [build_search_query(ex["message"], ex["history"]) for ex in examples]
+    vectors = []
+    for start in range(0, len(queries), 256):
+        vectors.extend(engine.embed_queries(queries[start:start + 256]))
+    print(f"Embedded {len(vectors)} messages in {time.perf_counter() - t0:.1f}s")
+
+    params = {"min_similarity": args.min_sim, "min_margin": args.margin}
+    train = [i for i, ex in enumerate(examples) if not in_holdout(ex["session_id"], args.holdout)]
+    test = [i for i, ex in enumerate(examples) if in_holdout(ex["session_id"], args.holdout)]
+    if len({examples[i]["label"] for i in train}) < 2 or not test:
+        print("Not enough labelled data for a train/hold-out split; evaluating rules only.")
+        layers = evaluate(MayaFastPath(**params), examples, vectors, args.llm_latency)
+        report("Rules, all data", layers, len(examples))
+        return
+
+    held_out = MayaFastPath.train([vectors[i] for i in train], [examples[i]["label"] for i in train], **params)
+    layers = evaluate(held_out, [examples[i] for i in test], [vectors[i] for i in test], args.llm_latency)
+    report(f"Hold-out ({len(train)} train / {len(test)} test)", layers, len(test))
+
+    if args.dry_run:
+        return
+    fast_path = MayaFastPath.train(vectors, [ex["label"] for ex in examples], **params)
+    fast_path.save(args.out)
+    print(f"\nWrote {len(fast_path.labels)} centroids to {args.out}; workers reload it on the next message.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from rag_modules.ann_index import IVFIndex
+from rag_modules.vectorstore import InMemoryVectorStore
+
+DIM = 32
+
+
+def _clustered_docs(rng, n_docs=10, per_doc=30, n_clusters=12, prefix="user"):
+    centers = rng.normal(size=(n_clusters, DIM))
+    docs = {}
+    for d in range(n_docs):
+        doc_id = f"{prefix}{d}"
+        picks = rng.integers(0, n_clusters, per_doc)
+        docs[doc_id] = [
+            {"text": f"{doc_id} chunk {i}", "embedding": (centers[c] + 0.3 * rng.normal(size=DIM)).tolist()}
+            for i, c in enumerate(picks)
+        ]
+    return docs, centers
+
+
+def _exact(docs, q, top_k):
+    q = np.asarray(q) / np.linalg.norm(q)
+    scored = []
+    for chunks in docs.values():
+        for c in chunks:
+            e = np.asarray(c["embedding"])
+            scored.append((c["text"], float(e @ q / np.linalg.norm(e))))
+    scored.sort(key=lambda r: r[1], reverse=True)
+    return [t for t, _ in scored[:top_k]]
+
+
+def _store(tmp_path, docs, index, **options):
+    store = InMemoryVectorStore(str(tmp_path), initial_capacity=16, ann_index=index, **options)
+    for doc_id, chunks in docs.items():
+        store.add_document(doc_id, doc_id, [dict(c) for c in chunks])
+    return store
+
+
+def _texts(results):
+    return [c["text"] for c, _ in results]
+
+
+def test_small_collection_falls_back_to_exact_search():
+    index = IVFIndex(min_size=1000)
+    matrix = np.eye(4, DIM, dtype=np.float32)
+    assert index.search(matrix, 4, matrix[0]) is None
+    assert index._state is None
+
+
+def test_kmeans_assigns_every_row_to_its_nearest_centroid():
+    rng = np.random.default_rng(0)
+    docs, _ = _clustered_docs(rng)
+    matrix = np.asarray([c["embedding"] for chunks in docs.values() for c in chunks], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    index = IVFIndex(n_lists=12, n_probe=2, min_size=100)
+    assert index.search(matrix, len(matrix), matrix[0]) is not None
+
+    state = index._state
+    assert state.centroids.shape == (12, DIM)
+    assert np.allclose(np.linalg.norm(state.centroids, axis=1), 1.0, atol=1e-5)
+    assert np.array_equal(state.assign, np.argmax(matrix @ state.centroids.T, axis=1))
+    # Every row sits in exactly the list it was assigned to
+    for c in range(12):
+        assert (state.assign[state.order[state.offsets[c]:state.offsets[c + 1]]] == c).all()
+    assert state.offsets[-1] == len(matrix)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_probing_every_list_is_exact(tmp_path, quantize):
+    rng = np.random.default_rng(1)
+    docs, _ = _clustered_docs(rng)
+    store = _store(tmp_path, docs, IVFIndex(n_lists=8, n_probe=8, min_size=100), quantize=quantize)
+    for _ in range(10):
+        q = rng.normal(size=DIM)
+        assert _texts(store.similarity_search(q, top_k=5)) == _exact(docs, q, 5)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_recall_with_few_probes(tmp_path, quantize):
+    rng = np.random.default_rng(2)
+    docs, centers = _clustered_docs(rng)
+    store = _store(tmp_path, docs, IVFIndex(n_lists=16, n_probe=3, min_size=100), quantize=quantize)
+    hits = total = 0
+    for _ in range(30):
+        q = centers[rng.integers(len(centers))] + 0.3 * rng.normal(size=DIM)
+        expected = set(_exact(docs, q, 5))
+        hits += len(expected & set(_texts(store.similarity_search(q, top_k=5))))
+        total += 5
+    assert hits / total >= 0.9
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_appended_rows_are_scored_as_tail_then_folded_in(tmp_path, quantize):
+    rng = np.random.default_rng(3)
+    docs, centers = _clustered_docs(rng)
+    index = IVFIndex(n_lists=8, n_probe=2, min_size=100, tail_ratio=0.1)
+    store = _store(tmp_path, docs, index, quantize=quantize)
+    store.similarity_search(rng.normal(size=DIM), top_k=1)
+    indexed = index._state.n_rows
+
+    # A small append stays in the exactly-scored tail
+    new, _ = _clustered_docs(rng, n_docs=1, per_doc=5, prefix="new")
+    store.add_document("new0", "new0", [dict(c) for c in new["new0"]])
+    target = new["new0"][3]
+    assert _texts(store.similarity_search(target["embedding"], top_k=1)) == [target["text"]]
+    assert index._state.n_rows == indexed
+
+    # Past tail_ratio the tail is folded into the lists
+    more, _ = _clustered_docs(rng, n_docs=2, per_doc=30, prefix="more")
+    for doc_id, chunks in more.items():
+        store.add_document(doc_id, doc_id, [dict(c) for c in chunks])
+    target = more["more1"][7]
+    assert _texts(store.similarity_search(target["embedding"], top_k=1)) == [target["text"]]
+    assert index._state.n_rows == store._snapshot.size
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_deleted_rows_are_never_returned(tmp_path, quantize):
+    rng = np.random.default_rng(4)
+    docs, _ = _clustered_docs(rng)
+    index = IVFIndex(n_lists=8, n_probe=8, min_size=100)
+    store = _store(tmp_path, docs, index, quantize=quantize)
+    generation = store._snapshot.generation
+    target = docs["user4"][0]
+
+    store.delete_document("user4")
+    assert store._snapshot.dead_rows == len(docs["user4"])
+    assert store._snapshot.generation == generation  # tombstoned, not compacted
+    del docs["user4"]
+    results = store.similarity_search(target["embedding"], top_k=5)
+    assert not any(t.startswith("user4 ") for t in _texts(results))
+    assert _texts(results) == _exact(docs, target["embedding"], 5)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_compaction_rebuilds_on_the_new_generation(tmp_path, quantize):
+    rng = np.random.default_rng(5)
+    docs, _ = _clustered_docs(rng)
+    index = IVFIndex(n_lists=8, n_probe=8, min_size=100)
+    store = _store(tmp_path, docs, index, quantize=quantize)
+    store.similarity_search(rng.normal(size=DIM), top_k=1)
+    generation = index._state.generation
+
+    for doc_id in ["user0", "user1", "user2", "user3", "user5", "user6"]:
+        store.delete_document(doc_id)
+        del docs[doc_id]
+    assert store.cache_stats()["compactions"] >= 1
+    assert store._snapshot.generation > generation
+
+    for _ in range(5):
+        q = rng.normal(size=DIM)
+        assert _texts(store.similarity_search(q, top_k=5)) == _exact(docs, q, 5)
+    state = index._state
+    assert state.generation == store._snapshot.generation
+    assert state.n_rows == store._snapshot.size == sum(len(c) for c in docs.values())
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pymongo")
+pytest.importorskip("openai")
+
+from backend import auth_routes, rag_service
+from rag_modules import maya_receptionist
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def find_one(self, query, *args, **kwargs):
+        return next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    def count_documents(self, query):
+        return sum(all(d.get(k) == v for k, v in query.items()) for d in self.docs)
+
+    def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+class FakeEngine:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, query):
+        self.queries.append(query)
+        return [float(len(query)), 1.0]
+
+
+class FakeStore:
+    document_names = ["98"]
+
+    def __init__(self, release=None):
+        self.calls = 0
+        self.release = release
+        self.results = [({"text": "Venus rules the seventh house.", "heading": "Marriage", "doc_id": "98"}, 0.8)]
+
+    def similarity_search(self, query_vector, top_k, doc_ids):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return self.results
+
+
+class FakeMemory:
+    def window(self, session_id, history):
+        return history, None
+
+    def maybe_refresh(self, *args):
+        pass
+
+
+@pytest.fixture
+def turn_env(monkeypatch):
+    collections = {
+        "users": FakeCollection([{"mobile": "98", "name": "Asha"}]),
+        "conversation_history": FakeCollection(),
+    }
+    engine = FakeEngine()
+    env = SimpleNamespace(engine=engine, store=FakeStore(), collections=collections, maya={})
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(auth_routes, "get_db_collection", lambda name: collections.setdefault(name, FakeCollection()))
+    monkeypatch.setattr(auth_routes, "get_rag_engine", lambda: (env.engine, env.store))
+    monkeypatch.setattr(auth_routes, "get_session_memory", lambda: FakeMemory())
+    monkeypatch.setattr(auth_routes, "semantic_cache_mode", lambda: "off")
+    monkeypatch.setattr(auth_routes, "read_prompt", lambda name: None)
+    monkeypatch.setattr(auth_routes.WalletService, "is_wallet_enabled", staticmethod(lambda: False))
+    monkeypatch.setattr(auth_routes.WalletService, "get_wallet", staticmethod(lambda mobile: {"balance": 10}))
+
+    async def fake_maya(question, history, user_details=None, query_vector=None):
+        return dict(env.maya)
+
+    monkeypatch.setattr(maya_receptionist, "acheck_with_maya", fake_maya)
+    return env
+
+
+def _request(message="When will I get married?"):
+    return SimpleNamespace(message=message, history=[], mobile="98", session_id="s1")
+
+
+def test_maya_passes_and_guruji_uses_the_speculative_retrieval(turn_env):
+    turn_env.maya = {"pass_to_guruji": True, "language_detected": "English"}
+
+    async def run():
+        turn = await auth_routes._prepare_chat_turn(_request())
+        return turn, asyncio.all_tasks() == {asyncio.current_task()}
+
+    turn, clean = asyncio.run(run())
+    assert turn["reply"] is None and clean
+    assert turn["clean_chunks"] == [{"text": "Venus rules the seventh house.", "heading": "Marriage", "doc_id": "98"}]
+    # The result retrieved during Maya's call is the one used: no second search
+    assert turn_env.store.calls == 1
+    assert turn_env.engine.queries == ["When will I get married?"]
+
+
+class FakeAnswerCache:
+    def __init__(self):
+        self.lookups = []
+
+    def lookup(self, mobile, language, vector):
+        self.lookups.append(vector)
+        return None
+
+
+def test_semantic_cache_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_MODE", raising=False)
+    assert rag_service.semantic_cache_mode() == "off"
+
+
+def test_semantic_cache_matches_the_question_not_the_augmented_query(turn_env, monkeypatch):
+    turn_env.maya = {"pass_to_guruji": True, "language_detected": "English"}
+    cache = FakeAnswerCache()
+    monkeypatch.setattr(auth_routes, "semantic_cache_mode", lambda: "draft")
+    monkeypatch.setattr(auth_routes, "get_semantic_cache", lambda: cache)
+    request = _request("And my career?")
+    request.history = [{"role": "user", "content": "When will I get married?"},
+                       {"role": "assistant", "content": "After 2027."}]
+
+    turn = asyncio.run(auth_routes._prepare_chat_turn(request))
+    assert turn_env.engine.queries[0] != "And my career?"  # retrieval used the augmented query
+    assert cache.lookups == [turn_env.engine.embed_query("And my career?")]
+    assert turn["question_vector"] == cache.lookups[0]
+
+
+def test_maya_answers_and_the_speculative_retrieval_is_discarded(turn_env):
+    turn_env.maya = {"pass_to_guruji": False, "response_message": "Please ask about your chart."}
+    release = threading.Event()
+    turn_env.store = FakeStore(release)
+
+    async def run():
+        turn = await auth_routes._prepare_chat_turn(_request("Who built you?"))
+        clean = asyncio.all_tasks() == {asyncio.current_task()}
+        release.set()
+        return turn, clean
+
+    turn, clean = asyncio.run(run())
+    assert turn["reply"]["assistant"] == "maya"
+    assert turn["reply"]["answer"] == "Please ask about your chart."
+    assert clean
+
+
+def test_an_error_after_the_tasks_start_leaves_none_running(turn_env, monkeypatch):
+    release = threading.Event()
+    turn_env.store = FakeStore(release)
+
+    async def failing_maya(*args, **kwargs):
+        raise RuntimeError("Maya is down")
+
+    monkeypatch.setattr(maya_receptionist, "acheck_with_maya", failing_maya)
+
+    seen = {}
+
+    async def run():
+        try:
+            await auth_routes._prepare_chat_turn(_request())
+        finally:
+            seen["clean"] = asyncio.all_tasks() == {asyncio.current_task()}
+            release.set()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert seen["clean"]
@@ -0,0 +1,105 @@
+import re
+
+from rag_modules.chunking import chunk_hierarchy_for_rag, dedupe_records, extract_hierarchy
+from rag_modules.tokenizer import count_tokens
+
+
+def test_text_lands_under_its_heading_path():
+    records = extract_hierarchy(
+        "<h1>Report</h1><p>Intro text.</p><h2>Career</h2><p>Growth after <b>2027</b>.</p>"
+        "<h3>Timing</h3><ul><li>Jupiter transit</li></ul><h2>Health</h2><p>Mind the back.</p>"
+        "<script>var x = 1;</script>"
+    )
+    assert [(r["h1"], r["h2"], r["h3"], r["content"]) for r in records] == [
+        ("Report", None, None, "Intro text."),
+        ("Report", "Career", None, "Growth after 2027."),
+        ("Report", "Career", "Timing", "Jupiter transit"),
+        ("Report", "Health", None, "Mind the back."),
+    ]
+
+
+def test_heading_inside_a_cell_stays_in_the_table():
+    html = ("<h2>Planets</h2><table><tr><td><h4>Sun</h4></td><td>Leo</td></tr>"
+            "<tr><td>Moon</td><td>Cancer</td></tr></table><p>After.</p>")
+    records = extract_hierarchy(html)
+    assert len(records) == 2
+    table = records[0]["content"]
+    assert table.startswith("<table>") and table.endswith("</table>")
+    assert "<h4>Sun</h4>" in table and "Cancer" in table
+    assert records[0]["h4"] is None
+    assert records[1]["content"] == "After."
+
+
+def test_malformed_table_is_closed_before_the_next_heading():
+    records = extract_hierarchy("<h2>Dasha</h2><table><tr><td>Rahu</td><td>2025</td>"
+                                "<h2>Remedies</h2><p>Chant daily.</p>")
+    assert records[0]["content"] == "<table><tr><td>Rahu</td><td>2025</td></tr></table>"
+    assert (records[1]["h2"], records[1]["content"]) == ("Remedies", "Chant daily.")
+
+
+def test_nested_table_is_one_record():
+    records = extract_hierarchy("<h2>Chart</h2><table><tr><td><table><tr><td>inner</td></tr></table>"
+                                "</td><td>outer</td></tr></table>")
+    assert len(records) == 1
+    assert records[0]["content"].count("<table>") == 2 and records[0]["content"].endswith("</table>")
+
+
+def test_dedupe_drops_repeats_within_a_heading_only():
+    line = "Saturn in the tenth house gives a slow but steady rise in career and public standing over time"
+    records = [{"h1": "R", "h2": h, "h3": None, "h4": None, "content": c}
+               for h, c in [("Career", line), ("Career", line.upper()), ("Career", line + " indeed"),
+                            ("Health", line)]]
+    kept, stats = dedupe_records(records)
+    assert [(r["h2"], r["content"]) for r in kept] == [("Career", line), ("Health", line)]
+    assert stats["records_removed"] == 2
+
+
+def test_chunks_fit_the_token_budget_and_overlap():
+    lines = [f"Line {i}: the Moon in the fourth house shapes home life and emotional security." for i in range(60)]
+    records = [{"h1": "Report", "h2": "Home", "h3": None, "h4": None, "content": "\n".join(lines)}]
+    chunks = chunk_hierarchy_for_rag(records, chunk_size=120, overlap=30, dedupe=False)
+    assert len(chunks) > 1
+    assert all(count_tokens(c["text"]) <= 120 for c in chunks)
+    assert all(c["text"].startswith("Home - Report\n\n") for c in chunks)
+    # Each chunk repeats the tail of the previous one
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur["text"].split("\n")[2] in prev["text"]
+    # Nothing is lost
+    body = "\n".join(c["text"] for c in chunks)
+    assert all(line in body for line in lines)
+
+
+def _body(chunk):
+    return chunk["text"].split("\n\n", 1)[1]
+
+
+def test_oversized_table_splits_between_rows_with_overlap():
+    rows = "".join(f"<tr><td>Period {i}</td><td>Saturn-Mercury {2020 + i}</td></tr>" for i in range(80))
+    table = f'<table class="dasha"><tr><th>Period</th><th>Years</th></tr>{rows}</table>'
+    records = [{"h1": "Report", "h2": "Dasha", "h3": None, "h4": None, "content": table}]
+    chunks = chunk_hierarchy_for_rag(records, chunk_size=150, overlap=40, dedupe=False)
+    assert len(chunks) > 2
+    assert all(count_tokens(c["text"]) <= 150 for c in chunks)
+    whole_table = re.compile(r'<table class="dasha">(<tr><t[dh]>[^<]*</t[dh]><t[dh]>[^<]*</t[dh]></tr>)+</table>')
+    for c in chunks:
+        assert all(whole_table.fullmatch(line) for line in _body(c).split("\n"))
+    # Each chunk starts with the last whole rows of the one before it
+    for prev, cur in zip(chunks, chunks[1:]):
+        carried = re.findall(r"<tr>.*?</tr>", _body(cur).split("\n")[0])
+        assert carried and _body(prev).endswith("".join(carried) + "</table>")
+    body = "".join(c["text"] for c in chunks)
+    assert all(f"Period {i}<" in body for i in range(80))
+
+
+def test_oversized_prose_line_splits_between_sentences_with_overlap():
+    line = " ".join(f"Sentence {i} says Jupiter aspects the seventh house this year." for i in range(60))
+    records = [{"h1": "Report", "h2": "Marriage", "h3": None, "h4": None, "content": line}]
+    chunks = chunk_hierarchy_for_rag(records, chunk_size=120, overlap=30, dedupe=False)
+    assert len(chunks) > 2
+    assert all(count_tokens(c["text"]) <= 120 for c in chunks)
+    for prev, cur in zip(chunks, chunks[1:]):
+        carried = _body(cur).split("\n")[0]
+        assert carried.startswith("Sentence ") and carried.endswith(".")
+        assert _body(prev).endswith(carried)
+    body = "".join(c["text"] for c in chunks)
+    assert all(f"Sentence {i} says" in body for i in range(60))
@@ -0,0 +1,37 @@
+from rag_modules.context_compression import compress_chunks
+from rag_modules.tokenizer import count_tokens
+
+CHUNKS = [
+    {"text": "Career - Report\nSaturn rules the tenth house. Your marriage looks strong. "
+             "Jupiter transit in 2027 brings a promotion.\n"
+             "<table><tr><th>Planet</th><th>Sign</th></tr><tr><td>Sun</td><td>Leo</td></tr></table>",
+     "doc_id": "999"},
+    {"text": "Planets - Report\n<table> <tr><th>Planet</th><th>Sign</th></tr> <tr><td>Sun</td><td>Leo</td></tr>"
+             "<tr><td>Moon</td><td>Cancer</td></tr></table>\nHealth is fine.",
+     "doc_id": "999"},
+]
+
+
+def test_keeps_heading_and_best_sentence_within_budget():
+    out, stats = compress_chunks(CHUNKS, "when will I get a promotion in my career?", max_tokens=40)
+    assert [c["text"].split("\n")[0] for c in out] == ["Career - Report", "Planets - Report"]
+    assert "promotion" in out[0]["text"] and "marriage" not in out[0]["text"]
+    assert all(c["doc_id"] == "999" for c in out)
+    assert stats["tokens_after"] == sum(count_tokens(c["text"], "gpt-4o-mini") for c in out)
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_repeated_table_rows_are_dropped_and_tables_minified():
+    out, stats = compress_chunks(CHUNKS, "which sign is my moon in?", max_tokens=1000)
+    assert stats["duplicate_rows"] == 1
+    planets = out[1]["text"]
+    assert "<tr><td>Moon</td><td>Cancer</td></tr>" in planets
+    assert "<td>Sun</td>" not in planets and "> <" not in planets
+
+
+def test_table_cut_by_the_chunk_start_drops_the_partial_row():
+    tail = [{"text": "Planets - Report\n<td>Leo</td></tr><tr><td>Mars</td><td>Aries</td></tr></table>\nMars is strong."}]
+    out, _ = compress_chunks(tail, "mars", max_tokens=1000)
+    # The half row before the first <tr> never reaches the prompt
+    assert "<td>Leo</td>" not in out[0]["text"]
+    assert "Mars is strong." in out[0]["text"]
@@ -0,0 +1,40 @@
+import sqlite3
+
+import numpy as np
+
+from rag_modules.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+
+
+def test_persistent_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "chunks.sqlite")
+    EmbeddingCache(persistent=SQLiteEmbeddingStore(path)).put("k", [1.0, 2.0])
+    cache = EmbeddingCache(persistent=SQLiteEmbeddingStore(path))
+    assert cache.get("k").tolist() == [1.0, 2.0]
+    assert cache.stats()["persistent_hits"] == 1
+
+
+def test_store_prunes_least_recently_used_rows(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "chunks.sqlite"), max_rows=10, prune_every=1)
+    for i in range(10):
+        store.put(f"k{i}", np.full(4, i))
+    # A hit makes k0 recent again
+    assert store.get("k0") is not None
+    for i in range(10, 15):
+        store.put(f"k{i}", np.full(4, i))
+
+    assert store.get("k0") is not None
+    assert all(store.get(f"k{i}") is None for i in range(1, 6))
+    assert all(store.get(f"k{i}") is not None for i in range(6, 15))
+
+
+def test_store_upgrades_a_file_without_last_used(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)")
+    for i in range(5):
+        conn.execute("INSERT INTO embeddings VALUES (?, ?, ?)", (f"k{i}", np.zeros(2, np.float32).tobytes(), i))
+    conn.commit()
+    conn.close()
+
+    store = SQLiteEmbeddingStore(path, max_rows=3)
+    assert [store.get(f"k{i}") is not None for i in range(5)] == [False, False, True, True, True]
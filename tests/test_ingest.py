@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+from rag_modules.ingest import IngestionPipeline
+from rag_modules.vectorstore import InMemoryVectorStore
+
+
+class HashEngine:
+    """Deterministic stand-in for RAGEngine.embed_chunks (no API calls)."""
+
+    def embed_chunks(self, chunks):
+        for c in chunks:
+            c["embedding"] = np.random.default_rng(abs(hash(c["text"])) % 2**32).normal(size=8).tolist()
+        return chunks
+
+
+REPORT = "<h1>Career</h1><p>Saturn in the tenth house brings steady growth.</p>" \
+         "<h2>Timing</h2><p>The Jupiter transit in 2027 favours a change of job.</p>"
+
+
+def test_concurrent_first_ingests_share_one_pool(tmp_path):
+    pipeline = IngestionPipeline(HashEngine(), InMemoryVectorStore(str(tmp_path)), workers=1)
+    created = []
+    real_pools = pipeline._pools
+
+    def pools():
+        result = real_pools()
+        created.append(id(result[0]))
+        return result
+
+    pipeline._pools = pools
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(pipeline.ingest([(f"u{i}", f"u{i}", REPORT)])))
+               for i in range(4)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        pipeline._process_pool.shutdown()
+        pipeline._thread_pool.shutdown()
+
+    assert len(set(created)) == 1
+    assert all(not r["errors"] for r in results)
+    assert sorted(pipeline.vectorstore.document_names) == ["u0", "u1", "u2", "u3"]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from rag_modules import llm_clients
+
+
+class FakeAsyncClient:
+    def __init__(self, **kwargs):
+        self.api_key = kwargs["api_key"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(llm_clients, "AsyncOpenAI", FakeAsyncClient)
+    monkeypatch.setattr(llm_clients, "_async_clients", llm_clients.weakref.WeakKeyDictionary())
+    monkeypatch.setattr(llm_clients, "_semaphores", llm_clients.weakref.WeakKeyDictionary())
+
+
+def test_async_client_is_reused_per_loop_and_key():
+    async def clients():
+        return (llm_clients.get_async_openai_client("k1"), llm_clients.get_async_openai_client("k1"),
+                llm_clients.get_async_openai_client("k2"))
+
+    a, b, c = asyncio.run(clients())
+    assert a is b and a is not c and c.api_key == "k2"
+    # A new loop gets its own client; the closed loop's entry is dropped
+    d, _, _ = asyncio.run(clients())
+    assert d is not a
+    assert len(llm_clients._async_clients) <= 1
+
+
+def test_closed_loop_state_is_not_handed_to_a_new_loop():
+    async def state():
+        async with llm_clients.llm_slot():
+            pass
+        return llm_clients._semaphores[asyncio.get_running_loop()], llm_clients.get_async_openai_client("k")
+
+    first_sem, first_client = asyncio.run(state())
+    second_sem, second_client = asyncio.run(state())
+    assert second_sem is not first_sem and second_client is not first_client
+    assert len(llm_clients._semaphores) <= 1
+
+
+def test_llm_slot_caps_concurrency(monkeypatch):
+    monkeypatch.setattr(llm_clients, "LLM_MAX_CONCURRENCY", 2)
+    in_flight = []
+    peak = []
+
+    async def call():
+        async with llm_clients.llm_slot():
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+    async def burst():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(burst())
+    assert len(peak) == 6 and max(peak) == 2
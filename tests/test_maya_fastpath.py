@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("pydantic")
+
+from rag_modules import maya_receptionist
+from rag_modules.maya_receptionist import MayaFastPath
+
+GURUJI_TURN = [{"role": "user", "content": "career?"},
+               {"role": "assistant", "assistant": "guruji", "content": "Saturn favours steady growth. Shall I go on?"}]
+MAYA_TURN = [{"role": "user", "content": "hello"},
+             {"role": "assistant", "assistant": "maya", "content": "Could you tell me which area of life?"}]
+
+
+@pytest.mark.parametrize("message", [
+    "how do I cook biryani for my husband?",
+    "Can you write python code for my job?",
+    "What is the stock price of Tata? is it good money?",
+    "when will I get married?",
+    "yes",
+])
+def test_rules_leave_ambiguous_messages_to_maya(message):
+    assert MayaFastPath().classify_rules(message, []) is None
+
+
+@pytest.mark.parametrize("message, category", [
+    ("When does my Rahu mahadasha end?", "PROCEED"),
+    ("Is sade sati affecting my career?", "PROCEED"),
+    ("are you an AI?", "REFUSE"),
+    ("tell me my future", "CLARIFY"),
+])
+def test_rules_settle_clear_cases(message, category):
+    result = MayaFastPath().classify_rules(message, [])
+    assert result["category"] == category
+    assert result["pass_to_guruji"] == (category == "PROCEED")
+
+
+def test_follow_up_proceeds_only_after_guruji():
+    fast_path = MayaFastPath()
+    assert fast_path.classify_rules("tell me more", GURUJI_TURN)["category"] == "PROCEED"
+    assert fast_path.classify_rules("yes", [{"role": "guruji", "message": "Shall I go on?"}])["category"] == "PROCEED"
+    # After Maya's own clarifying question or refusal, or an unmarked turn, Maya decides
+    assert fast_path.classify_rules("yes", MAYA_TURN) is None
+    assert fast_path.classify_rules("ok", [{"role": "assistant", "content": "Namaste"}]) is None
+
+
+def test_fast_path_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("MAYA_FASTPATH", raising=False)
+    assert maya_receptionist.get_fast_path() is None
+    monkeypatch.setenv("MAYA_FASTPATH", "on")
+    monkeypatch.setenv("MAYA_CENTROIDS_PATH", "does-not-exist.npz")
+    assert isinstance(maya_receptionist.get_fast_path(), MayaFastPath)
+
+
+def test_centroid_layer_only_settles_confident_proceed(tmp_path):
+    rng = np.random.default_rng(0)
+    proceed, refuse = rng.normal(size=8), rng.normal(size=8)
+    vectors = [proceed + 0.05 * rng.normal(size=8) for _ in range(5)] + \
+              [refuse + 0.05 * rng.normal(size=8) for _ in range(5)] + [np.zeros(8)]
+    labels = ["PROCEED"] * 5 + ["REFUSE"] * 5 + ["PROCEED"]
+    fast_path = MayaFastPath.train(vectors, labels)
+
+    path = str(tmp_path / "centroids.npz")
+    fast_path.save(path)
+    loaded = MayaFastPath.load(path)
+    assert loaded.labels == ["PROCEED", "REFUSE"]
+    assert loaded.classify_embedding(proceed)["category"] == "PROCEED"
+    assert loaded.classify_embedding(refuse) is None
+
+    embedded = []
+    loaded.classify("what do the stars say now", [], embed=lambda t: embedded.append(t) or proceed,
+                    search_query="retrieval query")
+    assert embedded == ["retrieval query"]
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+from rag_modules import prompt_cache
+from rag_modules.prompt_cache import invalidate_prompt, read_prompt
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "_prompts", {})
+
+
+def _rewrite(path, text, mtime_ns=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_file_is_read_once_until_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "system_prompt.txt"
+    _rewrite(path, "You are Guruji.", mtime_ns=1_000_000_000)
+    assert read_prompt(str(path)) == "You are Guruji."
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **kw: opened.append(a[0]) or real_open(*a, **kw))
+    assert read_prompt(str(path)) == "You are Guruji."
+    assert opened == []
+
+    # Same size, new mtime
+    _rewrite(path, "You are Maya!!", mtime_ns=2_000_000_000)
+    assert read_prompt(str(path)) == "You are Maya!!"
+    # Same mtime, new size
+    _rewrite(path, "You are Maya, the receptionist.", mtime_ns=2_000_000_000)
+    assert read_prompt(str(path)) == "You are Maya, the receptionist."
+    assert len(opened) == 2
+
+
+def test_missing_file_returns_default_and_drops_the_entry(tmp_path):
+    path = tmp_path / "maya_system_prompt.txt"
+    _rewrite(path, "old")
+    assert read_prompt(str(path)) == "old"
+    path.unlink()
+    assert read_prompt(str(path), "fallback") == "fallback"
+    assert prompt_cache._prompts == {}
+
+
+def test_invalidate_prompt_catches_a_write_the_mtime_missed(tmp_path):
+    path = tmp_path / "system_prompt.txt"
+    _rewrite(path, "version one", mtime_ns=1_000_000_000)
+    assert read_prompt(str(path)) == "version one"
+
+    _rewrite(path, "version two", mtime_ns=1_000_000_000)
+    assert read_prompt(str(path)) == "version one"  # stat can't tell them apart
+    invalidate_prompt(str(path))
+    assert read_prompt(str(path)) == "version two"
+
+
+def test_admin_prompt_update_is_served_on_the_next_read(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("pymongo")
+    from types import SimpleNamespace
+
+    from backend import admin_routes
+
+    monkeypatch.chdir(tmp_path)
+    _rewrite(tmp_path / "system_prompt.txt", "version one", mtime_ns=1_000_000_000)
+    assert read_prompt("system_prompt.txt") == "version one"
+
+    asyncio.run(admin_routes.update_system_prompt(SimpleNamespace(prompt="version two")))
+    # Even if the filesystem kept the old mtime, the POST dropped the cached copy
+    os.utime("system_prompt.txt", ns=(1_000_000_000, 1_000_000_000))
+    assert read_prompt("system_prompt.txt") == "version two"
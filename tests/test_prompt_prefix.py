@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("google.generativeai")
+
+from rag_modules.chat_handler import GURUJI_INSTRUCTIONS, _openai_messages, split_volatile_placeholders
+
+TEMPLATE = (
+    "You are Astrology Guruji. Reply in {{language_detected}}.\n"
+    "Today is {{current_date}}; count dashas from today."
+)
+
+
+def _turn(history, question, context, language, date):
+    system_prompt, turn_note = split_volatile_placeholders(
+        TEMPLATE, {"language_detected": language, "current_date": date}
+    )
+    return _openai_messages(system_prompt, GURUJI_INSTRUCTIONS, context, history, question, turn_note), turn_note
+
+
+def _bytes(messages):
+    return json.dumps(messages, ensure_ascii=False).encode("utf-8")
+
+
+def test_placeholders_move_to_the_turn_note():
+    system_prompt, turn_note = split_volatile_placeholders(
+        TEMPLATE, {"language_detected": "Hindi", "current_date": "2026-10-18 09:00:00", "unused": "x"}
+    )
+    assert "{{" not in system_prompt and "Hindi" not in system_prompt and "2026" not in system_prompt
+    assert turn_note == "language_detected: Hindi\ncurrent_date: 2026-10-18 09:00:00"
+
+
+def test_prefix_is_byte_identical_across_turns():
+    history = [{"role": "user", "content": "When will I marry?"},
+               {"role": "assistant", "content": "After Venus dasha begins in 2027."}]
+    first, _ = _turn(history, "And my career?", "[chunk 1] Saturn in the tenth house.",
+                     "English", "2026-10-18 09:00:00")
+    later_history = history + [{"role": "user", "content": "And my career?"},
+                               {"role": "assistant", "content": "Steady growth."}]
+    second, _ = _turn(later_history, "Kab tak?", "[chunk 1] Jupiter transits Aries.",
+                      "Hinglish", "2026-10-19 21:30:00")
+
+    # Everything except the last message of the first turn is reused verbatim
+    prefix = first[:-1]
+    assert _bytes(second[:len(prefix)]) == _bytes(prefix)
+    assert second[:len(later_history) + 2] == second[:2] + later_history
+
+
+def test_turn_note_follows_the_context_in_the_last_user_message():
+    messages, turn_note = _turn([], "Will I travel abroad?", "[chunk 1] Rahu in the twelfth house.",
+                                "Hindi", "2026-10-18 09:00:00")
+    last = messages[-1]
+    assert last["role"] == "user"
+    content = last["content"]
+    assert content.index("Rahu in the twelfth house") < content.index("Will I travel abroad?") < content.index(turn_note)
+    assert content.endswith(turn_note)
+    assert all(turn_note not in m["content"] for m in messages[:-1])
@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from rag_modules.rag_engine import RAGEngine
+from rag_modules.tokenizer import count_tokens
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model, input):
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(len(t)), 1.0, 0.5]) for i, t in enumerate(texts)
+        ])
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    engine = RAGEngine(None)
+    engine.client = SimpleNamespace(embeddings=FakeEmbeddings())
+    return engine
+
+
+def test_embed_query_returns_a_list_on_both_paths(engine):
+    fetched = engine.embed_query("When will I marry?")
+    cached = engine.embed_query("when will i  MARRY?")
+    assert type(fetched) is list and type(cached) is list
+    assert cached == fetched
+    assert engine.client.embeddings.calls == 1
+
+
+def test_embed_queries_mixes_cached_and_fetched(engine):
+    engine.embed_query("yes")
+    vectors = engine.embed_queries(["yes", "tell me more", "Tell me more"])
+    assert all(type(v) is list for v in vectors)
+    assert vectors[1] == vectors[2]
+    assert engine.client.embeddings.calls == 2
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """Fails the first `failures` calls, then embeds; records each call's inputs."""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.inputs = []
+
+    def create(self, model, input):
+        self.inputs.append(list(input))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("rate limited")
+        return super().create(model, input)
+
+
+class FakePendingCollection:
+    def __init__(self):
+        self.ids = set()
+
+    def update_one(self, query, update, upsert=False):
+        self.ids.add(query["_id"])
+
+    def delete_one(self, query):
+        self.ids.discard(query["_id"])
+
+    def find(self, query, projection=None):
+        return [{"_id": d} for d in sorted(self.ids)]
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs = {}
+
+    def add_chunks(self, chunks):
+        self.docs[chunks[0]["doc_id"]] = chunks
+
+
+def _chunks(doc_id, n=6):
+    return [{"text": f"{doc_id} chunk {i} " + "word " * 20, "doc_id": doc_id, "chunk_index": i} for i in range(n)]
+
+
+def test_embed_chunks_batches_within_both_limits(engine):
+    engine.client = SimpleNamespace(embeddings=FlakyEmbeddings())
+    engine.embed_batch_items, engine.embed_batch_tokens = 4, 80
+    chunks = engine.embed_chunks(_chunks("98", 10))
+    assert all("embedding" in c for c in chunks)
+    sizes = [len(inputs) for inputs in engine.client.embeddings.inputs]
+    assert sum(sizes) == 10 and max(sizes) <= 4
+    per_chunk = count_tokens(chunks[0]["text"])
+    assert all(n * per_chunk <= 80 or n == 1 for n in sizes)
+
+
+def test_failed_batch_is_retried_with_backoff(engine, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("rag_modules.rag_engine.time.sleep", sleeps.append)
+    engine.client = SimpleNamespace(embeddings=FlakyEmbeddings(failures=2))
+    chunks = engine.embed_chunks(_chunks("98", 3))
+    assert all("embedding" in c and not c.get("embedding_pending") for c in chunks)
+    assert len(engine.client.embeddings.inputs) == 3
+    assert 1 <= sleeps[0] < 2 and 2 <= sleeps[1] < 3
+
+
+def test_oversized_text_is_truncated_to_the_input_limit(engine, monkeypatch):
+    monkeypatch.setattr("rag_modules.rag_engine.EMBED_MAX_INPUT_TOKENS", 50)
+    engine.client = SimpleNamespace(embeddings=FlakyEmbeddings())
+    chunks = engine.embed_chunks([{"text": "x" * 1000, "doc_id": "98", "chunk_index": 0}])
+    assert "embedding" in chunks[0] and chunks[0]["text"] == "x" * 1000
+    sent = engine.client.embeddings.inputs[0][0]
+    assert count_tokens(sent) <= 50 and "x" * 1000 != sent
+
+
+def test_pending_docs_survive_a_restart_and_are_indexed_on_retry(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr("rag_modules.rag_engine.time.sleep", lambda s: None)
+    pending = FakePendingCollection()
+
+    first = RAGEngine(FakeStore(), pending_collection=pending, embed_retries=2)
+    first.client = SimpleNamespace(embeddings=FlakyEmbeddings(failures=10))
+    chunks = first.embed_chunks(_chunks("98"))
+    assert all(c["embedding_pending"] for c in chunks)
+    assert first.pending_embedding_docs() == ["98"] and pending.ids == {"98"}
+
+    # A new process: nothing in memory, the doc id comes from the collection
+    store = FakeStore()
+    second = RAGEngine(store, pending_collection=pending, reload_chunks=lambda doc_id: _chunks(doc_id))
+    second.client = SimpleNamespace(embeddings=FlakyEmbeddings())
+    assert second.pending_embedding_docs() == ["98"]
+    result = second.retry_pending_embeddings()
+    assert result == {"completed": ["98"], "still_pending": []}
+    assert len(store.docs["98"]) == 6 and all("embedding" in c for c in store.docs["98"])
+    assert pending.ids == set()
@@ -0,0 +1,127 @@
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "reindex_reports.py")
+
+
+@pytest.fixture(scope="module")
+def reindex():
+    # Registered under its own name so the process pool can find chunk_report
+    spec = importlib.util.spec_from_file_location("reindex_reports", _PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["reindex_reports"] = module
+    spec.loader.exec_module(module)
+    yield module
+    sys.modules.pop("reindex_reports", None)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        return FakeCursor(sorted(self.docs, key=lambda d: d[field], reverse=direction < 0))
+
+    def limit(self, n):
+        return FakeCursor(self.docs[:n])
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeReports:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        mobile = query.get("mobile", {})
+        docs = [d for d in self.docs if "report_text" in d]
+        if "$gt" in mobile:
+            docs = [d for d in docs if d["mobile"] > mobile["$gt"]]
+        if "$in" in mobile:
+            docs = [d for d in docs if d["mobile"] in mobile["$in"]]
+        return FakeCursor(docs)
+
+
+class StubEngine:
+    """embed_chunks stand-in: fails the chunks of doc ids in fail, or raises once crash_on is reached."""
+
+    def __init__(self, fail=(), crash_on=None):
+        self.fail = set(fail)
+        self.crash_on = crash_on
+        self.embedded = []
+
+    def embed_chunks(self, chunks):
+        doc_ids = sorted({c["doc_id"] for c in chunks})
+        if self.crash_on in doc_ids:
+            raise KeyboardInterrupt
+        self.embedded.extend(doc_ids)
+        for c in chunks:
+            if c["doc_id"] in self.fail:
+                c["embedding_pending"] = True
+            else:
+                c["embedding"] = [float(c["chunk_index"] + 1), 1.0, 0.0]
+        return chunks
+
+
+def _report(i):
+    return f"<h1>Report {i}</h1><h2>Career</h2><p>Saturn guides user {i} toward steady work.</p>"
+
+
+@pytest.fixture
+def env(reindex, tmp_path, monkeypatch):
+    reports = FakeReports([{"mobile": f"9{i}", "report_text": _report(i)} for i in range(5)]
+                          + [{"mobile": "99", "name": "no report yet"}])
+    monkeypatch.setattr(reindex, "get_db_collection", lambda name: reports)
+    storage = tmp_path / "docs"
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    def run(engine, **kwargs):
+        reindex.reindex_reports(str(storage), checkpoint_path=checkpoint, workers=1, window=2,
+                                engine=engine, **kwargs)
+        with open(checkpoint, encoding="utf-8") as f:
+            return json.load(f)
+
+    return run, storage
+
+
+def _written(storage):
+    return sorted(name[:-len(".npy")] for name in os.listdir(storage) if name.endswith(".npy"))
+
+
+def test_failed_docs_land_in_the_checkpoint(env):
+    run, storage = env
+    checkpoint = run(StubEngine(fail={"92"}))
+    assert checkpoint == {"last_mobile": "94", "pending": ["92"]}
+    assert _written(storage) == ["90", "91", "93", "94"]
+
+
+def test_resume_skips_mobiles_already_written(env):
+    run, storage = env
+    with pytest.raises(KeyboardInterrupt):
+        run(StubEngine(crash_on="94"))
+    assert _written(storage) == ["90", "91", "92", "93"]
+
+    engine = StubEngine()
+    checkpoint = run(engine, resume=True)
+    assert engine.embedded == ["94"]
+    assert checkpoint["last_mobile"] == "94"
+    assert _written(storage) == ["90", "91", "92", "93", "94"]
+
+
+def test_retry_pending_redoes_only_failed_docs(env):
+    run, storage = env
+    run(StubEngine(fail={"91", "93"}))
+
+    engine = StubEngine(fail={"93"})
+    checkpoint = run(engine, retry_pending=True)
+    assert engine.embedded == ["91", "93"]
+    assert checkpoint == {"last_mobile": "94", "pending": ["93"]}
+    assert "91" in _written(storage) and "93" not in _written(storage)
@@ -0,0 +1,111 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+from rag_modules.semantic_cache import SemanticAnswerCache
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    """The handful of pymongo Collection calls SemanticAnswerCache makes."""
+
+    def __init__(self):
+        self.docs = []
+        self._ids = itertools.count()
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, cond in query.items():
+            if isinstance(cond, dict):
+                if "$gte" in cond and not doc.get(key, float("-inf")) >= cond["$gte"]:
+                    return False
+                if "$in" in cond and doc.get(key) not in cond["$in"]:
+                    return False
+            elif doc.get(key) != cond:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(d) for d in self.docs if self._matches(d, query)])
+
+    def insert_one(self, doc):
+        doc["_id"] = next(self._ids)
+        self.docs.append(dict(doc))
+
+    def update_one(self, query, update):
+        for d in self.docs:
+            if self._matches(d, query):
+                for k, v in update.get("$inc", {}).items():
+                    d[k] = d.get(k, 0) + v
+                d.update(update.get("$set", {}))
+                return
+
+    def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not self._matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self.docs))
+
+
+def _vec(seed, dim=8):
+    return np.random.default_rng(seed).normal(size=dim)
+
+
+def test_lookup_matches_same_user_and_language():
+    cache = SemanticAnswerCache(FakeCollection(), threshold=0.95)
+    v = _vec(1)
+    cache.store("999", "English", "when will I marry?", v, "<p>Soon</p>", None, gen_s=2.0)
+
+    hit = cache.lookup("999", "English", v + 0.01 * _vec(2))
+    assert hit["response"] == "<p>Soon</p>"
+    assert hit["similarity"] > 0.95
+    assert "embedding" not in hit
+
+    assert cache.lookup("999", "Hindi", v) is None
+    assert cache.lookup("111", "English", v) is None
+    assert cache.lookup("999", "English", _vec(3)) is None
+    assert cache.lookup("999", "English", np.zeros(8)) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_store_sets_expiry_and_trims_per_user():
+    collection = FakeCollection()
+    cache = SemanticAnswerCache(collection, ttl_seconds=60, max_entries_per_user=3)
+    for i in range(5):
+        cache.store("999", "English", f"q{i}", _vec(i), f"a{i}", None, gen_s=1.0)
+    cache.store("111", "English", "other", _vec(9), "x", None, gen_s=1.0)
+
+    mine = [d for d in collection.docs if d["mobile"] == "999"]
+    assert sorted(d["question"] for d in mine) == ["q2", "q3", "q4"]
+    assert all(d["expires_at"].timestamp() > d["created_at"] for d in collection.docs)
+    assert cache.stats()["trimmed"] == 2
+
+
+def test_invalidate_drops_only_that_user():
+    collection = FakeCollection()
+    cache = SemanticAnswerCache(collection)
+    cache.store("999", "English", "q", _vec(1), "a", None, gen_s=1.0)
+    cache.store("111", "English", "q", _vec(1), "a", None, gen_s=1.0)
+    cache.invalidate("999")
+    assert cache.lookup("999", "English", _vec(1)) is None
+    assert cache.lookup("111", "English", _vec(1)) is not None
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("openai")
+
+from rag_modules.session_memory import SessionMemory
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = {d["_id"]: d for d in docs}
+
+    def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+
+def _history(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"} for i in range(n)]
+
+
+def test_window_without_session_id_keeps_full_history():
+    memory = SessionMemory(FakeCollection(), keep_messages=4, refresh_every=2)
+    history = _history(30)
+    window, state = memory.window(None, history)
+    assert window == history and state is None
+
+
+def test_window_is_summary_plus_unsummarized_tail():
+    memory = SessionMemory(FakeCollection([{"_id": "s1", "summary": "earlier", "summarized_upto": 20}]),
+                           keep_messages=4, refresh_every=2)
+    window, state = memory.window("s1", _history(24))
+    assert window[0]["role"] == "system" and "earlier" in window[0]["content"]
+    assert [m["content"] for m in window[1:]] == ["m20", "m21", "m22", "m23"]
+
+
+def test_window_caps_history_until_a_summary_exists():
+    memory = SessionMemory(FakeCollection(), keep_messages=4, refresh_every=2)
+    window, state = memory.window("new", _history(30))
+    assert len(window) == memory.max_messages and state is None
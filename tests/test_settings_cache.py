@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from backend import settings_service, wallet_service
+from backend.settings_service import get_setting, set_setting
+from backend.wallet_service import WalletService
+
+
+class FakeSettings:
+    """find_one / update_one over documents keyed by a single field."""
+
+    def __init__(self, field):
+        self.field = field
+        self.docs = {}
+        self.reads = 0
+
+    def find_one(self, query):
+        self.reads += 1
+        doc = self.docs.get(query[self.field])
+        return dict(doc) if doc else None
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query[self.field], dict(query))
+        doc.update(update["$set"])
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    cols = {"system_settings": FakeSettings("_id"), "settings": FakeSettings("key")}
+    monkeypatch.setattr(settings_service, "_cache", {})
+    monkeypatch.setattr(settings_service, "SETTINGS_CACHE_TTL_S", 60.0)
+    monkeypatch.setattr(settings_service, "get_db_collection", cols.__getitem__)
+    monkeypatch.setattr(wallet_service, "get_db_collection", cols.__getitem__)
+    return cols
+
+
+def test_get_setting_is_cached_within_the_ttl(collections):
+    collections["system_settings"].docs["payment_enabled"] = {"_id": "payment_enabled", "value": True}
+    assert get_setting("payment_enabled", False) is True
+    assert get_setting("payment_enabled", False) is True
+    assert collections["system_settings"].reads == 1
+
+
+def test_set_setting_clears_the_cached_entry(collections):
+    assert get_setting("payment_enabled", False) is False
+    set_setting("payment_enabled", True)
+    assert get_setting("payment_enabled", False) is True
+    assert collections["system_settings"].reads == 2
+
+
+def test_toggle_wallet_system_clears_the_cached_entry(collections):
+    assert WalletService.is_wallet_enabled() is True
+    WalletService.toggle_wallet_system(False)
+    assert WalletService.is_wallet_enabled() is False
+    WalletService.toggle_wallet_system(True)
+    assert WalletService.is_wallet_enabled() is True
+    assert collections["settings"].reads == 3
+
+
+def test_entries_expire_after_the_ttl(collections, monkeypatch):
+    assert get_setting("payment_enabled", False) is False
+    # Another worker's write: no invalidation here, so it shows up after the TTL
+    collections["system_settings"].docs["payment_enabled"] = {"_id": "payment_enabled", "value": True}
+    assert get_setting("payment_enabled", False) is False
+    monkeypatch.setattr(settings_service, "SETTINGS_CACHE_TTL_S", 0.0)
+    assert get_setting("payment_enabled", False) is True
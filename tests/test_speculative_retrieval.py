@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+
+from rag_modules.speculative_retrieval import SpeculativeRetrieval
+
+
+class FakeEngine:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, query):
+        self.queries.append(query)
+        return [1.0, 0.0]
+
+
+class FakeStore:
+    def __init__(self, release=None):
+        self.calls = []
+        self.release = release
+        self.results = [({"text": "Saturn return", "doc_id": "98"}, 0.9)]
+
+    def similarity_search(self, query_vector, top_k, doc_ids):
+        self.calls.append((query_vector, top_k, doc_ids))
+        if self.release is not None:
+            self.release.wait(5)
+        return self.results
+
+
+def _no_other_tasks():
+    return asyncio.all_tasks() == {asyncio.current_task()}
+
+
+def test_maya_passes_and_the_speculative_result_is_used():
+    engine, store = FakeEngine(), FakeStore()
+
+    async def turn():
+        async with SpeculativeRetrieval(engine, store, "marriage timing", ["98"]) as speculative:
+            assert await speculative.query_vector_task == [1.0, 0.0]  # shared with Maya
+            results, seconds = await speculative.results()
+        return results, seconds, _no_other_tasks()
+
+    results, seconds, clean = asyncio.run(turn())
+    assert results is store.results
+    assert seconds >= 0 and clean
+    assert engine.queries == ["marriage timing"]
+    assert store.calls == [([1.0, 0.0], 5, ["98"])]
+
+
+def test_maya_refuses_and_the_retrieval_is_discarded():
+    release = threading.Event()
+    engine, store = FakeEngine(), FakeStore(release)
+
+    async def turn():
+        async with SpeculativeRetrieval(engine, store, "who made you?", ["98"]) as speculative:
+            await speculative.query_vector_task
+            await speculative.discard()
+            state = speculative.retrieval_task.cancelled(), _no_other_tasks()
+        release.set()  # let the abandoned worker thread finish
+        return state
+
+    cancelled, clean = asyncio.run(turn())
+    assert cancelled and clean
+
+
+def test_an_error_mid_turn_cancels_pending_tasks():
+    release = threading.Event()
+    engine, store = FakeEngine(), FakeStore(release)
+    seen = {}
+
+    async def turn():
+        try:
+            async with SpeculativeRetrieval(engine, store, "career", ["98"]) as speculative:
+                seen["speculative"] = speculative
+                raise RuntimeError("Maya call failed")
+        finally:
+            seen["clean"] = _no_other_tasks()
+            release.set()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(turn())
+    speculative = seen["speculative"]
+    assert speculative.retrieval_task.done() and speculative.query_vector_task.done()
+    assert seen["clean"]
@@ -0,0 +1,50 @@
+import json
+import random
+
+import pytest
+
+pytest.importorskip("openai")
+
+from rag_modules.chat_handler import StreamingJSONFields
+
+ANSWER = {
+    "para1": "Namaste \U0001F64F, your <b>Saturn</b> \"return\" begins in 2027.",
+    "score": 0.93,
+    "tags": ["career", {"note": "a \"quoted\" } brace"}],
+    "para2": "Line one\nLine two\t— शनि \\ done",
+    "ok": True,
+    "para3": "",
+    "follow_up": "Shall I look at your dasha?"
+}
+
+
+def _feed_in_pieces(raw, cuts):
+    parser = StreamingJSONFields()
+    events = []
+    start = 0
+    for cut in sorted(cuts) + [len(raw)]:
+        events.extend(parser.feed(raw[start:cut]))
+        start = cut
+    return parser, events
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_any_split_gives_the_json_loads_fields(seed):
+    rng = random.Random(seed)
+    raw = json.dumps(ANSWER, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    cuts = rng.sample(range(1, len(raw)), rng.randint(0, min(40, len(raw) - 1)))
+    parser, events = _feed_in_pieces(raw, cuts)
+
+    expected = {k: v for k, v in ANSWER.items() if isinstance(v, str)}
+    assert parser.fields == expected
+    assert [(k, v) for kind, k, v in events if kind == "field"] == list(expected.items())
+    # Deltas of each field add up to its final value
+    for key, value in expected.items():
+        assert "".join(v for kind, k, v in events if kind == "delta" and k == key) == value
+
+
+def test_deltas_arrive_before_the_field_closes():
+    parser = StreamingJSONFields()
+    assert parser.feed('{"para1": "When Jupi') == [("delta", "para1", "When Jupi")]
+    assert parser.feed('ter moves') == [("delta", "para1", "ter moves")]
+    assert parser.feed('", "para2"') == [("field", "para1", "When Jupiter moves")]
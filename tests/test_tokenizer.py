@@ -0,0 +1,67 @@
+import pytest
+
+from rag_modules import tokenizer
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    if tokenizer.tiktoken is None:
+        pytest.skip("tiktoken not installed")
+
+    def unknown_model(model):
+        raise KeyError(model)
+
+    def no_network(name):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tokenizer.tiktoken, "encoding_for_model", unknown_model)
+    monkeypatch.setattr(tokenizer.tiktoken, "get_encoding", no_network)
+    tokenizer.reset_encodings()
+    yield
+    tokenizer.reset_encodings()
+
+
+def test_unknown_model_offline_falls_back_to_estimate(offline_tiktoken):
+    assert tokenizer.count_tokens("x" * 10, "some-new-model") == 3
+    pieces = tokenizer.split_tokens("abcdefghij", 2, "some-new-model")
+    assert "".join(pieces) == "abcdefghij"
+    assert tokenizer.tail_tokens("abcdefghij", 1, "some-new-model") == "ij"
+
+
+class _WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_failed_load_is_retried_after_backoff(offline_tiktoken, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(tokenizer.time, "monotonic", lambda: clock[0])
+    assert tokenizer.count_tokens("one two three four five", "m") == 6
+
+    # The table becomes available, but the failure is still within the backoff
+    monkeypatch.setattr(tokenizer.tiktoken, "get_encoding", lambda name: _WordEncoding())
+    assert tokenizer._get_encoding("m") is None
+
+    clock[0] += tokenizer._RETRY_SECONDS + 1
+    assert isinstance(tokenizer._get_encoding("m"), _WordEncoding)
+    # Estimates cached while the table was missing are dropped
+    assert tokenizer.count_tokens("one two three four five", "m") == 5
+
+
+def test_require_encoding_fails_loudly(offline_tiktoken, monkeypatch):
+    monkeypatch.delenv("TOKENIZER_ALLOW_ESTIMATE", raising=False)
+    with pytest.raises(RuntimeError, match="some-new-model"):
+        tokenizer.require_encoding("some-new-model")
+    monkeypatch.setenv("TOKENIZER_ALLOW_ESTIMATE", "1")
+    tokenizer.require_encoding("some-new-model")
+
+
+def test_batch_by_tokens_respects_both_limits():
+    texts = ["word " * 10] * 7
+    batches = tokenizer.batch_by_tokens(texts, max_tokens=35, max_items=5)
+    assert [i for b in batches for i in b] == list(range(7))
+    per_text = tokenizer.count_tokens(texts[0])
+    assert all(len(b) <= 5 and len(b) * per_text <= max(35, per_text) for b in batches)
@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+import pytest
+
+from rag_modules.vectorstore import InMemoryVectorStore
+
+DIM = 16
+
+
+def _doc(rng, doc_id, n=12):
+    return [{"text": f"{doc_id} chunk {i}", "embedding": rng.normal(size=DIM).tolist()} for i in range(n)]
+
+
+def _exact(docs, q, top_k):
+    """Brute-force cosine ranking over the raw embeddings."""
+    q = np.asarray(q) / np.linalg.norm(q)
+    scored = []
+    for chunks in docs.values():
+        for c in chunks:
+            e = np.asarray(c["embedding"])
+            scored.append((c["text"], float(e @ q / np.linalg.norm(e))))
+    scored.sort(key=lambda r: r[1], reverse=True)
+    return scored[:top_k]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    rng = np.random.default_rng(7)
+    docs = {f"user{i}": _doc(rng, f"user{i}") for i in range(5)}
+    store = InMemoryVectorStore(str(tmp_path))
+    for doc_id, chunks in docs.items():
+        store.add_document(doc_id, doc_id, [dict(c) for c in chunks])
+    return str(tmp_path), docs, rng
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"quantize": True},
+    {"max_resident_docs": 2},
+    {"max_resident_docs": 2, "quantize": True},
+])
+def test_reload_matches_exact_search(corpus, options):
+    storage_dir, docs, rng = corpus
+    store = InMemoryVectorStore(storage_dir, **options)
+    assert sorted(store.document_names) == sorted(docs)
+
+    for _ in range(5):
+        q = rng.normal(size=DIM)
+        # Whole-corpus search first: in lazy mode nothing is resident yet
+        results = store.similarity_search(q, top_k=3)
+        expected = _exact(docs, q, 3)
+        assert [c["text"] for c, _ in results] == [t for t, _ in expected]
+        assert [s for _, s in results] == pytest.approx([s for _, s in expected], abs=1e-5)
+
+        filtered = store.similarity_search(q, top_k=3, doc_ids=["user1"])
+        expected = _exact({"user1": docs["user1"]}, q, 3)
+        assert [c["text"] for c, _ in filtered] == [t for t, _ in expected]
+
+
+def test_lazy_store_respects_budget(corpus):
+    storage_dir, docs, rng = corpus
+    store = InMemoryVectorStore(storage_dir, max_resident_docs=2)
+    for doc_id in docs:
+        assert store.similarity_search(rng.normal(size=DIM), top_k=2, doc_ids=[doc_id])
+    stats = store.cache_stats()
+    assert stats["resident_docs"] == 2
+    assert stats["evictions"] == len(docs) - 2
+
+
+def test_doc_evicted_by_a_concurrent_search_is_reloaded(corpus):
+    storage_dir, docs, rng = corpus
+    store = InMemoryVectorStore(storage_dir, max_resident_docs=1)
+    page_in = store._page_in
+    interleaved = []
+
+    def page_in_then_interleave(doc_id):
+        page_in(doc_id)
+        if doc_id == "user1" and not interleaved:
+            # Another request searches user2 right after user1 was paged in,
+            # evicting it before the first search reads its snapshot
+            interleaved.append(store.similarity_search(rng.normal(size=DIM), top_k=1, doc_ids=["user2"]))
+
+    store._page_in = page_in_then_interleave
+    q = rng.normal(size=DIM)
+    results = store.similarity_search(q, top_k=3, doc_ids=["user1"])
+    assert interleaved and interleaved[0]
+    expected = _exact({"user1": docs["user1"]}, q, 3)
+    assert [c["text"] for c, _ in results] == [t for t, _ in expected]
+    assert store.cache_stats()["resident_docs"] == 1
+
+
+def test_search_many_matches_single_searches(corpus):
+    storage_dir, docs, rng = corpus
+    for options in ({}, {"quantize": True}, {"max_resident_docs": 2}):
+        store = InMemoryVectorStore(storage_dir, **options)
+        queries = rng.normal(size=(4, DIM))
+        for doc_ids in (None, ["user0", "user3"]):
+            batched = store.similarity_search_many(queries, top_k=3, doc_ids=doc_ids)
+            single = [store.similarity_search(q, top_k=3, doc_ids=doc_ids) for q in queries]
+            assert [[c["text"] for c, _ in r] for r in batched] == [[c["text"] for c, _ in r] for r in single]
+
+
+def test_replace_and_delete(corpus):
+    storage_dir, docs, rng = corpus
+    store = InMemoryVectorStore(storage_dir, quantize=True)
+    replacement = _doc(rng, "user2-v2", n=4)
+    store.add_document("user2", "user2", [dict(c) for c in replacement])
+    q = rng.normal(size=DIM)
+    texts = [c["text"] for c, _ in store.similarity_search(q, top_k=10, doc_ids=["user2"])]
+    assert sorted(texts) == sorted(c["text"] for c in replacement)
+
+    store.delete_document("user2")
+    assert "user2" not in store.document_names
+    assert store.similarity_search(q, top_k=3, doc_ids=["user2"]) == []
+    assert all(c["doc_id"] != "user2" for c, _ in store.similarity_search(q, top_k=50))
+
+
+def test_quantized_store_keeps_no_files_open(tmp_path):
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("needs /proc")
+    rng = np.random.default_rng(3)
+    store = InMemoryVectorStore(str(tmp_path), quantize=True)
+    before = len(os.listdir("/proc/self/fd"))
+    for i in range(50):
+        store.add_document(f"user{i}", f"user{i}", _doc(rng, f"user{i}", n=3))
+    store.similarity_search(rng.normal(size=DIM), top_k=5)
+    assert len(os.listdir("/proc/self/fd")) - before < 5